@@ -1,6 +1,6 @@
 import numpy as np
-import random
 from ingredient import Ingredient
+from categories import CategoryTable
 
 
 BASE_INGREDIENT_TYPES = {
@@ -13,6 +13,32 @@ BASE_INGREDIENT_TYPES = {
 }
 
 
+def base_category(name):
+    """ Returns the base ingredient category of a lower case ingredient name,
+        or None if it is not a base ingredient. Any sugar or flour and any
+        butter other than peanut butter are recognized besides the names of
+        BASE_INGREDIENT_TYPES.
+        Args:
+            name (str) : lower case ingredient name
+    """
+    if "sugar" in name or name in BASE_INGREDIENT_TYPES["sugars"]:
+        return "sugars"
+    elif "flour" in name:
+        return "flour"
+    elif name in BASE_INGREDIENT_TYPES["dry"]:
+        return "dry"
+    elif name in BASE_INGREDIENT_TYPES["wet"]:
+        return "wet"
+    elif ("butter" in name and "peanut" not in name) \
+            or name in BASE_INGREDIENT_TYPES["fats"]:
+        return "fats"
+    return None
+
+
+BASE_CATEGORIES = CategoryTable(base_category, 
+                                ["sugars", "flour", "dry", "wet", "fats"])
+
+
 class BaseIngredients: 
     """ A class to represent base ingredients in a recipe.
 
@@ -30,6 +56,8 @@ class BaseIngredients:
         Types of sugars in the recipe's ingredients
     fats : dict
         Types of fats in the recipe's ingredients
+    rng : np.random.Generator
+        Random number generator used by the mutations
     
     Methods
     -------
@@ -58,13 +86,16 @@ class BaseIngredients:
         Gets string representation of wet ingredients for recipe instructions.
     """
 
-    def __init__(self, ing_list): 
+    def __init__(self, ing_list, rng=None): 
         """ Initializes the base ingredients quantities to 0 and then uses
             given ingredient list to create and store various Ingredient
             objects that are base ingredients in attribute dicts.
             Args:
                 ing_list (list) : list of Ingredient objects
+                rng (np.random.Generator) : random number generator, a fresh
+                                            unseeded one if None
         """
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.wet = {}
         self.flour = {}
         self.dry = {}
@@ -78,30 +109,31 @@ class BaseIngredients:
     def sort_ingredients(self, ing_list):
         """ Iterates through given ingredient objects and stores the ingredient
             name and its associated amount into the dictionary corresponding to
-            what type of ingredient it is (wet, flour, etc). Also keeps
-            track of volumes of different types of base ingredients.
+            what type of ingredient it is (wet, flour, etc), looked up in
+            BASE_CATEGORIES. Also keeps track of volumes of different types
+            of base ingredients.
             Args: 
                 ing_list (list) : stores ingredients as Ingredient objects
         """
         sugar_volume = 0
         flour_volume = 0
         fats_volume = 0
-        for ing in ing_list: 
-            name = ing.get_name().lower()
-            if "sugar" in name or name in BASE_INGREDIENT_TYPES["sugars"]: 
+        names = [ing.get_name().lower() for ing in ing_list]
+        for ing, name, category in zip(ing_list, names, 
+                                       BASE_CATEGORIES.get_categories(names)): 
+            if category == "sugars": 
                 self.sugars[name] = ing
                 self.base_volumes["sugar"] += ing.get_amount()
                 sugar_volume += ing.get_amount() 
-            elif "flour" in name: 
+            elif category == "flour": 
                 self.flour[name] = ing
                 flour_volume += ing.get_amount()
                 self.base_volumes["flour"] += ing.get_amount()
-            elif name in BASE_INGREDIENT_TYPES["dry"]: 
+            elif category == "dry": 
                 self.dry[name] = ing
-            elif name in BASE_INGREDIENT_TYPES["wet"]: 
+            elif category == "wet": 
                 self.wet[name] = ing
-            elif ("butter" in name and "peanut" not in name) \
-                or name in BASE_INGREDIENT_TYPES["fats"]: 
+            elif category == "fats": 
                 self.fats[name] = ing
                 self.base_volumes["fat"] += ing.get_amount()
                 fats_volume += ing.get_amount()
@@ -120,7 +152,7 @@ class BaseIngredients:
             base type (sugar, flour, or fats). 
         """
         # choose base type to adjust
-        mutation = np.random.randint(0,3)
+        mutation = self.rng.integers(0,3)
         if mutation == 0: 
             # adjust sugar ratio
             base_type = "sugar"
@@ -130,7 +162,8 @@ class BaseIngredients:
         elif mutation == 2: 
             # adjust flour ratio
             base_type = "flour"
-        new_ratio = (random.uniform(-.5,.5) + 1) * self.base_ratio[base_type]
+        new_ratio = (self.rng.uniform(-.5,.5) + 1) * \
+            self.base_ratio[base_type]
         multiplier = new_ratio / self.base_ratio[base_type]
         # apply new ratio to change volumes
         for key in self.base_ratio.keys(): 
@@ -150,9 +183,10 @@ class BaseIngredients:
         """
         if len(self.sugars) <= 1: 
             return 
-        percent = random.uniform(0,1)
-        sugar_1 = np.random.choice(tuple(self.sugars.values()))
-        sugar_2 = np.random.choice(tuple(self.sugars.values()))
+        percent = self.rng.uniform(0,1)
+        sugars = tuple(self.sugars.values())
+        sugar_1 = sugars[self.rng.integers(len(sugars))]
+        sugar_2 = sugars[self.rng.integers(len(sugars))]
         new_amt = percent
         sugar_1_amt = sugar_1.get_amount()
         sugar_2_amt = sugar_2.get_amount()
@@ -171,9 +205,10 @@ class BaseIngredients:
         """
         if len(self.fats) <= 1: 
             return 
-        percent = random.uniform(0,1)
-        fat_1 = np.random.choice(tuple(self.fats.values()))
-        fat_2 = np.random.choice(tuple(self.fats.values()))
+        percent = self.rng.uniform(0,1)
+        fats = tuple(self.fats.values())
+        fat_1 = fats[self.rng.integers(len(fats))]
+        fat_2 = fats[self.rng.integers(len(fats))]
         new_amt = percent
         fat_1_amt = fat_1.get_amount()
         fat_2_amt = fat_2.get_amount()
@@ -190,7 +225,7 @@ class BaseIngredients:
         """ Adjust ratio of eggs between 1 and 2 eggs (based on random
             probability), where each egg is 50g.
         """
-        num_eggs = np.random.randint(1,3)
+        num_eggs = self.rng.integers(1,3)
         if "egg" in self.wet.keys(): 
             self.wet["egg"] = Ingredient("egg", 50 * num_eggs)
         elif "eggs" in self.wet.keys():
@@ -229,7 +264,7 @@ class BaseIngredients:
         """ Calls an above mutation based on a rangom probability, defaulting 
             to adjusting base ratios if other mutations cannot be called.
         """
-        mutation = np.random.randint(0,4)
+        mutation = self.rng.integers(0,4)
         if mutation == 0: 
             self.adjust_base_ratios() 
         elif mutation == 1 and len(self.sugars.keys()) > 1: 
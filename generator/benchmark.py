@@ -0,0 +1,470 @@
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from recipe import Recipe
+from cookie_generator import RecipeManager
+from resources import RESOURCES
+from fitness import distance_scores
+from neighbors import (NEIGHBOR_INDEXES, missing_dependencies,
+                       neighbor_distance_scores)
+from paths import GENERATOR_DIR, BENCHMARK_BASELINE_PATH as BASELINE_PATH
+
+SEED = 1
+EMOTION = "Happy"
+GA_POPULATION_SIZES = [12, 48, 96]
+GA_GENERATIONS = [5, 20]
+IMPORT_BUDGET = 0.5
+HEAVY_MODULES = ["pandas", "openpyxl", "scipy"]
+NEIGHBOR_CORPUS_SIZE = 50000
+NEIGHBOR_QUERIES = 96
+NEIGHBOR_K = 16
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import cookie_generator
+seconds = time.perf_counter() - start
+heavy = [name for name in {heavy} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def time_call(func, number=1, repeat=5):
+    """ Times func and returns a dictionary with the best and median seconds
+        per call over repeat rounds of number calls each.
+        Args:
+            func (function) : function called without arguments
+            number (int) : calls per timed round
+            repeat (int) : number of timed rounds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return {"best": min(times), "median": float(np.median(times)),
+            "number": number, "repeat": repeat}
+
+
+def make_manager(population_size, seed=SEED):
+    """ Returns a seeded RecipeManager holding population_size scored recipes.
+        Populations larger than the inspiring set are filled with perturbed
+        copies of the inspiring recipes.
+        Args:
+            population_size (int) : number of recipes in the population
+            seed (int) : seed of the manager's random number generator
+    """
+    manager = RecipeManager(seed=seed, population_size=population_size)
+    manager.emotion = EMOTION
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.parse_files()
+    return manager
+
+
+def bench_fitness(repeat):
+    """ Times every fitness component of a single recipe, recomputed from
+        scratch on each call.
+        Args:
+            repeat (int) : number of timed rounds
+    """
+    fitness = make_manager(12).recipes[0].fitness
+    return {
+        "fitness.flavor_pairing_score": time_call(
+            fitness.flavor_pairing_score, 200, repeat),
+        "fitness.dissimilarity_score": time_call(
+            fitness.dissimilarity_score, 200, repeat),
+        "fitness.emotion_score": time_call(
+            fitness.emotion_score, 200, repeat),
+        "fitness.set_fitness_val": time_call(
+            fitness.set_fitness_val, 200, repeat),
+    }
+
+
+def bench_operators(repeat):
+    """ Times recipe construction, crossover, mutation and survivor selection.
+        Args:
+            repeat (int) : number of timed rounds
+    """
+    manager = make_manager(12)
+    recipes = manager.recipes
+    lines = RESOURCES.get_inspiring_recipes()[0]
+    rng = np.random.default_rng(SEED)
+
+    def mutate():
+        recipe = Recipe.from_genome(recipes[0].get_genome(), EMOTION, rng)
+        recipe.mutate()
+
+    return {
+        "recipe.__init__": time_call(
+            lambda: Recipe(lines, EMOTION, rng=rng), 100, repeat),
+        "recipe.make_ingredient_list": time_call(
+            lambda: recipes[0].make_ingredient_list(lines), 1000, repeat),
+        "recipe.mutate": time_call(mutate, 100, repeat),
+        "manager.crossover": time_call(
+            lambda: manager.crossover(recipes[0], recipes[1]), 100, repeat),
+        "manager.fittest_half": time_call(
+            lambda: manager.fittest_half(recipes), 1000, repeat),
+    }
+
+
+def bench_genetic_algo(repeat, population_sizes=GA_POPULATION_SIZES,
+                       generation_counts=GA_GENERATIONS):
+    """ Times full seeded runs of the genetic algorithm, excluding the setup of
+        the initial population.
+        Args:
+            repeat (int) : number of timed rounds
+            population_sizes (list) : population sizes to run
+            generation_counts (list) : generation counts to run
+    """
+    results = {}
+    for size in population_sizes:
+        for generations in generation_counts:
+            times = []
+            for _ in range(repeat):
+                manager = make_manager(size)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    manager.run_genetic_algo(generations)
+                    times.append(time.perf_counter() - start)
+                manager.close()
+            results[f"run_genetic_algo[pop={size},gen={generations}]"] = {
+                "best": min(times), "median": float(np.median(times)),
+                "number": 1, "repeat": repeat}
+    return results
+
+
+def synthetic_corpus(size, seed=SEED):
+    """ Returns an inspiring matrix of size recipes made from the inspiring
+        set: every row is a random inspiring recipe whose flavor amounts are
+        scaled by log-normal noise and each dropped with probability 0.3,
+        with four flavors of the whole vocabulary added at amounts drawn from
+        the inspiring set.
+        Args:
+            size (int) : number of recipes
+            seed (int) : seed of the random number generator
+    """
+    rng = np.random.default_rng(seed)
+    matrix = RESOURCES.get_inspiring_matrix()
+    amounts = matrix[matrix != 0]
+    corpus = matrix[rng.integers(len(matrix), size=size)]
+    corpus *= rng.lognormal(0, 0.5, corpus.shape)
+    corpus[rng.random(corpus.shape) < 0.3] = 0
+    for _ in range(4):
+        corpus[np.arange(size), rng.integers(matrix.shape[1], size=size)] = \
+            rng.choice(amounts, size)
+    return corpus
+
+
+def bench_neighbors(repeat, corpus_size=NEIGHBOR_CORPUS_SIZE, 
+                    queries=NEIGHBOR_QUERIES, k=NEIGHBOR_K):
+    """ Compares the nearest-neighbour backends on a synthetic inspiring set:
+        build time, query time per recipe, recall of the exact k nearest and
+        the error of the dissimilarity scores against the exact score over
+        the whole set, with the Spearman rank correlation of the scores.
+        Backends whose optional dependency is missing are reported as
+        skipped.
+        Args:
+            repeat (int) : number of timed rounds
+            corpus_size (int) : number of synthetic inspiring recipes
+            queries (int) : number of recipes scored per round
+            k (int) : number of nearest inspiring recipes
+    """
+    matrix = synthetic_corpus(corpus_size)
+    recipes = make_manager(queries).recipes
+    id_lists = [recipe.fitness.get_flavor_ids() for recipe in recipes]
+    amount_lists = [recipe.flavor_ingredients.get_flavor_ing_amounts()
+                    for recipe in recipes]
+    brute = NEIGHBOR_INDEXES["brute"](matrix)
+    exact_neighbors = brute.query(brute.project(id_lists, amount_lists)[0],
+                                  k)[1]
+
+    def exact():
+        # the dissimilarity score against the whole set
+        queries, rests = brute.project(id_lists, amount_lists)
+        return distance_scores((queries ** 2).sum(axis=1)[:, None] 
+                               + rests[:, None] - 2 * queries @ brute.points.T
+                               + brute.sq_norms[None, :])
+
+    def ranks(values):
+        return np.argsort(np.argsort(values))
+
+    exact_scores = exact()
+    results = {"exact": {"build": 0.0, **time_call(exact, 1, repeat)}}
+    results["exact"].update({"recall": 1.0, "max_error": 0.0, 
+                             "spearman": 1.0})
+    for backend, index_class in NEIGHBOR_INDEXES.items():
+        missing = missing_dependencies(backend)
+        if missing:
+            results[backend] = {"skipped": f"needs {', '.join(missing)}"}
+            continue
+        start = time.perf_counter()
+        index = index_class(matrix)
+        build = time.perf_counter() - start
+        scores = neighbor_distance_scores(index, id_lists, amount_lists, k)
+        found = index.query(index.project(id_lists, amount_lists)[0], k)[1]
+        recall = np.mean([len(np.intersect1d(row, exact_row)) / k
+                          for row, exact_row in zip(found, exact_neighbors)])
+        results[backend] = {"build": build, **time_call(
+            lambda: neighbor_distance_scores(index, id_lists, amount_lists,
+                                             k), 1, repeat)}
+        results[backend].update({
+            "recall": float(recall),
+            "max_error": float(np.abs(scores - exact_scores).max()),
+            "spearman": float(np.corrcoef(ranks(scores), 
+                                          ranks(exact_scores))[0, 1])})
+    return results
+
+
+def print_neighbors(results, queries=NEIGHBOR_QUERIES):
+    """ Prints the results of bench_neighbors as a table.
+        Args:
+            results (dict) : results returned by bench_neighbors
+            queries (int) : number of recipes scored per round
+    """
+    print(f"{'backend':<11}  {'build':>9}  {'per recipe':>11}  recall  "
+          f"max error  spearman")
+    for backend, row in results.items():
+        if "skipped" in row:
+            print(f"{backend:<11}  skipped: {row['skipped']}")
+            continue
+        print(f"{backend:<11}  {row['build'] * 1e3:7.1f}ms  "
+              f"{row['best'] / queries * 1e3:9.3f}ms  {row['recall']:6.3f}  "
+              f"{row['max_error']:9.4f}  {row['spearman']:8.4f}")
+
+
+def run_subprocess(args, cwd):
+    """ Runs a fresh Python interpreter with the generator folder on its path
+        and returns its standard output.
+        Args:
+            args (list) : interpreter arguments
+            cwd (str) : working directory of the interpreter
+    """
+    env = dict(os.environ, PYTHONPATH=GENERATOR_DIR)
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env, 
+                          check=True, capture_output=True, text=True).stdout
+
+
+def bench_cold_start(repeat):
+    """ Times importing cookie_generator and a one generation run of the
+        command line interface in fresh interpreters, started outside the
+        generator folder. The import result also lists the HEAVY_MODULES
+        that were imported.
+        Args:
+            repeat (int) : number of timed rounds
+    """
+    import_times, run_times, heavy = [], [], set()
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(repeat):
+            result = json.loads(run_subprocess(
+                ["-c", IMPORT_SCRIPT.format(heavy=HEAVY_MODULES)], cwd))
+            import_times.append(result["seconds"])
+            heavy.update(result["heavy"])
+
+            start = time.perf_counter()
+            run_subprocess([os.path.join(GENERATOR_DIR, "cookie_generator.py"),
+                            "--emotion", EMOTION, "--generations", "1", 
+                            "--seed", str(SEED), "--output-dir", cwd], cwd)
+            run_times.append(time.perf_counter() - start)
+    return {
+        "import.cookie_generator": {
+            "best": min(import_times), 
+            "median": float(np.median(import_times)), 
+            "number": 1, "repeat": repeat, "heavy": sorted(heavy)},
+        "cold_start[gen=1]": {
+            "best": min(run_times), "median": float(np.median(run_times)),
+            "number": 1, "repeat": repeat},
+    }
+
+
+def check_imports(repeat=5, budget=IMPORT_BUDGET):
+    """ Checks that importing cookie_generator takes at most budget seconds
+        and imports none of the HEAVY_MODULES, printing the outcome. Returns
+        whether the check passed.
+        Args:
+            repeat (int) : number of timed imports, the best one is checked
+            budget (float) : allowed import time in seconds
+    """
+    result = bench_cold_start(repeat)["import.cookie_generator"]
+    passed = result["best"] <= budget and not result["heavy"]
+    print(f"import cookie_generator: {result['best'] * 1e3:.1f}ms "
+          f"(budget {budget * 1e3:.0f}ms)")
+    if result["heavy"]:
+        print("heavy modules imported: " + ", ".join(result["heavy"]))
+    print("OK" if passed else "FAILED")
+    return passed
+
+
+def run_benchmarks(repeat=5, quick=False):
+    """ Runs the whole suite and returns the results dictionary.
+        Args:
+            repeat (int) : number of timed rounds of every benchmark
+            quick (bool) : only run the smallest genetic algorithm sizes
+    """
+    benchmarks = bench_cold_start(repeat)
+    RESOURCES.reload()
+    benchmarks.update(bench_fitness(repeat))
+    benchmarks.update(bench_operators(repeat))
+    if quick:
+        benchmarks.update(bench_genetic_algo(
+            repeat, GA_POPULATION_SIZES[:1], GA_GENERATIONS[:1]))
+    else:
+        benchmarks.update(bench_genetic_algo(repeat))
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "seed": SEED,
+            "benchmarks": benchmarks}
+
+
+def compare(baseline, results, threshold=0.2):
+    """ Compares the best times of two result dictionaries and returns a list
+        of (name, baseline seconds, new seconds, ratio, regressed) rows for
+        the benchmarks found in both.
+        Args:
+            baseline (dict) : results to compare against
+            results (dict) : new results
+            threshold (float) : relative slowdown counted as a regression
+    """
+    rows = []
+    for name, old in baseline["benchmarks"].items():
+        if name not in results["benchmarks"]:
+            continue
+        new = results["benchmarks"][name]
+        ratio = new["best"] / old["best"]
+        rows.append((name, old["best"], new["best"], ratio,
+                     ratio > 1 + threshold))
+    return rows
+
+
+def print_comparison(rows):
+    """ Prints the rows returned by compare as a table.
+        Args:
+            rows (list) : (name, old, new, ratio, regressed) rows
+    """
+    width = max([len(row[0]) for row in rows] + [9])
+    print(f"{'benchmark':<{width}}  {'baseline':>11}  {'new':>11}  ratio")
+    for name, old, new, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<{width}}  {old * 1e3:9.3f}ms  {new * 1e3:9.3f}ms  "
+              f"{ratio:5.2f}x{flag}")
+
+
+def read_results(path):
+    """ Reads a results JSON file.
+        Args:
+            path (str) : path of the file
+    """
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_results(results, path):
+    """ Writes a results dictionary to a JSON file.
+        Args:
+            results (dict) : results returned by run_benchmarks
+            path (str) : path of the file
+    """
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def parse_args(argv=None):
+    """ Parses the command line arguments.
+        Args:
+            argv (list) : arguments to parse, None for sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the genetic algorithm hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite")
+    run.add_argument("--output", help="file the JSON results are written to")
+    run.add_argument("--repeat", type=int, default=5,
+                     help="number of timed rounds of every benchmark")
+    run.add_argument("--quick", action="store_true",
+                     help="only run the smallest genetic algorithm sizes")
+    run.add_argument("--save-baseline", action="store_true",
+                     help="write the results to the stored baseline")
+
+    comp = commands.add_parser("compare",
+                               help="compare results against a baseline")
+    comp.add_argument("results", nargs="?",
+                      help="results file to check; the suite is run if "
+                           "omitted")
+    comp.add_argument("--baseline", default=BASELINE_PATH,
+                      help="baseline results file")
+    comp.add_argument("--threshold", type=float, default=0.2,
+                      help="relative slowdown counted as a regression")
+    comp.add_argument("--repeat", type=int, default=5,
+                      help="number of timed rounds when running the suite")
+
+    neighbors = commands.add_parser(
+        "neighbors", help="compare the nearest-neighbour backends")
+    neighbors.add_argument("--corpus-size", type=int, 
+                           default=NEIGHBOR_CORPUS_SIZE,
+                           help="number of synthetic inspiring recipes")
+    neighbors.add_argument("--queries", type=int, default=NEIGHBOR_QUERIES,
+                           help="number of recipes scored per round")
+    neighbors.add_argument("--k", type=int, default=NEIGHBOR_K,
+                           help="number of nearest inspiring recipes")
+    neighbors.add_argument("--repeat", type=int, default=5,
+                           help="number of timed rounds")
+
+    imports = commands.add_parser(
+        "check-imports", help="check the cookie_generator import time budget")
+    imports.add_argument("--budget", type=float, default=IMPORT_BUDGET,
+                         help="allowed import time in seconds")
+    imports.add_argument("--repeat", type=int, default=5,
+                         help="number of timed imports")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """ Runs the suite, compares results or checks the import budget, 
+        exiting with status 1 when a comparison finds a regression or the
+        import budget is exceeded.
+        Args:
+            argv (list) : arguments to parse, None for sys.argv
+    """
+    args = parse_args(argv)
+    if args.command == "check-imports":
+        return 0 if check_imports(args.repeat, args.budget) else 1
+    if args.command == "neighbors":
+        print_neighbors(bench_neighbors(args.repeat, args.corpus_size,
+                                        args.queries, args.k), args.queries)
+        return 0
+    if args.command == "run":
+        results = run_benchmarks(args.repeat, args.quick)
+        if args.save_baseline:
+            write_results(results, BASELINE_PATH)
+        if args.output is not None:
+            write_results(results, args.output)
+        if not args.save_baseline and args.output is None:
+            json.dump(results, sys.stdout, indent=2)
+        return 0
+
+    if args.results is not None:
+        results = read_results(args.results)
+    else:
+        results = run_benchmarks(args.repeat)
+    rows = compare(read_results(args.baseline), results, args.threshold)
+    print_comparison(rows)
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over "
+              f"{args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
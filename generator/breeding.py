@@ -0,0 +1,133 @@
+import time
+from recipe import Recipe
+from fitness import PopulationFitness
+from genome import crossover_genomes
+from resources import RESOURCES
+from telemetry import PhaseTimer
+from fitness_cache import open_cache
+
+
+def init_worker():
+    """ Loads the shared read-only scoring resources once when a worker
+        process starts, so no task pays for reading them.
+    """
+    RESOURCES.reload()
+
+
+def breed_offspring(parent_genomes, emotions, rng, cache_path=None):
+    """ Crosses over, mutates and scores one chunk of offspring and returns
+        them together with the seconds spent in every phase. All random draws
+        come from the chunk's own generator, so a chunk produces the same
+        recipes whichever process runs it.
+        Args:
+            parent_genomes (list) : (genome1, genome2) pair for each child
+            emotions (list) : the emotion of each child
+            rng (np.random.Generator) : random stream of the chunk
+            cache_path (str) : persistent fitness cache file, None for none
+    """
+    timer = PhaseTimer()
+    crossover_time = mutation_time = 0.0
+    children = []
+    for (genome1, genome2), emotion in zip(parent_genomes, emotions):
+        start = time.perf_counter()
+        child = Recipe.from_genome(crossover_genomes(genome1, genome2, rng),
+                                   emotion, rng)
+        crossed = time.perf_counter()
+        child.mutate()
+        crossover_time += crossed - start
+        mutation_time += time.perf_counter() - crossed
+        children.append(child)
+    timer.add("crossover", crossover_time)
+    timer.add("mutation", mutation_time)
+    cache = open_cache(cache_path) if cache_path is not None else None
+    PopulationFitness(children).evaluate(timer=timer, cache=cache)
+    return children, timer.totals
+
+
+class OffspringBreeder():
+    """ Creates and scores the offspring of a generation, either in the
+        current process or fanned out over a process pool. Offspring are split
+        into fixed-size chunks, each with its own child stream spawned from
+        the main random generator, so both modes give bit-identical results.
+
+    ...
+
+    Attributes
+    ----------
+    workers : int
+        Number of worker processes, where 1 or less breeds serially.
+    chunk_size : int
+        Number of offspring created by one task.
+    cache_path : string
+        Persistent fitness cache file opened by every process, or None.
+    executor : ProcessPoolExecutor
+        The worker pool, created on first use.
+
+    Methods
+    -------
+    breed(parent_genomes, emotions, rng, timer=None):
+        Returns the scored offspring of the given parent genome pairs.
+    close():
+        Shuts the worker pool down.
+    """
+
+    def __init__(self, workers=1, chunk_size=64, cache_path=None):
+        """ Stores the execution settings without starting any process.
+            Args:
+                workers (int) : number of worker processes
+                chunk_size (int) : number of offspring per task
+                cache_path (str) : persistent fitness cache file, None to
+                                   score every offspring
+        """
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache_path = cache_path
+        self.executor = None
+
+    def breed(self, parent_genomes, emotions, rng, timer=None):
+        """ Returns the crossed over, mutated and scored offspring of every
+            parent genome pair, in order. Offspring of different emotions can
+            be bred and scored together. With worker processes, the phase
+            times added to the timer are summed over all workers.
+            Args:
+                parent_genomes (list) : (genome1, genome2) pair for each child
+                emotions (list) : the emotion of each child, or one emotion
+                                  string shared by all of them
+                rng (np.random.Generator) : generator the chunk streams are
+                                            spawned from
+                timer (PhaseTimer) : timer the crossover, mutation and 
+                                     fitness component times are added to
+        """
+        if isinstance(emotions, str):
+            emotions = [emotions] * len(parent_genomes)
+        starts = range(0, len(parent_genomes), self.chunk_size)
+        chunks = [parent_genomes[i:i + self.chunk_size] for i in starts]
+        emotions = [emotions[i:i + self.chunk_size] for i in starts]
+        chunk_rngs = rng.spawn(len(chunks))
+        cache_paths = [self.cache_path] * len(chunks)
+
+        if self.workers <= 1:
+            results = list(map(breed_offspring, chunks, emotions, chunk_rngs,
+                               cache_paths))
+        else:
+            if self.executor is None:
+                # imported on first use, as most runs never start a pool
+                from concurrent.futures import ProcessPoolExecutor
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    initializer=init_worker)
+            results = list(self.executor.map(breed_offspring, chunks,
+                                             emotions, chunk_rngs, 
+                                             cache_paths))
+        offspring = []
+        for children, totals in results:
+            offspring.extend(children)
+            if timer is not None:
+                timer.merge(totals)
+        return offspring
+
+    def close(self):
+        """ Shuts the worker pool down if one was started.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,262 @@
+import numpy as np
+import argparse
+import hashlib
+import json
+import os
+import sys
+import warnings
+from paths import GENERATOR_DIR, BUNDLE_DIR, CATEGORIES_PATH
+
+BUNDLE_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+ARRAY_FILES = {"embeddings": "embeddings.npy",
+               "emotion_table": "emotion_table.npy",
+               "inspiring_matrix": "inspiring_matrix.npy"}
+
+
+class DataBundle():
+    """ The precompiled scoring data, read from a bundle directory holding one
+        .npy file per array and a JSON manifest with the name tables. The
+        arrays are memory-mapped, so loading a bundle copies no data and needs
+        neither pandas nor unpickling.
+
+    ...
+
+    Attributes
+    ----------
+    names : list
+        Ingredient names in ingredient ID order.
+    embeddings : np.ndarray
+        float32 word embedding of the first len(embeddings) ingredient IDs.
+    emotion_table : np.ndarray
+        Emotion alignment of every ingredient ID, NaN where unknown.
+    inspiring_matrix : np.ndarray
+        Flavor amounts of every inspiring recipe by ingredient ID.
+    inspiring_recipes : list
+        Lines of every inspiring recipe file, in file name order.
+    categories : dict
+        Food category of every ingredient in the categories table.
+    sources : dict
+        SHA-256 digest of every source file the bundle was built from.
+    """
+
+    def __init__(self, manifest, arrays):
+        """ Creates the bundle from its manifest and loaded arrays.
+            Args:
+                manifest (dict) : the parsed manifest
+                arrays (dict) : the arrays keyed as in ARRAY_FILES
+        """
+        self.names = manifest["names"]
+        self.inspiring_recipes = manifest["inspiring_recipes"]
+        self.categories = manifest["categories"]
+        self.sources = manifest["sources"]
+        self.embeddings = arrays["embeddings"]
+        self.emotion_table = arrays["emotion_table"]
+        self.inspiring_matrix = arrays["inspiring_matrix"]
+
+
+def load_bundle(bundle_dir=BUNDLE_DIR, check_sources=True):
+    """ Memory-maps the bundle in bundle_dir and returns it, or returns None
+        if there is no bundle or it was built by another BUNDLE_VERSION.
+        Unless check_sources is False, a bundle whose source files changed
+        since it was built is not used either, with a warning, so the source
+        files are read instead.
+        Args:
+            bundle_dir (str) : directory of the bundle
+            check_sources (bool) : whether to check the bundle is up to date
+    """
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != BUNDLE_VERSION:
+        return None
+    if check_sources:
+        changed = changed_sources(manifest)
+        if changed:
+            warnings.warn(f"Data bundle in {bundle_dir} is out of date, "
+                          f"{len(changed)} sources changed (first "
+                          f"{changed[0]}); reading the source files instead. "
+                          "Rebuild it with python bundle.py.", stacklevel=2)
+            return None
+    arrays = {key: np.load(os.path.join(bundle_dir, file), mmap_mode="r")
+              for key, file in ARRAY_FILES.items()}
+    return DataBundle(manifest, arrays)
+
+
+def file_digest(path):
+    """ Returns the SHA-256 hex digest of a file.
+        Args:
+            path (str) : path of the file
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def source_paths(resources, categories_path=CATEGORIES_PATH):
+    """ Returns the path of every source file of a bundle.
+        Args:
+            resources (Resources) : registry reading the source files
+            categories_path (str) : path of the pickled category dictionary
+    """
+    paths = [resources.embedding_path, resources.emotion_path,
+             categories_path]
+    return paths + [os.path.join(resources.inspiring_dir, file)
+                    for file in sorted(os.listdir(resources.inspiring_dir))]
+
+
+def source_digests(resources, categories_path=CATEGORIES_PATH):
+    """ Returns the digest of every source file of a bundle, keyed by its
+        path relative to the generator folder.
+        Args:
+            resources (Resources) : registry reading the source files
+            categories_path (str) : path of the pickled category dictionary
+    """
+    return {os.path.relpath(path, GENERATOR_DIR): file_digest(path) 
+            for path in source_paths(resources, categories_path)}
+
+
+def source_stats(resources, categories_path=CATEGORIES_PATH):
+    """ Returns the (size, mtime_ns) of every source file of a bundle, keyed
+        like source_digests.
+        Args:
+            resources (Resources) : registry reading the source files
+            categories_path (str) : path of the pickled category dictionary
+    """
+    stats = {}
+    for path in source_paths(resources, categories_path):
+        info = os.stat(path)
+        stats[os.path.relpath(path, GENERATOR_DIR)] = [info.st_size,
+                                                       info.st_mtime_ns]
+    return stats
+
+
+def changed_sources(manifest):
+    """ Returns the source files that changed since the bundle of a manifest
+        was built, judged by a stat of every file: only a file whose size is
+        unchanged but whose modification time differs, e.g. after a fresh
+        checkout, is hashed. Recipe files added to or removed from the
+        inspiring set count as changed, while sources missing together with
+        their folder are ignored, as a bundle may be shipped without them.
+        Args:
+            manifest (dict) : the parsed manifest
+    """
+    changed = []
+    for path, (size, mtime_ns) in manifest["stats"].items():
+        full_path = os.path.join(GENERATOR_DIR, path)
+        try:
+            info = os.stat(full_path)
+        except FileNotFoundError:
+            if os.path.isdir(os.path.dirname(full_path)):
+                changed.append(path)
+            continue
+        if info.st_size != size or (info.st_mtime_ns != mtime_ns and
+                file_digest(full_path) != manifest["sources"][path]):
+            changed.append(path)
+    inspiring_dir = os.path.join(GENERATOR_DIR, manifest["inspiring_dir"])
+    if os.path.isdir(inspiring_dir):
+        paths = (os.path.relpath(os.path.join(inspiring_dir, file),
+                                 GENERATOR_DIR)
+                 for file in sorted(os.listdir(inspiring_dir)))
+        changed += [path for path in paths if path not in manifest["stats"]]
+    return changed
+
+
+def build_bundle(resources, bundle_dir=BUNDLE_DIR,
+                 categories_path=CATEGORIES_PATH):
+    """ Compiles the scoring data read by a source-backed registry into a
+        bundle and returns the manifest. The manifest is written last, so an
+        interrupted build never leaves a loadable, half-written bundle.
+        Args:
+            resources (Resources) : registry reading the source files
+            bundle_dir (str) : directory the bundle is written to
+            categories_path (str) : path of the pickled category dictionary
+    """
+    vocabulary = resources.get_vocabulary()
+    embeddings = resources.get_word_embeddings()
+    names = vocabulary.names[:len(embeddings)]
+    arrays = {
+        "embeddings": np.stack([embeddings[name] for name in names]
+                               ).astype(np.float32),
+        "emotion_table": resources.get_emotion_table(),
+        "inspiring_matrix": resources.get_inspiring_matrix(),
+    }
+    categories = np.load(categories_path, allow_pickle=True).item()
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for key, file in ARRAY_FILES.items():
+        np.save(os.path.join(bundle_dir, file),
+                np.ascontiguousarray(arrays[key]))
+    manifest = {"version": BUNDLE_VERSION,
+                "names": list(vocabulary.names),
+                "inspiring_recipes": resources.get_inspiring_recipes(),
+                "categories": {str(name): str(category)
+                               for name, category in categories.items()},
+                "sources": source_digests(resources, categories_path),
+                "stats": source_stats(resources, categories_path),
+                "inspiring_dir": os.path.relpath(resources.inspiring_dir,
+                                                 GENERATOR_DIR),
+                "arrays": {key: {"file": file,
+                                 "dtype": str(arrays[key].dtype),
+                                 "shape": list(arrays[key].shape)}
+                           for key, file in ARRAY_FILES.items()}}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def stale_sources(bundle, resources, categories_path=CATEGORIES_PATH):
+    """ Returns the source files that changed since the bundle was built.
+        Args:
+            bundle (DataBundle) : the loaded bundle
+            resources (Resources) : registry pointing at the source files
+            categories_path (str) : path of the pickled category dictionary
+    """
+    current = source_digests(resources, categories_path)
+    return sorted(path for path in set(current) | set(bundle.sources)
+                  if current.get(path) != bundle.sources.get(path))
+
+
+def main(argv=None):
+    """ Builds the bundle from the source files, or checks that it is up to
+        date with --check, exiting with status 1 if it is not.
+        Args:
+            argv (list) : arguments to parse, None for sys.argv
+    """
+    from resources import Resources
+
+    parser = argparse.ArgumentParser(
+        description="Compile the scoring data into a binary bundle.")
+    parser.add_argument("--bundle-dir", default=BUNDLE_DIR,
+                        help="directory the bundle is written to")
+    parser.add_argument("--check", action="store_true",
+                        help="only check that the bundle is up to date")
+    args = parser.parse_args(argv)
+
+    sources = Resources(bundle_dir=None)
+    if args.check:
+        bundle = load_bundle(args.bundle_dir, check_sources=False)
+        if bundle is None:
+            print(f"No version {BUNDLE_VERSION} bundle in {args.bundle_dir}")
+            return 1
+        stale = stale_sources(bundle, sources)
+        if stale:
+            print("Bundle is out of date, changed sources: "
+                  + ", ".join(stale))
+            return 1
+        print("Bundle is up to date")
+        return 0
+
+    manifest = build_bundle(sources, args.bundle_dir)
+    print(f"Wrote bundle of {len(manifest['names'])} ingredients and "
+          f"{len(manifest['inspiring_recipes'])} inspiring recipes to "
+          f"{args.bundle_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
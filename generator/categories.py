@@ -0,0 +1,147 @@
+import numpy as np
+from resources import RESOURCES
+
+
+class CategoryTable():
+    """ Assigns every ingredient a category once, so that sorting recipes
+        into categories costs one lookup per ingredient instead of scanning
+        the category lists. Categories are stored as small integer codes in
+        an array indexed by the IDs of the global ingredient vocabulary and
+        extended as the vocabulary grows. Every classified name, including
+        other spellings of known names, is also memoized in a dictionary for
+        scalar lookups. A table built for a vocabulary that was since
+        replaced is rebuilt. The food groups of flavors/ingred_categories.npy
+        (see Resources.get_ingredient_categories) are not base or flavor
+        roles, so sorting does not use them.
+
+    ...
+
+    Attributes
+    ----------
+    classify : function
+        Returns the category of a lower case name, None for no category.
+    vocabulary : Vocabulary
+        The vocabulary the codes are indexed by.
+    categories : list
+        Category names, where a category's position is its code.
+    codes : np.ndarray
+        Category code of every vocabulary ID, -1 for no category.
+    lookup : dict
+        Category code of every classified lower case name.
+
+    Methods
+    -------
+    sync():
+        Forgets the codes of a replaced vocabulary.
+    code_of(name):
+        Classifies a name and returns its category code.
+    lookup_code(name):
+        Classifies a name missing from the lookup dictionary.
+    get_code(name):
+        Returns the category code of a lower case ingredient name.
+    get_category(name):
+        Returns the category of a lower case ingredient name.
+    get_categories(names):
+        Returns the category of several lower case ingredient names.
+    get_codes(width):
+        Returns the category codes of the first width ingredient IDs.
+    """
+
+    def __init__(self, classify, categories=()):
+        """ Stores the classifying function without classifying anything yet.
+            Args:
+                classify (function) : returns the category of a lower case
+                                      name, None for no category
+                categories (list) : known categories, in code order
+        """
+        self.classify = classify
+        self.categories = list(categories)
+        self.vocabulary = None
+        self.codes = np.empty(0, dtype=np.int16)
+        self.lookup = {}
+
+    def code_of(self, name):
+        """ Classifies a name and returns its category code.
+            Args:
+                name (str) : lower case ingredient name
+        """
+        category = self.classify(name)
+        if category is None:
+            return -1
+        if category not in self.categories:
+            self.categories.append(category)
+        return self.categories.index(category)
+
+    def sync(self):
+        """ Forgets the codes if the registry's vocabulary was replaced and
+            returns the current vocabulary.
+        """
+        vocabulary = RESOURCES.get_vocabulary()
+        if vocabulary is not self.vocabulary:
+            self.vocabulary = vocabulary
+            self.codes = np.empty(0, dtype=np.int16)
+            self.lookup = {}
+        return vocabulary
+
+    def get_codes(self, width=None):
+        """ Returns the category codes of the first width ingredient IDs,
+            classifying IDs added to the vocabulary since the last call.
+            Args:
+                width (int) : number of IDs, None for the whole vocabulary
+        """
+        vocabulary = self.sync()
+        width = len(vocabulary) if width is None else width
+        if width > len(self.codes):
+            new_codes = []
+            for name in vocabulary.names[len(self.codes):width]:
+                name = name.lower()
+                if name not in self.lookup:
+                    self.lookup[name] = self.code_of(name)
+                new_codes.append(self.lookup[name])
+            self.codes = np.concatenate(
+                [self.codes, np.array(new_codes, dtype=np.int16)])
+        return self.codes[:width]
+
+    def lookup_code(self, name):
+        """ Returns the category code of a lower case ingredient name missing
+            from the lookup dictionary, classifying it if needed.
+            Args:
+                name (str) : lower case ingredient name
+        """
+        ingr_id = self.vocabulary.index.get(name)
+        if ingr_id is not None and ingr_id >= len(self.codes):
+            self.get_codes(ingr_id + 1)
+        if name not in self.lookup:
+            self.lookup[name] = self.code_of(name)
+        return self.lookup[name]
+
+    def get_code(self, name):
+        """ Returns the category code of a lower case ingredient name, -1 if
+            it has no category.
+            Args:
+                name (str) : lower case ingredient name
+        """
+        self.sync()
+        code = self.lookup.get(name)
+        return code if code is not None else self.lookup_code(name)
+
+    def get_category(self, name):
+        """ Returns the category of a lower case ingredient name, None if it
+            has no category.
+            Args:
+                name (str) : lower case ingredient name
+        """
+        code = self.get_code(name)
+        return self.categories[code] if code >= 0 else None
+
+    def get_categories(self, names):
+        """ Returns the category of every lower case ingredient name, None
+            for names without a category.
+            Args:
+                names (list) : lower case ingredient names
+        """
+        self.sync()
+        # code -1 indexes the appended None
+        lookup, categories = self.lookup, self.categories + [None]
+        return [categories[lookup[name] if name in lookup 
+                           else self.lookup_code(name)] for name in names]
@@ -0,0 +1,165 @@
+import numpy as np
+import json
+import os
+from recipe import Recipe
+from recipe_instructions import RecipeInstructions
+from ingredient import Ingredient
+from genome import UNITS
+from resources import RESOURCES
+
+CHECKPOINT_VERSION = 1
+COMPONENTS = ["flavor", "dissimilarity", "emotion", "length"]
+
+
+def rng_state(rng):
+    """ Returns the complete state of a generator as a JSON-serializable
+        dictionary: the bit generator state and the seed sequence with its
+        count of spawned children, which decides the streams it spawns next.
+        Args:
+            rng (np.random.Generator) : the generator
+    """
+    seed_seq = rng.bit_generator.seed_seq
+    return {"bit_generator": rng.bit_generator.state,
+            "seed_sequence": {"entropy": seed_seq.entropy,
+                              "spawn_key": list(seed_seq.spawn_key),
+                              "pool_size": seed_seq.pool_size,
+                              "n_children_spawned":
+                                  seed_seq.n_children_spawned}}
+
+
+def restore_rng(state):
+    """ Returns a generator in the state saved by rng_state.
+        Args:
+            state (dict) : the saved state
+    """
+    seq = state["seed_sequence"]
+    seed_seq = np.random.SeedSequence(
+        seq["entropy"], spawn_key=seq["spawn_key"],
+        pool_size=seq["pool_size"],
+        n_children_spawned=seq["n_children_spawned"])
+    bit_generator = getattr(np.random,
+                            state["bit_generator"]["bit_generator"])(seed_seq)
+    bit_generator.state = state["bit_generator"]
+    return np.random.Generator(bit_generator)
+
+
+def recipe_ingredients(recipe):
+    """ Returns the ingredient objects of a recipe in the order of its
+        ingredient dictionaries, which decides the order they are printed in.
+        Args:
+            recipe (Recipe) : the recipe
+    """
+    base, flavor = recipe.base_ingredients, recipe.flavor_ingredients
+    return [ing for ing_dic in [base.flour, base.sugars, base.fats, base.dry,
+                                base.wet, flavor.spices, flavor.mix_ins,
+                                flavor.oils]
+            for ing in ing_dic.values()]
+
+
+def save_checkpoint(path, generation, populations, rng):
+    """ Writes the state of a run to an uncompressed .npz file: the 
+        ingredients of every recipe as flat ID, amount and unit arrays, the
+        weighted fitness components, and a JSON header with the generation,
+        emotions, recipe names, instructions, vocabulary and generator state.
+        The file is written next to path and then renamed, so an interrupted
+        write never replaces a good checkpoint.
+        Args:
+            path (str) : path of the checkpoint file
+            generation (int) : number of completed generations
+            populations (dict) : recipes of every population by emotion
+            rng (np.random.Generator) : generator of the run
+    """
+    vocabulary = RESOURCES.get_vocabulary()
+    ids, amounts, units, offsets, components = [], [], [], [0], []
+    names, instructions = [], []
+    for recipes in populations.values():
+        for recipe in recipes:
+            ings = recipe_ingredients(recipe)
+            ids.extend(vocabulary.intern(ing.get_name()) for ing in ings)
+            amounts.extend(ing.get_amount() for ing in ings)
+            units.extend(UNITS.intern(ing.unit) for ing in ings)
+            offsets.append(offsets[-1] + len(ings))
+            components.append([recipe.fitness.components[name]
+                               for name in COMPONENTS])
+            names.append(recipe.name)
+            instructions.append([param.item() if hasattr(param, "item")
+                                 else param for param 
+                                 in recipe.get_instructions().get_params()])
+    header = {"version": CHECKPOINT_VERSION, "generation": generation,
+              "sizes": {emotion: len(recipes)
+                        for emotion, recipes in populations.items()},
+              "names": names, "instructions": instructions,
+              "vocabulary": vocabulary.names,
+              "units": UNITS.names, "rng": rng_state(rng)}
+
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, header=np.array(json.dumps(header)),
+                 ids=np.array(ids, dtype=np.int32),
+                 amounts=np.array(amounts, dtype=np.float64),
+                 units=np.array(units, dtype=np.int8),
+                 offsets=np.array(offsets, dtype=np.int64),
+                 components=np.array(components, dtype=np.float64))
+    os.replace(temp_path, path)
+
+
+def extend_vocabulary(vocabulary, names):
+    """ Interns the names a checkpoint was written with, so that ingredient
+        IDs mean the same as when it was written. Raises ValueError if the
+        names this process already assigned differ.
+        Args:
+            vocabulary (Vocabulary) : vocabulary of this process
+            names (list) : vocabulary of the checkpoint, in ID order
+    """
+    shared = min(len(vocabulary), len(names))
+    if vocabulary.names[:shared] != names[:shared]:
+        raise ValueError("Checkpoint was written with other ingredient data")
+    for name in names[shared:]:
+        vocabulary.intern(name)
+
+
+def load_checkpoint(path):
+    """ Reads a checkpoint written by save_checkpoint and returns a dictionary
+        with the generation, the rebuilt and scored recipes of every
+        population by emotion, and the restored generator.
+        Args:
+            path (str) : path of the checkpoint file
+    """
+    with np.load(path) as data:
+        header = json.loads(data["header"].item())
+        if header["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version "
+                             f"{header['version']}")
+        arrays = {key: data[key] for key in ["ids", "amounts", "units",
+                                             "offsets", "components"]}
+    vocabulary = RESOURCES.get_vocabulary()
+    extend_vocabulary(vocabulary, header["vocabulary"])
+    extend_vocabulary(UNITS, header["units"])
+
+    # rebuilding recipes draws a name, which must not advance the run's
+    # generator; surviving recipes are never mutated again
+    scratch_rng = np.random.default_rng()
+    offsets = arrays["offsets"].tolist()
+    ids, amounts = arrays["ids"].tolist(), arrays["amounts"].tolist()
+    units = arrays["units"].tolist()
+    populations, index = {}, 0
+    for emotion, size in header["sizes"].items():
+        recipes = []
+        for i in range(index, index + size):
+            ings = [Ingredient(vocabulary.get_name(ids[j]), amounts[j],
+                               UNITS.get_name(units[j]))
+                    for j in range(offsets[i], offsets[i + 1])]
+            instructions = RecipeInstructions(
+                emotion, *header["instructions"][i], rng=scratch_rng)
+            recipe = Recipe(ings, emotion, instructions, scratch_rng)
+            recipe.name = header["names"][i]
+            recipe.fitness.set_components(
+                dict(zip(COMPONENTS, arrays["components"][i].tolist())))
+            recipes.append(recipe)
+        populations[emotion] = recipes
+        index += size
+    return {"generation": header["generation"], "populations": populations,
+            "rng": restore_rng(header["rng"])}
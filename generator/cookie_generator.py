@@ -1,6 +1,29 @@
 import numpy as np
+import argparse
+import csv
+import json
 import os
+import sys
+import time
 from recipe import Recipe
+from ingredient import Ingredient
+from fitness import Fitness, PopulationFitness
+from selection import select_parents
+from genome import crossover_genomes
+from breeding import OffspringBreeder
+from fitness_cache import open_cache, close_caches
+from resources import RESOURCES
+from neighbors import NEIGHBOR_INDEXES, missing_dependencies
+from paths import FITTEST_RECIPES_DIR, FITNESS_CACHE_PATH
+from telemetry import PhaseTimer, JsonlTrace, generation_record, fitness_stats
+from stopping import StoppingCriteria
+from export import (FORMATS, top_recipes, export_recipes, run_directory,
+                    missing_format_dependencies)
+import checkpoint
+
+
+EMOTION_DIC = {"1" : "Happy", "2" : "Sad", "3": "Angry",
+               "4" : "Excited", "5" : "Tired", "6" : "Stressed"}
 
 
 class RecipeManager():
@@ -15,11 +38,47 @@ class RecipeManager():
         Current recipes in genetic algorithm.
     emotion : string
         Emotion that recipes will be based on.
+    cache_stats : list
+        Fitness cache (hits, misses) recorded for each generation.
+    selection : string
+        Parent selection strategy, a key of selection.SELECTION_STRATEGIES.
+    breeder : OffspringBreeder
+        Creates and scores offspring, serially or over a process pool.
+    rng : np.random.Generator
+        Random number generator every random choice of the run derives from.
+    observers : list
+        Callables receiving the telemetry record of every generation.
+    fitness_cache : string
+        Persistent fitness cache file, None to score every recipe.
+    population_size : int
+        Number of recipes in the population, None for the number of 
+        inspiring recipes.
+    offspring : int
+        Number of offspring bred every generation, None for one per recipe.
+    elitism : int
+        Number of the fittest recipes kept in every generation, the rest 
+        being the fittest offspring. If population_size, offspring and 
+        elitism are all None, the fittest half of the old and of the new 
+        recipes survive.
+    generation : int
+        Number of generations the population evolved for, including those
+        before a resumed checkpoint.
+    generations_run : int
+        Number of generations completed by the last run.
+    stop_reason : string
+        Why the last run stopped: "generations", "plateau", "diversity" or
+        "deadline", None while running or if the caller stopped iterating.
+    checkpoint_path : string
+        File the run is periodically saved to, None to not save it.
+    checkpoint_every : int
+        Number of generations between checkpoints.
     
     Methods
     -------
     parse_files():
         Reads inspiring recipe files and populates recipe list with Recipes.
+    perturbed_copy(recipe):
+        Returns a mutated copy of a recipe seeding the population.
     emotion_prompt():
         Asks user for their current emotion.
     set_emotion():
@@ -30,32 +89,118 @@ class RecipeManager():
         Returns the fittest 50% of the recipe set.
     crossover():
         Combines two recipes by based on probability selection processes.
-    genetic_algo():
+    select_parent_genomes():
+        Chooses the parent genome pairs of the next offspring.
+    survive(new_recipes):
+        Keeps the fittest old and new recipes as the next generation.
+    genetic_algo(timer):
         Runs the high-level genetic algorithm.
     run_genetic_algo():
         Runs the genetic algorithm however many times the user chose.
-    write_fittest_recipe():
-        Writes the fittest recipe to a file.
+    iter_generations(generations, top_k):
+        Runs the genetic algorithm, yielding a snapshot after every
+        generation.
+    aiter_generations(generations, top_k):
+        Asynchronous iterator version of iter_generations.
+    snapshot(generation, top_k, stop_reason):
+        Returns the best recipes and fitness statistics of the population.
+    add_observer(observer):
+        Registers a callable receiving every generation's telemetry.
+    write_fittest_recipe(output_dir, top_k, formats):
+        Writes the fittest recipes to files.
+    set_checkpoint(path, every):
+        Saves the run to a checkpoint file every few generations.
+    save_checkpoint(path):
+        Saves the population, generation and random state to a file.
+    load_checkpoint(path):
+        Resumes the population, generation and random state from a file.
+    close():
+        Releases the offspring worker processes.
     """
 
-    def __init__(self):
+    def __init__(self, selection="roulette", workers=1, breeder=None,
+                 seed=None, rng=None, fitness_cache=None, population_size=None,
+                 offspring=None, elitism=None):
         """ Initializes the object by creating an empty recipe list and emotion
             string to be populated later.
+            Args:
+                selection (str) : parent selection strategy ("roulette",
+                                  "sus", "tournament" or "rank")
+                workers (int) : number of processes creating offspring
+                breeder (OffspringBreeder) : breeder shared with other
+                                             managers, replacing workers
+                seed (int) : seed of the run, None for an unseeded run
+                rng (np.random.Generator) : generator shared with other
+                                            managers, replacing seed
+                fitness_cache (str) : persistent fitness cache file used by
+                                      the manager's own breeder and the
+                                      initial population, None for none
+                population_size (int) : number of recipes in the population,
+                                        None for the inspiring set's size
+                offspring (int) : offspring per generation, None for the
+                                  population size
+                elitism (int) : fittest recipes kept every generation, None
+                                for half the population
         """
+        if population_size is not None and elitism is not None and \
+                not 0 <= elitism <= population_size:
+            raise ValueError("elitism must be between 0 and the population "
+                             "size")
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
         self.recipes = []
         self.emotion = ""
+        self.cache_stats = []
+        self.selection = selection
+        self.fitness_cache = fitness_cache
+        self.population_size = population_size
+        self.offspring = offspring
+        self.elitism = elitism
+        self.breeder = breeder if breeder is not None \
+            else OffspringBreeder(workers, cache_path=fitness_cache)
+        self.observers = []
+        self.generation = 0
+        self.generations_run = 0
+        self.stop_reason = None
+        self.checkpoint_path = None
+        self.checkpoint_every = 10
     
     def parse_files(self):
         """ Read file of recipes and populates recipe list with recipe object,
-            passing in a list representation of recipe.
+            passing in a list representation of recipe. The inspiring set is
+            parsed once into the resource registry's corpus and shared by all
+            managers. A population_size beyond the inspiring set is filled
+            with perturbed copies of randomly chosen inspiring recipes; a
+            smaller one keeps the fittest inspiring recipes.
         """
         print("Reading Initial Recipe Files")
-        dir = "../inspiring_set"
-        for file in os.listdir(dir):
-            with open(dir + "/" + file, "r") as f:
-                recipe_str = f.readlines()
-                new_recipe = Recipe(recipe_str, self.emotion)
-                self.recipes.append(new_recipe)
+        corpus = RESOURCES.get_corpus()
+        for i in range(len(corpus)):
+            ings = [Ingredient(name, amount, unit)
+                    for name, amount, unit in corpus.ingredients(i)]
+            self.recipes.append(Recipe(ings, self.emotion, rng=self.rng))
+        if self.population_size is not None:
+            inspiring = list(self.recipes)
+            while len(self.recipes) < self.population_size:
+                parent = inspiring[self.rng.integers(len(inspiring))]
+                self.recipes.append(self.perturbed_copy(parent))
+        cache = None
+        if self.fitness_cache is not None:
+            cache = open_cache(self.fitness_cache)
+        PopulationFitness(self.recipes).evaluate(cache=cache)
+        if self.population_size is not None:
+            self.recipes = top_recipes(self.recipes, self.population_size)
+
+    def perturbed_copy(self, recipe):
+        """ Returns a copy of a recipe with one mutation of its base 
+            ingredients and one of its flavor ingredients, used to seed
+            populations larger than the inspiring set.
+            Args:
+                recipe (Recipe) : the recipe to copy
+        """
+        copy = Recipe.from_genome(recipe.get_genome(), self.emotion, self.rng)
+        copy.base_ingredients.mutate()
+        copy.flavor_ingredients.mutate()
+        return copy
     
     def emotion_prompt(self):
         """ Asks the user what emotion they are feeling and returns the
@@ -66,17 +211,21 @@ class RecipeManager():
             "(6) : Stressed \n Input Number 1-6: ")
         return emotion_key
     
-    def set_emotion(self):
+    def set_emotion(self, emotion=None):
         """ Sets the emotion instance variable for the current system's state
-            based on the user input.
+            based on the user input. An emotion given as argument (a key 1-6
+            or an emotion name) is used instead of prompting.
+            Args:
+                emotion (str) : emotion key or name, None to ask the user
         """
-        emotion_dic ={"1" : "Happy", "2" : "Sad", "3": "Angry",
-                     "4" : "Excited", "5" : "Tired", "6" : "Stressed"}
+        if emotion is not None:
+            self.emotion = parse_emotion(emotion)
+            return
         emotion_key = self.emotion_prompt()
-        while emotion_key not in emotion_dic.keys():
+        while emotion_key not in EMOTION_DIC.keys():
             print("\nUnknown Emotion Key: Try Again!\n")
             emotion_key = self.emotion_prompt()
-        self.emotion = emotion_dic[emotion_key]
+        self.emotion = EMOTION_DIC[emotion_key]
         print(f"\nYou are feeling {self.emotion.lower()}!\n")
     
     def get_emotion(self):
@@ -96,73 +245,242 @@ class RecipeManager():
         """ Chooses the base ingredients from one recipe with equal 
             probability. Chooses a random pivot index to concatenate the flavor
             ingredients. Creates a new recipe object with these ingredients. 
+            The recipes are combined through their compact genomes, so no
+            ingredient strings are formatted or parsed.
             Args:
                 recipe1 (Recipe) : first recipe to be crossed
                 recipe2 (Recipe) : second recipe to be crossed
         """
-        # choose base ingredients of one recipe with equal probability 
-        new_base = np.random.choice([recipe1, recipe2]).get_base_ing_strings()
-
-        # randomly select pivot to split flavor ingredients
-        recipe1_flavor_strs = recipe1.get_flavor_ing_strings()
-        recipe2_flavor_strs = recipe2.get_flavor_ing_strings()
-        pivot = np.random.randint(0, min(len(recipe1_flavor_strs), 
-                                         len(recipe1_flavor_strs)))
-        new_flavors = recipe1_flavor_strs[:pivot] + recipe2_flavor_strs[pivot:]
+        new_genome = crossover_genomes(recipe1.get_genome(), 
+                                       recipe2.get_genome(), self.rng)
+        return Recipe.from_genome(new_genome, self.emotion, self.rng)
 
-        # choose instructions of one recipe with equal probability 
-        new_instrs = np.random.choice([recipe1, recipe2]).get_instructions()
-        new_recipe = Recipe(new_base + new_flavors, self.emotion, new_instrs)
-        return new_recipe
-
-    def genetic_algo(self):
+    def genetic_algo(self, timer=None):
         """ Iterate len(self.recipes) times. Choose recipe1 and recipe2 based 
-            on fitness probabilites and cross them over (making new recipe 
+            on fitness probabilites (all pairs are drawn up front with the
+            selection strategy) and cross them over (making new recipe 
             object). Then it's going to call the mutate function on it and 
-            stores all of the new recipes in new_recipes. At the end, it is 
-            going to taking the top 50% of the new and old recipes and store 
-            it in self.recipes. 
-        """
-        new_recipes = []
-        for _ in range(len(self.recipes)):
-            #choose two recipes based on probs corresponding to their fitnesses
-            fitnesses = [recipe.get_fitness() for recipe in self.recipes]
-            sum_fit = sum(fitnesses)
-            p = [fit / sum_fit for fit in fitnesses]
-            recipe1, recipe2 = np.random.choice(self.recipes, p = p, size = 2, 
-                                                replace = False)
-
-            #cross the recipes together
-            new_recipe = self.crossover(recipe1, recipe2)
-            # call recipe to be potentially mutated
-            new_recipe.mutate()
-            new_recipes.append(new_recipe)
-
-        #keep top 50% of old and newly generated recipes for next generation
-        self.recipes = (self.fittest_half(self.recipes) + 
-                        self.fittest_half(new_recipes))   
-
-    def run_genetic_algo(self, generations):
+            stores all of the new recipes in new_recipes, which are scored in
+            batches. The offspring are bred by self.breeder, which may spread
+            this work over worker processes. At the end, it is going to taking
+            the top 50% of the new and old recipes and store it in 
+            self.recipes. 
+            Args:
+                timer (PhaseTimer) : timer the time of every phase is added
+                                     to, None to not record it
+        """
+        timer = timer if timer is not None else PhaseTimer()
+        with timer.phase("selection"):
+            parent_genomes = self.select_parent_genomes()
+        new_recipes = self.breeder.breed(parent_genomes, self.emotion, 
+                                         self.rng, timer)
+        with timer.phase("survival"):
+            self.survive(new_recipes)
+
+    def select_parent_genomes(self):
+        """ Chooses one pair of parents per offspring (by default one per
+            recipe) based on probabilities corresponding to their fitnesses 
+            and returns their genomes.
+        """
+        fitnesses = [recipe.get_fitness() for recipe in self.recipes]
+        count = self.offspring if self.offspring is not None \
+            else len(self.recipes)
+        parents = select_parents(fitnesses, count, self.selection, self.rng)
+        genomes = [recipe.get_genome() for recipe in self.recipes]
+        return [(genomes[i], genomes[j]) for i, j in parents]
+
+    def survive(self, new_recipes):
+        """ Keeps the elitism fittest old recipes and fills the rest of the
+            population with the fittest offspring, or if no population 
+            parameter was given, keeps the top 50% of old and newly generated
+            recipes for the next generation.
+            Args:
+                new_recipes (list) : the scored offspring of this generation
+        """
+        if (self.population_size, self.offspring, self.elitism) == \
+                (None, None, None):
+            self.recipes = (self.fittest_half(self.recipes) + 
+                            self.fittest_half(new_recipes))
+            return
+        size = self.population_size if self.population_size is not None \
+            else len(self.recipes)
+        elitism = self.elitism if self.elitism is not None else size // 2
+        elites = top_recipes(self.recipes, elitism)
+        children = top_recipes(new_recipes, size - elitism)
+        # too few offspring: fill up with the next fittest old recipes
+        if len(children) < size - elitism:
+            children += top_recipes(self.recipes, size - len(children)
+                                    )[elitism:]
+        self.recipes = elites + children
+
+    def run_genetic_algo(self, generations, stopping=None):
         """ Run genetic algorithm for the # of generations that the user 
-            inputs.
+            inputs, or fewer if a stopping criterion is met first. The number
+            of generations run and the reason to stop are stored in
+            generations_run and stop_reason.
+            Args:
+                generations (int) : number of times the genetic algo will run,
+                                    None to run until a criterion stops it
+                stopping (StoppingCriteria) : early stopping criteria
+        """
+        if generations is None and stopping is None:
+            raise ValueError("A run needs a generation count or stopping "
+                             "criteria")
+        for _ in self.iter_generations(generations, stopping=stopping):
+            pass
+
+    def iter_generations(self, generations=None, top_k=3, stopping=None):
+        """ Runs the genetic algorithm one generation at a time and yields a
+            snapshot (see snapshot) as soon as each generation completes.
+            The caller can stop early by no longer iterating. Otherwise the
+            run ends after the given number of generations or once a 
+            stopping criterion is met, which the last snapshot reports.
+            Args:
+                generations (int) : number of generations, None to run until
+                                    the caller or a criterion stops
+                top_k (int) : number of best recipes in every snapshot
+                stopping (StoppingCriteria) : early stopping criteria
+        """
+        if stopping is not None:
+            stopping.reset()
+        self.generations_run = 0
+        self.stop_reason = None
+        while generations is None or self.generations_run < generations:
+            print("Running genetic algorithm for generation "
+                  f"{self.generation + 1}")
+            Fitness.reset_cache_stats()
+            timer = PhaseTimer()
+            start = time.perf_counter()
+            self.genetic_algo(timer)  
+            seconds = time.perf_counter() - start
+            self.generation += 1
+            hits, misses = Fitness.get_cache_stats()
+            self.cache_stats.append((hits, misses))
+            print(f"Fitness cache: {hits} hits, {misses} misses")
+            if self.observers:
+                record = generation_record(self.generation, seconds, timer,
+                                           {self.emotion: self.recipes},
+                                           (hits, misses))
+                for observer in self.observers:
+                    observer(record)
+            self.generations_run += 1
+            self.stop_reason = stop_reason(self.generations_run, generations,
+                                           stopping, 
+                                           {self.emotion: self.recipes})
+            if self.checkpoint_due():
+                self.save_checkpoint(self.checkpoint_path)
+            yield self.snapshot(self.generation, top_k, self.stop_reason)
+            if self.stop_reason is not None:
+                if self.stop_reason != "generations":
+                    print(f"Stopping early: {self.stop_reason}")
+                return
+        self.stop_reason = "generations"
+
+    def aiter_generations(self, generations=None, top_k=3, stopping=None):
+        """ Returns an asynchronous iterator over the snapshots of
+            iter_generations. Every generation runs in a worker thread, so
+            the event loop stays responsive while it is computed.
+            Args:
+                generations (int) : number of generations, None to run until
+                                    the caller or a criterion stops
+                top_k (int) : number of best recipes in every snapshot
+                stopping (StoppingCriteria) : early stopping criteria
+        """
+        return iterate_async(self.iter_generations(generations, top_k,
+                                                   stopping))
+
+    def snapshot(self, generation, top_k=3, stop_reason=None):
+        """ Returns a dictionary describing the current population: the 
+            generation number, the emotion, the fittest recipe, the top_k 
+            fittest recipes (fittest first), the fitness minimum, mean and
+            maximum and the reason the run stopped after this generation, if
+            it did.
+            Args:
+                generation (int) : number of the completed generation
+                top_k (int) : number of best recipes to include
+                stop_reason (str) : reason the run stops, None if it goes on
+        """
+        top = top_recipes(self.recipes, top_k)
+        return {"generation": generation, "emotion": self.emotion,
+                "best": top[0], "top": top, 
+                "fitness": fitness_stats(self.recipes),
+                "stop_reason": stop_reason}
+
+    def add_observer(self, observer):
+        """ Registers a callable that is passed the telemetry record of every
+            following generation: its wall time, the time spent in every 
+            phase (see telemetry.PHASES), the fitness cache statistics and
+            the fitness statistics and diversity of the population.
             Args:
-                generations (int) : number of times the genetic algo will run
+                observer (function) : callable taking the record dictionary
         """
-        for i in range(generations):
-            print(f"Running genetic algorithm for generation {i + 1}")
-            self.genetic_algo()  
+        self.observers.append(observer)
     
-    def write_fittest_recipe(self):
-        """ Writes the top fittest recipe to files in the fittest recipes 
-            folder.
+    def write_fittest_recipe(self, output_dir=FITTEST_RECIPES_DIR, top_k=1,
+                             formats=("text",)):
+        """ Writes the top_k fittest recipes to files in the fittest recipes 
+            folder and returns the paths of the written files, rank_1.txt 
+            first when the text format is written (see 
+            export.export_recipes).
+            Args:
+                output_dir (str) : folder the recipes are written to
+                top_k (int) : number of recipes to write
+                formats (list) : output formats among export.FORMATS
         """
-        sorted_recipes = sorted(self.recipes, key = lambda x : x.get_fitness())
-        recipe = sorted_recipes[-1]
+        recipe = top_recipes(self.recipes, 1)[0]
         print(f"\nWriting {recipe.get_name()} recipe!!!")
         print("Metrics: ")
         recipe.get_fitness(do_print=True)
-        with open("fittest_recipes/rank_" + str(1) + ".txt", "w") as f:
-            f.writelines(str(recipe))
+        return export_recipes(self.recipes, output_dir, top_k, formats)
+
+    def set_checkpoint(self, path, every=10):
+        """ Saves the run to a checkpoint file after every given number of
+            generations and after the last generation of a run.
+            Args:
+                path (str) : path of the checkpoint file, None to stop saving
+                every (int) : number of generations between checkpoints
+        """
+        self.checkpoint_path = path
+        self.checkpoint_every = every
+
+    def checkpoint_due(self):
+        """ Returns whether a checkpoint is to be saved after the generation
+            that just completed.
+        """
+        return self.checkpoint_path is not None and \
+            (self.generation % self.checkpoint_every == 0 or
+             self.stop_reason is not None)
+
+    def save_checkpoint(self, path):
+        """ Saves the population with its fitness, the generation, emotion
+            and random state to a file (see checkpoint.save_checkpoint).
+            Args:
+                path (str) : path of the checkpoint file
+        """
+        checkpoint.save_checkpoint(path, self.generation,
+                                   {self.emotion: self.recipes}, self.rng)
+
+    def load_checkpoint(self, path):
+        """ Replaces the population, emotion, generation and random state
+            with those saved in a checkpoint, so the run continues exactly as
+            if it had not been interrupted, given the same selection strategy.
+            Args:
+                path (str) : path of the checkpoint file
+        """
+        state = checkpoint.load_checkpoint(path)
+        if len(state["populations"]) != 1:
+            raise ValueError("Checkpoint holds several emotions, resume it "
+                             "with a MultiEmotionManager")
+        (self.emotion, self.recipes), = state["populations"].items()
+        self.generation = state["generation"]
+        self.rng = state["rng"]
+
+    def close(self):
+        """ Shuts down the offspring worker processes, if any were started,
+            and closes the fitness caches, writing their use times.
+        """
+        self.breeder.close()
+        close_caches()
 
     def print_metrics(self):
         """ Prints metric components of the top 3 and lowest 3 fittest recipes.
@@ -180,21 +498,689 @@ class RecipeManager():
             print("total fitness: ", tot, "\n")
         
 
-def main():
-    manager = RecipeManager()
-    manager.set_emotion()
-    emotion = manager.get_emotion()
+class MultiEmotionManager():
+    """ Evolves one population per emotion at the same time. All populations
+        share the loaded scoring resources and one offspring breeder, and the
+        offspring of every emotion are bred and scored in a single batch per
+        generation, so several emotions cost close to a single run.
+
+    ...
+
+    Attributes
+    ----------
+    managers : dict
+        RecipeManager of every emotion, keyed by emotion name.
+    breeder : OffspringBreeder
+        Creates and scores the offspring of all emotions.
+    rng : np.random.Generator
+        Random number generator shared by all emotions.
+    observers : list
+        Callables receiving the telemetry record of every generation.
+    generation : int
+        Number of generations the populations evolved for.
+    generations_run : int
+        Number of generations completed by the last run.
+    stop_reason : string
+        Why the last run stopped, see RecipeManager.stop_reason.
+    checkpoint_path : string
+        File the run is periodically saved to, None to not save it.
+    checkpoint_every : int
+        Number of generations between checkpoints.
+
+    Methods
+    -------
+    parse_files():
+        Populates every emotion's population with the inspiring set.
+    genetic_algo(timer):
+        Runs one generation for every emotion.
+    run_genetic_algo(generations):
+        Runs the given number of generations for every emotion.
+    iter_generations(generations, top_k):
+        Runs the generations, yielding a snapshot of every emotion after
+        each one.
+    aiter_generations(generations, top_k):
+        Asynchronous iterator version of iter_generations.
+    add_observer(observer):
+        Registers a callable receiving every generation's telemetry.
+    write_fittest_recipes(output_dir, top_k, formats):
+        Writes the fittest recipes of every emotion.
+    set_checkpoint(path, every):
+        Saves the run to a checkpoint file every few generations.
+    save_checkpoint(path):
+        Saves every population, the generation and random state to a file.
+    load_checkpoint(path):
+        Resumes every population, the generation and random state.
+    close():
+        Releases the offspring worker processes.
+    """
+
+    def __init__(self, emotions=EMOTION_DIC.values(), selection="roulette",
+                 workers=1, seed=None, fitness_cache=None, population_size=None,
+                 offspring=None, elitism=None):
+        """ Creates one RecipeManager per emotion sharing a single breeder
+            and random number generator.
+            Args:
+                emotions (iterable) : emotion keys or names to evolve
+                selection (str) : parent selection strategy
+                workers (int) : number of processes creating offspring
+                seed (int) : seed of the run, None for an unseeded run
+                fitness_cache (str) : persistent fitness cache file, None
+                                      to score every recipe
+                population_size (int) : recipes in every population, see
+                                        RecipeManager
+                offspring (int) : offspring per population and generation
+                elitism (int) : fittest recipes kept every generation
+        """
+        self.breeder = OffspringBreeder(workers, cache_path=fitness_cache)
+        self.rng = np.random.default_rng(seed)
+        self.observers = []
+        self.generation = 0
+        self.generations_run = 0
+        self.stop_reason = None
+        self.checkpoint_path = None
+        self.checkpoint_every = 10
+        self.managers = {}
+        for emotion in emotions:
+            manager = RecipeManager(selection=selection, breeder=self.breeder,
+                                    rng=self.rng, fitness_cache=fitness_cache,
+                                    population_size=population_size,
+                                    offspring=offspring, elitism=elitism)
+            manager.set_emotion(emotion)
+            self.managers[manager.get_emotion()] = manager
+
+    def parse_files(self):
+        """ Populates every emotion's population with the inspiring set, 
+            which is read only once.
+        """
+        for manager in self.managers.values():
+            manager.parse_files()
+
+    def genetic_algo(self, timer=None):
+        """ Selects parents within every emotion's population, breeds and 
+            scores all offspring together and hands each emotion its own
+            offspring for survival.
+            Args:
+                timer (PhaseTimer) : timer the time of every phase is added
+                                     to, None to not record it
+        """
+        timer = timer if timer is not None else PhaseTimer()
+        parent_genomes, emotions, counts = [], [], []
+        with timer.phase("selection"):
+            for emotion, manager in self.managers.items():
+                pairs = manager.select_parent_genomes()
+                parent_genomes.extend(pairs)
+                emotions.extend([emotion] * len(pairs))
+                counts.append(len(pairs))
+        new_recipes = self.breeder.breed(parent_genomes, emotions, self.rng,
+                                         timer)
+        start = 0
+        with timer.phase("survival"):
+            for manager, count in zip(self.managers.values(), counts):
+                manager.survive(new_recipes[start:start + count])
+                start += count
+
+    def run_genetic_algo(self, generations, stopping=None):
+        """ Runs the genetic algorithm for every emotion.
+            Args:
+                generations (int) : number of times the genetic algo will run,
+                                    None to run until a criterion stops it
+                stopping (StoppingCriteria) : early stopping criteria, met 
+                                              when met by every emotion
+        """
+        if generations is None and stopping is None:
+            raise ValueError("A run needs a generation count or stopping "
+                             "criteria")
+        for _ in self.iter_generations(generations, stopping=stopping):
+            pass
+
+    def iter_generations(self, generations=None, top_k=3, stopping=None):
+        """ Runs the genetic algorithm for every emotion one generation at a 
+            time and yields, after each one, a dictionary with the generation
+            number, the RecipeManager.snapshot of every emotion under
+            "populations" and the reason the run stops, if it does.
+            Args:
+                generations (int) : number of generations, None to run until
+                                    the caller or a criterion stops
+                top_k (int) : number of best recipes in every snapshot
+                stopping (StoppingCriteria) : early stopping criteria
+        """
+        if stopping is not None:
+            stopping.reset()
+        self.generations_run = 0
+        self.stop_reason = None
+        while generations is None or self.generations_run < generations:
+            print("Running genetic algorithm for generation "
+                  f"{self.generation + 1}")
+            Fitness.reset_cache_stats()
+            timer = PhaseTimer()
+            start = time.perf_counter()
+            self.genetic_algo(timer)
+            seconds = time.perf_counter() - start
+            self.generation += 1
+            populations = {emotion: manager.recipes for emotion, manager
+                           in self.managers.items()}
+            if self.observers:
+                record = generation_record(self.generation, seconds, timer,
+                                           populations,
+                                           Fitness.get_cache_stats())
+                for observer in self.observers:
+                    observer(record)
+            self.generations_run += 1
+            self.stop_reason = stop_reason(self.generations_run, generations,
+                                           stopping, populations)
+            if self.checkpoint_due():
+                self.save_checkpoint(self.checkpoint_path)
+            yield {"generation": self.generation, 
+                   "populations": {emotion: manager.snapshot(
+                                       self.generation, top_k, 
+                                       self.stop_reason)
+                                   for emotion, manager 
+                                   in self.managers.items()},
+                   "stop_reason": self.stop_reason}
+            if self.stop_reason is not None:
+                if self.stop_reason != "generations":
+                    print(f"Stopping early: {self.stop_reason}")
+                return
+        self.stop_reason = "generations"
+
+    def aiter_generations(self, generations=None, top_k=3, stopping=None):
+        """ Returns an asynchronous iterator over the snapshots of
+            iter_generations, running every generation in a worker thread.
+            Args:
+                generations (int) : number of generations, None to run until
+                                    the caller or a criterion stops
+                top_k (int) : number of best recipes in every snapshot
+                stopping (StoppingCriteria) : early stopping criteria
+        """
+        return iterate_async(self.iter_generations(generations, top_k,
+                                                   stopping))
+
+    def add_observer(self, observer):
+        """ Registers a callable that is passed the telemetry record of every
+            following generation, holding one population entry per emotion.
+            Args:
+                observer (function) : callable taking the record dictionary
+        """
+        self.observers.append(observer)
+
+    def write_fittest_recipes(self, output_dir=FITTEST_RECIPES_DIR, top_k=1,
+                              formats=("text",)):
+        """ Writes the top_k fittest recipes of every emotion to a sub-folder
+            named after the emotion and returns the written paths by emotion.
+            Args:
+                output_dir (str) : parent folder of the emotion folders
+                top_k (int) : number of recipes written per emotion
+                formats (list) : output formats among export.FORMATS
+        """
+        return {emotion: manager.write_fittest_recipe(
+                    os.path.join(output_dir, emotion.lower()), top_k, formats)
+                for emotion, manager in self.managers.items()}
+
+    def set_checkpoint(self, path, every=10):
+        """ Saves the run to a checkpoint file after every given number of
+            generations and after the last generation of a run.
+            Args:
+                path (str) : path of the checkpoint file, None to stop saving
+                every (int) : number of generations between checkpoints
+        """
+        self.checkpoint_path = path
+        self.checkpoint_every = every
+
+    def checkpoint_due(self):
+        """ Returns whether a checkpoint is to be saved after the generation
+            that just completed.
+        """
+        return self.checkpoint_path is not None and \
+            (self.generation % self.checkpoint_every == 0 or
+             self.stop_reason is not None)
+
+    def save_checkpoint(self, path):
+        """ Saves every population with its fitness, the generation and the
+            shared random state to a file.
+            Args:
+                path (str) : path of the checkpoint file
+        """
+        checkpoint.save_checkpoint(
+            path, self.generation, {emotion: manager.recipes for emotion, 
+                                    manager in self.managers.items()},
+            self.rng)
+
+    def load_checkpoint(self, path):
+        """ Replaces every population, the generation and the shared random
+            state with those saved in a checkpoint of the same emotions.
+            Args:
+                path (str) : path of the checkpoint file
+        """
+        state = checkpoint.load_checkpoint(path)
+        if list(state["populations"]) != list(self.managers):
+            raise ValueError("Checkpoint holds the emotions " + 
+                             ", ".join(state["populations"]))
+        self.generation = state["generation"]
+        self.rng = state["rng"]
+        for emotion, manager in self.managers.items():
+            manager.recipes = state["populations"][emotion]
+            manager.rng = self.rng
+
+    def close(self):
+        """ Shuts down the shared offspring worker processes and closes the
+            fitness caches, writing their use times.
+        """
+        self.breeder.close()
+        close_caches()
+
 
-    generations = int(input(
-    "How many generations would you like to run this algorithm for? "))
+def stop_reason(generation, generations, stopping, populations):
+    """ Returns why a run stops after the given generation: "generations" 
+        when the generation count is reached, the reason returned by the
+        stopping criteria, or None if the run goes on.
+        Args:
+            generation (int) : number of the completed generation
+            generations (int) : generation count of the run, None if unbounded
+            stopping (StoppingCriteria) : early stopping criteria, or None
+            populations (dict) : recipes of every population by emotion
+    """
+    reason = None
+    if stopping is not None:
+        reason = stopping.check(generation, populations)
+    if reason is None and generations is not None and generation >= generations:
+        reason = "generations"
+    return reason
+
+
+async def iterate_async(iterator):
+    """ Asynchronous generator yielding the items of a blocking iterator,
+        each computed in a worker thread so the event loop is not blocked.
+        Args:
+            iterator (iterator) : the blocking iterator
+    """
+    # imported here, as asyncio noticeably slows down importing this module
+    import asyncio
 
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def parse_emotion(emotion):
+    """ Returns the emotion name for an emotion key (1-6) or a case-insensitive
+        emotion name, raising ValueError for anything else.
+        Args:
+            emotion (str) : emotion key or name
+    """
+    emotion = str(emotion).strip()
+    if emotion in EMOTION_DIC:
+        return EMOTION_DIC[emotion]
+    for name in EMOTION_DIC.values():
+        if emotion.lower() == name.lower():
+            return name
+    raise ValueError(f"Unknown emotion: {emotion}")
+
+
+def run_job(emotion, generations, seed=None, output_dir=FITTEST_RECIPES_DIR,
+            selection="roulette", breeder=None, observers=(), 
+            fitness_cache=None, stopping=None, top_k=1, formats=("text",),
+            population=None):
+    """ Runs the genetic algorithm once without prompting and returns a summary
+        dictionary of the run.
+        Args:
+            emotion (str) : emotion key or name
+            generations (int) : number of generations to run
+            seed (int) : seed of the run, None for an unseeded run
+            output_dir (str) : folder the fittest recipes are written to
+            selection (str) : parent selection strategy
+            breeder (OffspringBreeder) : breeder shared between jobs
+            observers (list) : callables receiving every generation's 
+                               telemetry record
+            fitness_cache (str) : persistent fitness cache file, None for 
+                                  none
+            stopping (StoppingCriteria) : early stopping criteria
+            top_k (int) : number of fittest recipes written
+            formats (list) : output formats among export.FORMATS
+            population (dict) : population_size, offspring and elitism
+                                arguments of the RecipeManager
+    """
+    start = time.perf_counter()
+    manager = RecipeManager(selection=selection, breeder=breeder, seed=seed,
+                            fitness_cache=fitness_cache, **(population or {}))
+    manager.set_emotion(emotion)
+    for observer in observers:
+        manager.add_observer(observer)
     manager.parse_files()
-    manager.run_genetic_algo(generations)
-    manager.write_fittest_recipe() 
+    manager.run_genetic_algo(generations, stopping)
+    paths = manager.write_fittest_recipe(output_dir, top_k, formats)
+    best = top_recipes(manager.recipes, 1)[0]
+    if breeder is None:
+        manager.close()
+    return {"emotion": manager.get_emotion(), "generations": generations,
+            "generations_run": manager.generations_run, 
+            "stop_reason": manager.stop_reason, "seed": seed, 
+            "output": paths[0], "files": paths, "best_name": best.name,
+            "best_fitness": float(best.get_fitness()),
+            "seconds": time.perf_counter() - start}
+
+
+def read_jobs(path):
+    """ Reads batch jobs from a JSON file holding a list of objects or from a
+        CSV file with a header row. Every job needs an emotion and may give a
+        number of generations and a seed; jobs without a number of 
+        generations run until the stopping criteria are met. Raises 
+        ValueError naming the row (counted from 1, without the CSV header) of
+        the first malformed job.
+        Args:
+            path (str) : path of the .json or .csv job file
+    """
+    with open(path, "r", newline="") as f:
+        if path.endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    jobs = []
+    for number, row in enumerate(rows, 1):
+        try:
+            seed = row.get("seed")
+            generations = row.get("generations")
+            jobs.append({"emotion": parse_emotion(row.get("emotion")),
+                         "generations": int(generations) 
+                                        if generations not in (None, "") 
+                                        else None,
+                         "seed": int(seed) if seed not in (None, "") 
+                                 else None})
+        except (AttributeError, TypeError, ValueError) as error:
+            raise ValueError(f"Row {number} of {path}: {error}") from error
+    return jobs
+
+
+def check_jobs(jobs, stopping=None):
+    """ Raises ValueError naming the row of the first job that could not end,
+        as it has no number of generations and no stopping criteria, so a 
+        batch fails before any of its jobs runs.
+        Args:
+            jobs (list) : job dictionaries as returned by read_jobs
+            stopping (StoppingCriteria) : early stopping criteria of every
+                                          job
+    """
+    for number, job in enumerate(jobs, 1):
+        if job["generations"] is None and stopping is None:
+            raise ValueError(f"Row {number} gives no generations and no "
+                             "--patience, --min-diversity or --deadline "
+                             "stops it")
+
+
+def run_batch(jobs, output_dir=FITTEST_RECIPES_DIR, selection="roulette", 
+              workers=1, trace=None, fitness_cache=None, stopping=None,
+              top_k=1, formats=("text",), population=None):
+    """ Runs many jobs in this process, so the scoring resources and worker
+        pool are set up only once, and returns the batch summary. Every job
+        writes to its own sub-folder of output_dir.
+        Args:
+            jobs (list) : job dictionaries as returned by read_jobs
+            output_dir (str) : parent folder of the per-job output folders
+            selection (str) : parent selection strategy
+            workers (int) : number of processes creating offspring
+            trace (function) : observer receiving the telemetry records of
+                               every job, tagged with the job number
+            fitness_cache (str) : persistent fitness cache file shared by
+                                  all jobs, None for none
+            stopping (StoppingCriteria) : early stopping criteria of every 
+                                          job
+            top_k (int) : number of fittest recipes every job writes
+            formats (list) : output formats among export.FORMATS
+            population (dict) : population_size, offspring and elitism 
+                                arguments of every job's RecipeManager
+    """
+    check_jobs(jobs, stopping)
+    start = time.perf_counter()
+    breeder = OffspringBreeder(workers, cache_path=fitness_cache)
+    results = []
+    try:
+        for i, job in enumerate(jobs):
+            job_dir = os.path.join(output_dir, f"job_{i + 1}")
+            observers = []
+            if trace is not None:
+                observers.append(
+                    lambda record, job=i + 1: trace({"job": job, **record}))
+            results.append(run_job(job["emotion"], job["generations"], 
+                                   job["seed"], job_dir, selection, breeder,
+                                   observers, fitness_cache, stopping,
+                                   top_k, formats, population))
+    finally:
+        breeder.close()
+        close_caches()
+    return {"jobs": results, "seconds": time.perf_counter() - start}
+
+
+def parse_args(argv=None):
+    """ Parses the command line arguments.
+        Args:
+            argv (list) : arguments to parse, None for sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Generate cookie recipes tailored to an emotion.")
+    parser.add_argument("--emotion", 
+                        help="emotion name or key 1-6, or 'all' to evolve "
+                             "every emotion at once; asked if omitted")
+    parser.add_argument("--generations", type=int,
+                        help="number of generations; asked if omitted and "
+                             "no stopping criterion is given")
+    parser.add_argument("--seed", type=int, help="random seed of the run")
+    parser.add_argument("--output-dir", default=FITTEST_RECIPES_DIR,
+                        help="folder the fittest recipes are written to")
+    parser.add_argument("--top-k", type=int, default=1,
+                        help="number of fittest recipes written, as "
+                             "rank_1 to rank_k")
+    parser.add_argument("--format", nargs="+", default=["text"],
+                        choices=FORMATS, dest="formats",
+                        help="output formats of the fittest recipes")
+    parser.add_argument("--per-run", action="store_true",
+                        help="write to a new, uniquely named folder inside "
+                             "the output folder, so concurrent runs do not "
+                             "overwrite each other")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes creating offspring")
+    parser.add_argument("--selection", default="roulette",
+                        choices=["roulette", "sus", "tournament", "rank"],
+                        help="parent selection strategy")
+    parser.add_argument("--population-size", type=int,
+                        help="number of recipes in the population, filled "
+                             "with mutated inspiring recipes; the inspiring "
+                             "set's size if omitted")
+    parser.add_argument("--offspring", type=int,
+                        help="number of offspring bred every generation; "
+                             "the population size if omitted")
+    parser.add_argument("--elitism", type=int,
+                        help="number of the fittest recipes kept every "
+                             "generation; half the population if omitted")
+    parser.add_argument("--batch", 
+                        help="JSON or CSV file of (emotion, generations, "
+                             "seed) jobs to run in one process")
+    parser.add_argument("--trace",
+                        help="JSONL file the telemetry of every generation "
+                             "is written to")
+    parser.add_argument("--fitness-cache", nargs="?", 
+                        const=FITNESS_CACHE_PATH,
+                        help="SQLite file caching fitness values across "
+                             "runs; the default file if no path is given")
+    parser.add_argument("--neighbors", choices=sorted(NEIGHBOR_INDEXES),
+                        help="score dissimilarity from the nearest "
+                             "inspiring recipes found by this index instead "
+                             "of comparing with every inspiring recipe")
+    parser.add_argument("--neighbors-k", type=int, default=16,
+                        help="number of nearest inspiring recipes used by "
+                             "--neighbors")
+    parser.add_argument("--patience", type=int,
+                        help="stop after this many generations without "
+                             "improvement of the best fitness")
+    parser.add_argument("--min-diversity", type=float,
+                        help="stop once the population diversity falls "
+                             "below this value")
+    parser.add_argument("--deadline", type=float,
+                        help="stop before the run exceeds this many seconds")
+    parser.add_argument("--checkpoint",
+                        help="file the run is saved to every few "
+                             "generations and at its end")
+    parser.add_argument("--checkpoint-every", type=int, default=10,
+                        help="number of generations between checkpoints")
+    parser.add_argument("--resume",
+                        help="checkpoint file to continue a run from; "
+                             "--generations then counts the generations "
+                             "before the checkpoint too")
+    parser.add_argument("--islands", type=int, default=1,
+                        help="number of populations evolved in separate "
+                             "processes, exchanging their fittest recipes")
+    parser.add_argument("--migration-interval", type=int, default=5,
+                        help="generations between island migrations")
+    parser.add_argument("--migrants", type=int, default=2,
+                        help="number of recipes sent by every migration")
+    parser.add_argument("--topology", default="ring", choices=["ring", "full"],
+                        help="islands every island sends migrants to")
+    parser.add_argument("--transport", default="queue",
+                        choices=["queue", "socket"],
+                        help="how migrants travel between island processes")
+    parser.add_argument("--island-secret",
+                        help="shared secret authenticating --transport "
+                             "socket connections; read from the "
+                             "EMOTIMAKER_ISLAND_SECRET environment variable "
+                             "if omitted, which keeps it out of the process "
+                             "list")
+    parser.add_argument("--summary",
+                        help="file the JSON summary of a batch is written "
+                             "to, printed if omitted")
+    args = parser.parse_args(argv)
+    if args.neighbors is not None and missing_dependencies(args.neighbors):
+        parser.error(f"--neighbors {args.neighbors} needs "
+                     f"{', '.join(missing_dependencies(args.neighbors))}, "
+                     "which is not installed")
+    if missing_format_dependencies(args.formats):
+        parser.error("--format needs "
+                     f"{', '.join(missing_format_dependencies(args.formats))}"
+                     ", which is not installed")
+    if args.islands > 1 and args.transport == "socket":
+        # imported here, as islands builds on this module
+        from islands import island_secret
+        try:
+            island_secret(args.island_secret)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.batch is not None:
+        try:
+            args.jobs = read_jobs(args.batch)
+            criteria = (args.patience, args.min_diversity, args.deadline)
+            if criteria == (None,) * 3:
+                check_jobs(args.jobs)
+        except (OSError, ValueError) as error:
+            parser.error(f"--batch: {error}")
+    return args
+
+
+def run_island_model(args, output_dir):
+    """ Runs the island model with the parsed command line arguments and 
+        writes the fittest recipes over all islands.
+        Args:
+            args (argparse.Namespace) : the parsed arguments
+            output_dir (str) : folder the fittest recipes are written to
+    """
+    # imported here, as islands builds on this module
+    from islands import run_islands
+
+    if args.emotion is None or args.emotion.lower() == "all":
+        raise ValueError("The island model needs a single --emotion")
+    if args.generations is None:
+        raise ValueError("The island model needs --generations")
+    result = run_islands(parse_emotion(args.emotion), args.generations, 
+                         args.islands, args.seed, args.migration_interval,
+                         args.migrants, args.topology, args.transport,
+                         args.selection, args.top_k, args.fitness_cache,
+                         population_args(args), args.island_secret)
+    for island in result["islands"]:
+        print(f"Island {island['island']}: fitness {island['fitness']}")
+    export_recipes(result["recipes"], output_dir, args.top_k, args.formats)
+    print("\nAll done :)")
+
+
+def population_args(args):
+    """ Returns the population_size, offspring and elitism arguments of a 
+        RecipeManager given on the command line.
+        Args:
+            args (argparse.Namespace) : the parsed arguments
+    """
+    return {"population_size": args.population_size, 
+            "offspring": args.offspring, "elitism": args.elitism}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.neighbors is not None:
+        RESOURCES.configure_neighbors(args.neighbors, args.neighbors_k)
+    trace = JsonlTrace(args.trace) if args.trace is not None else None
+    stopping = None
+    if (args.patience, args.min_diversity, args.deadline) != (None,) * 3:
+        stopping = StoppingCriteria(patience=args.patience, 
+                                    min_diversity=args.min_diversity,
+                                    deadline=args.deadline)
+    output_dir = args.output_dir
+    if args.per_run:
+        label = "batch" if args.batch is not None else args.emotion or "run"
+        output_dir = run_directory(output_dir, label, args.seed)
+    if args.batch is not None:
+        summary = run_batch(args.jobs, output_dir, 
+                            args.selection, args.workers, trace, 
+                            args.fitness_cache, stopping, args.top_k,
+                            args.formats, population_args(args))
+        if trace is not None:
+            trace.close()
+        if args.summary is not None:
+            with open(args.summary, "w") as f:
+                json.dump(summary, f, indent=2)
+        else:
+            json.dump(summary, sys.stdout, indent=2)
+        return
+
+    if args.islands > 1:
+        run_island_model(args, output_dir)
+        return
+    if args.emotion is not None and args.emotion.lower() == "all":
+        manager = MultiEmotionManager(selection=args.selection, 
+                                      workers=args.workers, seed=args.seed,
+                                      fitness_cache=args.fitness_cache,
+                                      **population_args(args))
+    else:
+        manager = RecipeManager(selection=args.selection, 
+                                workers=args.workers, seed=args.seed,
+                                fitness_cache=args.fitness_cache,
+                                **population_args(args))
+        if args.resume is None:
+            manager.set_emotion(args.emotion)
+    if trace is not None:
+        manager.add_observer(trace)
+
+    generations = args.generations
+    if generations is None and stopping is None:
+        generations = int(input(
+        "How many generations would you like to run this algorithm for? "))
+
+    if args.resume is not None:
+        manager.load_checkpoint(args.resume)
+        if generations is not None:
+            generations = max(generations - manager.generation, 0)
+    else:
+        manager.parse_files()
+    if args.checkpoint is not None:
+        manager.set_checkpoint(args.checkpoint, args.checkpoint_every)
+    manager.run_genetic_algo(generations, stopping)
+    if isinstance(manager, MultiEmotionManager):
+        manager.write_fittest_recipes(output_dir, args.top_k, args.formats)
+    else:
+        manager.write_fittest_recipe(output_dir, args.top_k, args.formats)
+    manager.close()
+    if trace is not None:
+        trace.close()
 
     #manager.print_metrics() #Uncomment to print top/bottom ranking metrics
     print("\nAll done :)")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
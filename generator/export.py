@@ -0,0 +1,162 @@
+import heapq
+import json
+import os
+import tempfile
+import time
+
+FORMATS = ["text", "jsonl", "parquet"]
+JSONL_FILE = "recipes.jsonl"
+PARQUET_FILE = "recipes.parquet"
+# optional modules of every format, as groups of which one module is needed
+FORMAT_REQUIRES = {"parquet": [("pandas",), ("pyarrow", "fastparquet")]}
+
+
+def top_recipes(recipes, k):
+    """ Returns the k fittest recipes, fittest first, without sorting the
+        whole population. Fitness values are only recomputed for recipes
+        that were mutated since they were scored.
+        Args:
+            recipes (list) : the scored recipes of a population
+            k (int) : number of recipes to return
+    """
+    return heapq.nlargest(k, recipes, key = lambda x : x.get_fitness())
+
+
+def recipe_record(recipe, rank):
+    """ Returns a JSON-serializable dictionary describing a recipe: its rank,
+        name, emotion, fitness and weighted fitness components, ingredient
+        lines, flavor amounts (grams for mix-ins, tsp for spices and oils)
+        and instructions.
+        Args:
+            recipe (Recipe) : the recipe
+            rank (int) : rank of the recipe in its population, starting at 1
+    """
+    flavors = recipe.flavor_ingredients
+    components = recipe.fitness.components
+    return {"rank": rank, "name": recipe.name, "emotion": recipe.emotion,
+            "fitness": float(recipe.get_fitness()),
+            "components": {name: float(value)
+                           for name, value in components.items()},
+            "base_ingredients": recipe.get_base_ing_strings(),
+            "flavor_ingredients": recipe.get_flavor_ing_strings(),
+            "flavor_amounts": dict(zip(
+                flavors.get_flavor_ing_names(),
+                (float(amount) for amount
+                 in flavors.get_flavor_ing_amounts()))),
+            "instructions": recipe.format_instructions()}
+
+
+def missing_format_dependencies(formats):
+    """ Returns the optional modules the given output formats need that are
+        not installed, e.g. "pyarrow or fastparquet", so a run can fail
+        before it starts instead of when writing its results.
+        Args:
+            formats (list) : output formats among FORMATS
+    """
+    from importlib.util import find_spec
+    missing = []
+    for output_format in dict.fromkeys(formats):
+        for modules in FORMAT_REQUIRES.get(output_format, []):
+            if all(find_spec(module) is None for module in modules):
+                missing.append(" or ".join(modules))
+    return missing
+
+
+def write_text(recipes, output_dir):
+    """ Writes every recipe in the text format of Recipe.__str__ to its own
+        rank_N.txt file and returns the written paths.
+        Args:
+            recipes (list) : the recipes, fittest first
+            output_dir (str) : folder the files are written to
+    """
+    paths = []
+    for rank, recipe in enumerate(recipes, 1):
+        path = os.path.join(output_dir, f"rank_{rank}.txt")
+        with open(path, "w") as f:
+            f.write(str(recipe))
+        paths.append(path)
+    return paths
+
+
+def write_jsonl(records, output_dir):
+    """ Writes the recipe records as JSON Lines in a single write and returns
+        the path of the file.
+        Args:
+            records (list) : records as returned by recipe_record
+            output_dir (str) : folder the file is written to
+    """
+    path = os.path.join(output_dir, JSONL_FILE)
+    with open(path, "w") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+    return path
+
+
+def write_parquet(records, output_dir):
+    """ Writes the recipe records as a Parquet table, with the components
+        flattened into columns and the lists and amounts stored as JSON
+        text, and returns the path of the file. Needs pandas and pyarrow or
+        fastparquet.
+        Args:
+            records (list) : records as returned by recipe_record
+            output_dir (str) : folder the file is written to
+    """
+    import pandas as pd
+
+    rows = []
+    for record in records:
+        row = {key: value for key, value in record.items()
+               if key != "components"}
+        for name, value in record["components"].items():
+            row[name] = value
+        for key in ["base_ingredients", "flavor_ingredients",
+                    "flavor_amounts"]:
+            row[key] = json.dumps(record[key])
+        rows.append(row)
+    path = os.path.join(output_dir, PARQUET_FILE)
+    pd.DataFrame(rows).to_parquet(path, index=False)
+    return path
+
+
+def run_directory(output_dir, emotion, seed=None):
+    """ Creates a new, uniquely named folder for one run inside output_dir
+        and returns its path. The name starts with the start time, emotion
+        and seed, and is made unique by the file system, so concurrent runs
+        never share a folder.
+        Args:
+            output_dir (str) : parent folder of the run folders
+            emotion (str) : emotion of the run
+            seed (int) : seed of the run, None if unseeded
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    prefix = time.strftime("%Y%m%d-%H%M%S") + "_" + emotion.lower()
+    if seed is not None:
+        prefix += f"_seed{seed}"
+    return tempfile.mkdtemp(prefix=prefix + "_", dir=output_dir)
+
+
+def export_recipes(recipes, output_dir, top_k=1, formats=("text",)):
+    """ Writes the top_k fittest recipes in the given formats and returns the
+        written paths: the rank_N.txt files first, then the JSON Lines and
+        Parquet files.
+        Args:
+            recipes (list) : the scored recipes of a population
+            output_dir (str) : folder the files are written to
+            top_k (int) : number of recipes to write
+            formats (list) : formats among FORMATS
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export formats: {sorted(unknown)}")
+    top = top_recipes(recipes, top_k)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    if "text" in formats:
+        paths += write_text(top, output_dir)
+    if "jsonl" in formats or "parquet" in formats:
+        records = [recipe_record(recipe, rank)
+                   for rank, recipe in enumerate(top, 1)]
+        if "jsonl" in formats:
+            paths.append(write_jsonl(records, output_dir))
+        if "parquet" in formats:
+            paths.append(write_parquet(records, output_dir))
+    return paths
@@ -1,6 +1,114 @@
-import pandas as pd
-import os
 import numpy as np
+from telemetry import PhaseTimer
+from resources import RESOURCES, EMOTIONS
+from fitness_cache import recipe_fingerprint
+from neighbors import neighbor_distance_scores
+
+
+def pad_ids(id_lists):
+    """ Pads a list of ingredient ID arrays into one integer matrix and
+        returns it together with the length of every row.
+        Args:
+            id_lists (list) : one array of ingredient IDs per recipe
+    """
+    lengths = np.array([len(ids) for ids in id_lists], dtype=np.intp)
+    padded = np.zeros((len(id_lists), int(lengths.max(initial=0))), 
+                      dtype=np.intp)
+    for row, ids in enumerate(id_lists):
+        padded[row, :len(ids)] = ids
+    return padded, lengths
+
+
+def min_max_means(vals, lengths):
+    """ Row-wise equivalent of averaging Fitness.min_max_scale: every row is
+        min-max normalized over its first lengths[row] values and averaged.
+        Rows whose values are all equal are averaged unscaled and empty rows
+        score 0.
+        Args:
+            vals (np.ndarray) : matrix of values, one recipe per row
+            lengths (np.ndarray) : number of valid values in every row
+    """
+    valid = np.arange(vals.shape[1])[None, :] < lengths[:, None]
+    mins = np.where(valid, vals, np.inf).min(axis=1, initial=np.inf)
+    maxs = np.where(valid, vals, -np.inf).max(axis=1, initial=-np.inf)
+    sums = np.where(valid, vals, 0.0).sum(axis=1)
+    counts = np.maximum(lengths, 1)
+    spans = maxs - mins
+    scaled = np.divide(sums - lengths * mins, spans * counts, 
+                       out=sums / counts, where=spans > 0)
+    return np.where(lengths > 0, scaled, 0.0)
+
+
+def flavor_pairing_scores(id_lists):
+    """ Returns the flavor pairing score of several recipes at once. Each
+        recipe is given as an array of ingredient IDs; the IDs are padded into
+        one matrix so that all pair similarities are gathered from the
+        precomputed similarity matrix in a single indexing operation. Recipes
+        with no flavors score 0 and recipes with one flavor score 0.2.
+        Args:
+            id_lists (list) : one array of flavor ingredient IDs per recipe
+    """
+    padded, lengths = pad_ids(id_lists)
+    scores = np.where(lengths == 1, 0.2, 0.0)
+    if padded.shape[1] < 2:
+        return scores
+
+    rows, cols = RESOURCES.get_pair_indices(padded.shape[1])
+    pair_sims = RESOURCES.get_similarity_matrix()[padded[:, rows], 
+                                                  padded[:, cols]]
+    valid_pairs = cols[None, :] < lengths[:, None]
+    pair_counts = lengths * (lengths - 1) // 2
+    sums = np.where(valid_pairs, pair_sims, 0.0).sum(axis=1)
+    has_pairs = pair_counts > 0
+    scores[has_pairs] = sums[has_pairs] / pair_counts[has_pairs]
+    return scores
+
+
+def squared_distances(id_lists, amount_lists):
+    """ Returns the squared Euclidean distances between several recipes and
+        every inspiring recipe, one row per recipe. Only the inspiring matrix
+        columns of each recipe's own flavors are gathered, using
+        |a - x|^2 = |x|^2 + sum over the recipe's flavors j of
+        a_j * (a_j - 2 * x_j).
+        Args:
+            id_lists (list) : one array of flavor ingredient IDs per recipe
+            amount_lists (list) : the matching ingredient amounts per recipe
+    """
+    padded, lengths = pad_ids(id_lists)
+    amounts = np.zeros(padded.shape)
+    for row, amts in enumerate(amount_lists):
+        amounts[row, :len(amts)] = amts
+    columns = RESOURCES.get_inspiring_matrix().T[padded]
+    terms = amounts[:, :, None] * (amounts[:, :, None] - 2 * columns)
+    return RESOURCES.get_inspiring_sq_norms()[None, :] + terms.sum(axis=1)
+
+
+def distance_scores(sq_dists):
+    """ Returns the dissimilarity score of several recipes from their squared
+        distances to the inspiring recipes: the distances are min-max scaled
+        and averaged per recipe.
+        Args:
+            sq_dists (np.ndarray) : recipe by inspiring recipe squared
+                                    distances
+    """
+    dists = np.sqrt(np.maximum(sq_dists, 0))
+    lengths = np.full(len(dists), dists.shape[1])
+    return min_max_means(dists, lengths)
+
+
+def emotion_scores(id_lists, emotions):
+    """ Returns the emotion alignment score of several recipes at once by
+        gathering every flavor's alignment with its recipe's emotion from the
+        preloaded emotion table, then min-max scaling and averaging per recipe.
+        Args:
+            id_lists (list) : one array of flavor ingredient IDs per recipe
+            emotions (list) : the emotion of every recipe
+    """
+    padded, lengths = pad_ids(id_lists)
+    emotion_cols = np.array([EMOTIONS.index(emotion.lower()) 
+                             for emotion in emotions], dtype=np.intp)
+    alignments = RESOURCES.get_emotion_table()[padded, emotion_cols[:, None]]
+    return min_max_means(alignments, lengths)
 
 
 class Fitness():
@@ -18,6 +126,14 @@ class Fitness():
         The flavor ingredients of the associated recipe.
     flavor_names : list
         The flavor names of the associated recipe.
+    fitness_version : int
+        Version of the flavor ingredients the fitness value was computed for.
+    components : dict
+        The weighted fitness components behind the current fitness value.
+    cache_hits : int
+        Class-wide count of fitness requests answered from the cached value.
+    cache_misses : int
+        Class-wide count of fitness requests that required a recomputation.
     
     Methods
     -------
@@ -25,22 +141,35 @@ class Fitness():
         Applies a min-max normalization to a given list of data.
     similarity():
         Returns the flavor pairing score between two ingredients.
+    get_flavor_ids():
+        Returns the vocabulary IDs of the recipe's flavor ingredients.
     flavor_pairing_score():
         Returns the average similarity score between flavors in the recipe.
-    get_inspiring_dic():
-        Reads inspiring recipes and stores them as dictionaries.
-    calc_euc_dist():
-        Computed Euclidean Distance between current and inspiring set recipes.
     dissimilarity_score():
         Calculates dissimilarity between current/inspiring set recipes.
     emotion_score():
         Returns how much flavor ingredients align with associated emotion.
     set_fitness_val():
         Computes and sets fitness values attribute.
+    set_components():
+        Stores precomputed fitness components and the resulting fitness.
     get_fitness_val():
         Returns fitness value.
+    is_stale():
+        Returns whether the flavor ingredients changed since the last scoring.
+    update_fitness_val():
+        Recomputes the fitness value only if it is stale.
+    print_components():
+        Prints the weighted fitness components.
+    reset_cache_stats():
+        Resets the class-wide cache hit and miss counters.
+    get_cache_stats():
+        Returns the class-wide cache hit and miss counters.
     """
 
+    cache_hits = 0
+    cache_misses = 0
+
     def __init__(self, flavor_ingredients, emotion):
         """ Initializes the fitness score to 0
             Args:
@@ -52,6 +181,8 @@ class Fitness():
         self.emotion = emotion
         self.flavor_ingredients = flavor_ingredients
         self.flavor_names = flavor_ingredients.get_flavor_ing_names()
+        self.fitness_version = None
+        self.components = {}
     
     def min_max_scale(self, vals):
         """ Applies a min-max normalization so that are values are between 0
@@ -76,116 +207,54 @@ class Fitness():
                 ingr1 (str) : first ingredient name
                 ingr2 (str) : second ingredient name
         """
-        WORD_EMBED_VALS = np.load('flavors/ingred_word_emb.npy', 
-        allow_pickle=True).item()
-        ingr1_vec = WORD_EMBED_VALS[ingr1]
-        ingr2_vec = WORD_EMBED_VALS[ingr2]
-        return np.dot(ingr1_vec, ingr2_vec)
+        vocabulary = RESOURCES.get_vocabulary()
+        return RESOURCES.get_similarity_matrix()[vocabulary.get_id(ingr1), 
+                                                 vocabulary.get_id(ingr2)]
+
+    def get_flavor_ids(self):
+        """ Returns the vocabulary IDs of the recipe's flavor ingredients.
+        """
+        return RESOURCES.get_vocabulary().get_ids(
+            [name.strip() for name in self.flavor_names])
     
     def flavor_pairing_score(self):
         """ Returns the average similarity score between flavors in the 
             associated recipe.
         """
-        if len(self.flavor_names) == 0: 
-            return 0
-        elif len(self.flavor_names) == 1:
-            return 0.2
-
-        flavor_scores = []
-        for i in range(len(self.flavor_names) - 1):
-            for j in range(i + 1, len(self.flavor_names)):
-                ingr1 = self.flavor_names[i].strip()
-                ingr2 = self.flavor_names[j].strip()
-                flavor_score = self.similarity(ingr1, ingr2)
-                flavor_scores.append(flavor_score)
-
-        return np.mean(flavor_scores)
-    
-    def get_inspiring_dic(self, file):
-        """ Reads the inspiring recipes and stores them as a dictionary where
-            the keys represent the flavor ingredients and the values represent
-            the associated amount.
-            Args:
-                file (str) : name of the inspiring recipe file
-        """
-        with open(file, "r") as f:
-                lines = f.readlines()
-        ingredient_dic = {}
-       
-        lines.reverse()
-        for line in lines:
-            if "-Flavor Ingredients" in line:
-                break
-            else:
-                parts = [line.split(' ')[0], ' '.join(line.split(' ')[2:])]
-                ingredient_dic[parts[1].strip()] = parts[0]
-        return ingredient_dic
-
-    def calc_euc_dist(self, insp_dic):
-        """ Calculates how different the recipe associated with the given
-            inspring recipe dictionary is from the current recipe that this
-            fitness object belongs to. To compute this value, the current and
-            inspiring recipe are converted into vectors, where each index 
-            corresponds to an ingredient that at least one of the two recipes
-            have, and the values are the amount of that ingredient. Then,
-            the euclidean distance is computed and returned.
-            Args:
-                insp_dic (dic) : dict corresponding to an inspiring recipe
-        """
-        all_ingrs = set(self.flavor_names + list(insp_dic.keys()))
-        curr_vector, insp_vector = [], []
-        for ingr in all_ingrs:
-            curr_vector.append(
-                            self.flavor_ingredients.get_amount_by_name(ingr))
-            if ingr in insp_dic.keys():
-                insp_vector.append(insp_dic[ingr])
-            else:
-                insp_vector.append(0)
-        euc_dist = np.linalg.norm(np.array(curr_vector, dtype=float) \
-                                        - np.array(insp_vector, dtype=float))
-        return euc_dist
+        return flavor_pairing_scores([self.get_flavor_ids()])[0]
     
     def dissimilarity_score(self):
         """ Calculates how dissimilar the flavors in the current recipe is to
             the flavors in the inspiring set using the Euclidean distance. 
             Applies a min-max normalization and then returns the average
-            dissimilarity value.
-        """
-        dir = "../inspiring_set"
-        dissimilarities = []
-        for inspiringRecipe in os.listdir(dir):
-            with open(dir + "/" + inspiringRecipe, "r") as f:
-                insp_dic = self.get_inspiring_dic(dir + "/" + inspiringRecipe)
-            euc_dist = self.calc_euc_dist(insp_dic)
-            dissimilarities.append(euc_dist)
-        
-        #scale and return average value
-        scaled_dissimilarties = self.min_max_scale(dissimilarities)
-        return np.mean(scaled_dissimilarties)
+            dissimilarity value. With a neighbour backend configured on the
+            resource registry, it is estimated from the nearest inspiring
+            recipes instead.
+        """
+        index = RESOURCES.get_neighbor_index()
+        if index is not None:
+            return neighbor_distance_scores(
+                index, [self.get_flavor_ids()], 
+                [self.flavor_ingredients.get_flavor_ing_amounts()],
+                RESOURCES.neighbor_k)[0]
+        return distance_scores(squared_distances(
+            [self.get_flavor_ids()], 
+            [self.flavor_ingredients.get_flavor_ing_amounts()]))[0]
     
     def emotion_score(self):
         """ Returns a value indicating how much the recipe coincides with 
             the chosen emotion. Applies a min-max normalization and then
             returns the average emotion alignment score.
         """
-        if len(self.flavor_names) == 0:
-            return 0
-
-        emotion_df = pd.read_excel("../Ingredient_Matrix.xlsx")
-        emotion_df.set_index('Ingredient', inplace=True)
-  
-        alignments = [emotion_df.loc[ingr, self.emotion.lower()] for ingr in 
-                     self.flavor_names]
-
-        # scale and return average value
-        scaled_alignments = self.min_max_scale(alignments)
-        return np.mean(scaled_alignments)
+        return emotion_scores([self.get_flavor_ids()], [self.emotion])[0]
     
     def set_fitness_val(self, flavor_pairing_coef=4, dissimilarity_coef=4, 
                         emotion_coef=6, len_coef = 0.2, do_print=False):
         """ Sets fitness score considering how well the flavors are paired, 
             how dissimilar the recipe is from recipes in the inspiring set, and 
-            how much the recipe coincides with the chosen emotion.
+            how much the recipe coincides with the chosen emotion. Refreshes
+            the flavor names first so mutations made since the Fitness object
+            was created are taken into account.
             Args:
                 flavor_pairing_coef (float) : multiplier of flavor score
                 dissimilarity_coef (float) : multiplier of uniqueness score
@@ -193,19 +262,204 @@ class Fitness():
                 len_coef (float) : multiplier of recipe length score
                 do_print (boolean) : where there fitness components will print
         """
+        self.flavor_names = self.flavor_ingredients.get_flavor_ing_names()
         flavor_comp = self.flavor_pairing_score() * flavor_pairing_coef
         dissimilarity_comp = self.dissimilarity_score() * dissimilarity_coef 
         emotion_comp = self.emotion_score() * emotion_coef
         len_comp = len(self.flavor_names) * len_coef
+        self.set_components({"flavor": flavor_comp, 
+                             "dissimilarity": dissimilarity_comp,
+                             "emotion": emotion_comp, "length": len_comp})
         if do_print:
-            print(f"flavor: {round(flavor_comp, 8)}, dissimilarity: " + \
-            f"{round(dissimilarity_comp, 8)}, emotion: " + \
-            f"{round(emotion_comp, 8)}, length: {round(len_comp, 8)}")
-    
-        self.fitness_val =  flavor_comp + dissimilarity_comp + emotion_comp \
-        + len_comp
+            self.print_components()
+
+    def set_components(self, components):
+        """ Stores already weighted fitness components, e.g. computed by a
+            PopulationFitness, and marks the fitness value as up to date.
+            Args:
+                components (dict) : weighted flavor, dissimilarity, emotion 
+                                    and length components
+        """
+        self.components = components
+        self.fitness_val = components["flavor"] + \
+            components["dissimilarity"] + components["emotion"] + \
+            components["length"]
+        self.fitness_version = self.flavor_ingredients.version
 
     def get_fitness_val(self):
         """ Returns the current fitness value.
         """
         return self.fitness_val
+
+    def is_stale(self):
+        """ Returns True if the fitness value has never been computed or the
+            flavor ingredients were mutated after it was computed.
+        """
+        return self.fitness_version != self.flavor_ingredients.version
+
+    def update_fitness_val(self, do_print=False):
+        """ Recomputes the fitness value if it is stale and otherwise reuses
+            the cached value, counting cache hits and misses.
+            Args:
+                do_print (boolean) : whether the fitness components will print
+        """
+        if self.is_stale():
+            Fitness.cache_misses += 1
+            self.set_fitness_val(do_print=do_print)
+        else:
+            Fitness.cache_hits += 1
+            if do_print:
+                self.print_components()
+
+    def print_components(self):
+        """ Prints the weighted fitness components of the current value.
+        """
+        c = self.components
+        print(f"flavor: {round(c['flavor'], 8)}, dissimilarity: " + \
+        f"{round(c['dissimilarity'], 8)}, emotion: " + \
+        f"{round(c['emotion'], 8)}, length: {round(c['length'], 8)}")
+
+    @staticmethod
+    def reset_cache_stats():
+        """ Resets the class-wide cache hit and miss counters.
+        """
+        Fitness.cache_hits = 0
+        Fitness.cache_misses = 0
+
+    @staticmethod
+    def get_cache_stats():
+        """ Returns the class-wide (hits, misses) cache counters.
+        """
+        return Fitness.cache_hits, Fitness.cache_misses
+
+
+class PopulationFitness():
+    """ Computes the fitness components of a whole generation at once. The
+        flavor, dissimilarity, emotion and length components of every recipe
+        are computed as NumPy arrays in one pass and then stored in each
+        recipe's Fitness object, which acts as a view over these results.
+
+    ...
+
+    Attributes
+    ----------
+    fitnesses : list
+        The Fitness objects of the evaluated recipes.
+    flavor : np.ndarray
+        Weighted flavor pairing component of every recipe.
+    dissimilarity : np.ndarray
+        Weighted dissimilarity component of every recipe.
+    emotion : np.ndarray
+        Weighted emotion alignment component of every recipe.
+    length : np.ndarray
+        Weighted recipe length component of every recipe.
+    fitness_vals : np.ndarray
+        Total fitness of every recipe.
+
+    Methods
+    -------
+    evaluate():
+        Computes every fitness component for the whole population.
+    get_fitness_vals():
+        Returns the total fitness of every recipe.
+    """
+
+    def __init__(self, recipes):
+        """ Collects the Fitness objects of the recipes to be evaluated.
+            Args:
+                recipes (list) : the recipes of one generation
+        """
+        self.fitnesses = [recipe.fitness for recipe in recipes]
+        self.flavor = self.dissimilarity = self.emotion = None
+        self.length = self.fitness_vals = None
+
+    def evaluate(self, flavor_pairing_coef=4, dissimilarity_coef=4, 
+                 emotion_coef=6, len_coef=0.2, timer=None, cache=None):
+        """ Computes every fitness component of every recipe in one batch, 
+            stores them in the recipes' Fitness objects and returns the total
+            fitness values. With a persistent cache, recipes whose flavor
+            profile was scored before reuse the cached components and only
+            the others are computed and added to the cache.
+            Args:
+                flavor_pairing_coef (float) : multiplier of flavor score
+                dissimilarity_coef (float) : multiplier of uniqueness score
+                emotion_coef (float) : multiplier of emotion score
+                len_coef (float) : multiplier of recipe length score
+                timer (PhaseTimer) : timer the time of every component is
+                                     added to
+                cache (FitnessCache) : persistent cache of components, which
+                                       must use the same coefficients
+        """
+        timer = timer if timer is not None else PhaseTimer()
+        coefficients = (flavor_pairing_coef, dissimilarity_coef, 
+                        emotion_coef, len_coef)
+        id_lists, amount_lists, emotions = [], [], []
+        for fitness in self.fitnesses:
+            fitness.flavor_names = \
+                fitness.flavor_ingredients.get_flavor_ing_names()
+            id_lists.append(fitness.get_flavor_ids())
+            amount_lists.append(
+                fitness.flavor_ingredients.get_flavor_ing_amounts())
+            emotions.append(fitness.emotion)
+
+        cached, keys = {}, []
+        if cache is not None:
+            if cache.coefficients != coefficients:
+                raise ValueError("Fitness cache holds components weighted "
+                                 f"with {cache.coefficients}")
+            keys = [recipe_fingerprint(fitness.flavor_names, amounts, emotion)
+                    for fitness, amounts, emotion 
+                    in zip(self.fitnesses, amount_lists, emotions)]
+            cached = cache.get_many(keys)
+        todo = [i for i in range(len(self.fitnesses)) 
+                if cache is None or keys[i] not in cached]
+        todo_ids = [id_lists[i] for i in todo]
+
+        self.flavor, self.dissimilarity = np.empty((2, len(self.fitnesses)))
+        self.emotion, self.length = np.empty((2, len(self.fitnesses)))
+        with timer.phase("flavor"):
+            self.flavor[todo] = flavor_pairing_scores(todo_ids) * \
+                flavor_pairing_coef
+        with timer.phase("dissimilarity"):
+            todo_amounts = [amount_lists[i] for i in todo]
+            index = RESOURCES.get_neighbor_index()
+            if index is None:
+                scores = distance_scores(squared_distances(todo_ids, 
+                                                           todo_amounts))
+            else:
+                scores = neighbor_distance_scores(
+                    index, todo_ids, todo_amounts, RESOURCES.neighbor_k)
+            self.dissimilarity[todo] = scores * dissimilarity_coef
+        with timer.phase("emotion"):
+            self.emotion[todo] = emotion_scores(
+                todo_ids, [emotions[i] for i in todo]) * emotion_coef
+        with timer.phase("length"):
+            self.length[todo] = np.array([len(ids) for ids in todo_ids]) * \
+                len_coef
+
+        Fitness.cache_misses += len(todo)
+        computed = {}
+        for i, fitness in enumerate(self.fitnesses):
+            if cache is not None and keys[i] in cached:
+                components = cached[keys[i]]
+                self.flavor[i] = components["flavor"]
+                self.dissimilarity[i] = components["dissimilarity"]
+                self.emotion[i] = components["emotion"]
+                self.length[i] = components["length"]
+            components = {"flavor": self.flavor[i],
+                          "dissimilarity": self.dissimilarity[i],
+                          "emotion": self.emotion[i],
+                          "length": self.length[i]}
+            fitness.set_components(components)
+            if cache is not None and keys[i] not in cached:
+                computed[keys[i]] = components
+        if cache is not None:
+            cache.put_many(computed)
+        self.fitness_vals = (self.flavor + self.dissimilarity + self.emotion 
+                             + self.length)
+        return self.fitness_vals
+
+    def get_fitness_vals(self):
+        """ Returns the total fitness of every evaluated recipe.
+        """
+        return self.fitness_vals
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import time
+from bundle import BUNDLE_VERSION, source_digests
+from resources import RESOURCES
+
+# bump when the meaning of the cached components changes
+CACHE_VERSION = 2
+AMOUNT_DECIMALS = 6
+# rows inserted between evictions and hits buffered before their last_used
+# times are written on their own
+EVICT_INTERVAL = 10000
+TOUCH_BATCH = 1000
+_OPEN_CACHES = {}
+
+
+def recipe_fingerprint(names, amounts, emotion, decimals=AMOUNT_DECIMALS):
+    """ Returns the canonical fingerprint of a flavor profile: a hash of the
+        sorted flavor names with their amounts rounded to the given number of
+        decimals, together with the emotion. Recipes listing the same flavors
+        in another order share a fingerprint.
+        Args:
+            names (list) : flavor ingredient names
+            amounts (list) : the matching amounts
+            emotion (str) : emotion the recipe is scored for
+            decimals (int) : decimals the amounts are rounded to
+    """
+    profile = sorted((name.strip(), round(float(amount), decimals))
+                     for name, amount in zip(names, amounts))
+    text = json.dumps([emotion.lower(), profile])
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def data_stamp(coefficients):
+    """ Returns the version stamp of cached fitness values: a hash of the
+        cache and bundle versions, the digests of the scoring data files and
+        of the inspiring set corpus, the neighbour backend dissimilarity is
+        scored with, and the fitness coefficients. Cached values with another
+        stamp are stale.
+        Args:
+            coefficients (tuple) : flavor pairing, dissimilarity, emotion and
+                                   length coefficients
+    """
+    bundle = RESOURCES.get_bundle()
+    sources = bundle.sources if bundle is not None \
+        else source_digests(RESOURCES)
+    text = json.dumps([CACHE_VERSION, BUNDLE_VERSION, sources,
+                       RESOURCES.get_corpus().digest(),
+                       [RESOURCES.neighbor_backend, RESOURCES.neighbor_k],
+                       [float(coef) for coef in coefficients]],
+                      sort_keys=True)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+class FitnessCache():
+    """ Persistent cache of weighted fitness components in an SQLite file,
+        keyed by data stamp and recipe fingerprint, so runs scoring with other
+        data, neighbour backends or coefficients share the file without
+        erasing each other's entries. It is shared by runs and processes;
+        when it grows beyond max_entries, the least recently used entries of
+        any stamp are evicted. To keep
+        writers from contending for SQLite's write lock, the use times of
+        hits are buffered and written along with the next inserted entries,
+        and eviction only runs every EVICT_INTERVAL inserted entries, so the
+        file may briefly hold slightly more than max_entries. Caches opened
+        with open_cache are closed by close_caches, or else when their
+        process exits.
+
+    ...
+
+    Attributes
+    ----------
+    path : string
+        Path of the SQLite file.
+    coefficients : tuple
+        Fitness coefficients the cached components were weighted with.
+    max_entries : int
+        Number of entries kept after eviction.
+    stamp : string
+        Version stamp of the cached values, see data_stamp.
+    hits : int
+        Number of lookups answered by this cache object.
+    misses : int
+        Number of lookups this cache object could not answer.
+    touched : dict
+        Use time of every hit not yet written to the file.
+    inserted : int
+        Number of entries inserted since the last eviction.
+
+    Methods
+    -------
+    get_many(keys):
+        Returns the cached components of the given fingerprints.
+    put_many(entries):
+        Stores the components of several fingerprints.
+    write_touched():
+        Writes the buffered use times of hits in the current transaction.
+    flush():
+        Writes the buffered use times of hits.
+    evict():
+        Drops the least recently used entries beyond max_entries.
+    clear():
+        Drops every entry of this stamp.
+    close():
+        Writes the buffered use times and closes the database connection.
+    """
+
+    def __init__(self, path, coefficients=(4, 4, 6, 0.2),
+                 max_entries=200000):
+        """ Opens or creates the cache file, recreating its table if it was
+            written by an older version without stamps.
+            Args:
+                path (str) : path of the SQLite file
+                coefficients (tuple) : flavor pairing, dissimilarity, emotion
+                                       and length coefficients
+                max_entries (int) : number of entries kept after eviction
+        """
+        self.path = path
+        self.coefficients = tuple(coefficients)
+        self.max_entries = max_entries
+        self.stamp = data_stamp(self.coefficients)
+        self.hits = 0
+        self.misses = 0
+        self.touched = {}
+        self.inserted = 0
+
+        import sqlite3
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in self.connection.execute(
+                "PRAGMA table_info(fitness)")]
+            if columns and "stamp" not in columns:
+                self.connection.execute("DROP TABLE fitness")
+                self.connection.execute("DROP TABLE IF EXISTS meta")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS fitness (stamp TEXT, key TEXT, "
+                "flavor REAL, dissimilarity REAL, emotion REAL, length REAL, "
+                "last_used REAL, PRIMARY KEY (stamp, key))")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS fitness_last_used "
+                "ON fitness (last_used)")
+        self.evict()
+
+    def get_many(self, keys):
+        """ Returns a dictionary mapping every cached fingerprint among keys
+            to its weighted components, marking them as recently used once
+            enough hits are buffered or entries are next inserted.
+            Args:
+                keys (list) : recipe fingerprints
+        """
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        # stay below SQLite's limit on the number of query parameters
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                "SELECT key, flavor, dissimilarity, emotion, length FROM "
+                f"fitness WHERE stamp = ? AND key IN ({marks})",
+                [self.stamp] + batch).fetchall()
+            for key, flavor, dissimilarity, emotion, length in rows:
+                found[key] = {"flavor": flavor,
+                              "dissimilarity": dissimilarity,
+                              "emotion": emotion, "length": length}
+        now = time.time()
+        self.touched.update((key, now) for key in found)
+        if len(self.touched) >= TOUCH_BATCH:
+            self.flush()
+        hits = sum(key in found for key in keys)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, entries):
+        """ Stores the weighted components of several fingerprints together
+            with the buffered use times of hits, and evicts old entries once
+            EVICT_INTERVAL entries were inserted.
+            Args:
+                entries (dict) : components dictionary by fingerprint
+        """
+        if not entries:
+            return
+        now = time.time()
+        with self.connection:
+            self.write_touched()
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO fitness VALUES "
+                "(?, ?, ?, ?, ?, ?, ?)",
+                [(self.stamp, key, float(c["flavor"]), float(c["dissimilarity"]),
+                  float(c["emotion"]), float(c["length"]), now)
+                 for key, c in entries.items()])
+        self.inserted += len(entries)
+        if self.inserted >= EVICT_INTERVAL:
+            self.evict()
+
+    def write_touched(self):
+        """ Updates the last_used time of the buffered hits, inside the
+            caller's transaction.
+        """
+        if self.touched:
+            self.connection.executemany(
+                "UPDATE fitness SET last_used = ? WHERE stamp = ? AND key = ?",
+                [(used, self.stamp, key)
+                 for key, used in self.touched.items()])
+            self.touched = {}
+
+    def flush(self):
+        """ Writes the buffered use times of hits.
+        """
+        with self.connection:
+            self.write_touched()
+
+    def evict(self):
+        """ Drops the least recently used entries so that at most max_entries
+            remain. Counting the entries scans the table, so this only runs
+            when the cache is opened and every EVICT_INTERVAL insertions.
+        """
+        self.inserted = 0
+        count = self.connection.execute(
+            "SELECT COUNT(*) FROM fitness").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM fitness WHERE rowid IN (SELECT rowid FROM "
+                "fitness ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+
+    def clear(self):
+        """ Drops every cached entry of this cache's stamp.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM fitness WHERE stamp = ?",
+                                    (self.stamp,))
+
+    def close(self):
+        """ Writes the buffered use times and closes the database connection,
+            if it is still open.
+        """
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+
+def open_cache(path, coefficients=(4, 4, 6, 0.2)):
+    """ Returns the FitnessCache of the given file, opening it once per
+        process, e.g. once in every offspring worker. Caches are keyed by
+        process ID as well, since a forked worker inherits the parent's open
+        caches and SQLite connections must not be used across fork.
+        Args:
+            path (str) : path of the SQLite file
+            coefficients (tuple) : fitness coefficients of the cached values
+    """
+    from multiprocessing.util import Finalize
+
+    key = (os.getpid(), os.path.abspath(path), tuple(coefficients))
+    if key not in _OPEN_CACHES:
+        cache = FitnessCache(path, coefficients)
+        # offspring workers never reach close_caches, so every cache is also
+        # closed when its process exits, which writes its buffered use times
+        Finalize(cache, cache.close, exitpriority=0)
+        _OPEN_CACHES[key] = cache
+    return _OPEN_CACHES[key]
+
+
+def close_caches():
+    """ Closes every cache this process opened with open_cache, writing
+        their buffered use times, e.g. at the end of a run.
+    """
+    for key in [key for key in _OPEN_CACHES if key[0] == os.getpid()]:
+        _OPEN_CACHES.pop(key).close()
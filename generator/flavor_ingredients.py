@@ -1,6 +1,6 @@
 import numpy as np
-import random
 from ingredient import Ingredient
+from categories import CategoryTable
 
 FLAVOR_INGREDIENT_TYPES = {
     "spices": ["allspice", "cinnamon", "clove", "cardamom", "ginger", "nutmeg", 
@@ -28,6 +28,22 @@ FLAVOR_INGREDIENT_TYPES = {
 }
 
 
+def flavor_category(name):
+    """ Returns the key of FLAVOR_INGREDIENT_TYPES listing a lower case
+        ingredient name, or None if it is not a flavor ingredient.
+        Args:
+            name (str) : lower case ingredient name
+    """
+    for category, names in FLAVOR_INGREDIENT_TYPES.items():
+        if name in names:
+            return category
+    return None
+
+
+FLAVOR_CATEGORIES = CategoryTable(flavor_category, 
+                                  list(FLAVOR_INGREDIENT_TYPES))
+
+
 class FlavorIngredients: 
     """ A class to represent flavor ingredients in a recipe.
 
@@ -41,6 +57,10 @@ class FlavorIngredients:
         Mix-ins in the recipe's ingredients.
     oils : dict
         Oils in the recipe's ingredients.
+    version : int
+        Counter bumped every time a mutation changes the flavor ingredients.
+    rng : np.random.Generator
+        Random number generator used by the mutations.
 
     Methods
     -------
@@ -52,12 +72,16 @@ class FlavorIngredients:
         Delete ingredient from a random flavor ingredient category. 
     swap_ingredient():
         Swap ingredient from a random flavor ingredient category. 
+    random_choice(options):
+        Returns a uniformly chosen element of a sequence.
     mutate():
         Chooses and executes one of the mutations above with equal probability.
     normalize_mix_in_amt():
         Makes sure the total volume of mix-ins doesn't exceed 250 g
     get_flavor_ing_names():
         String representation of all of the flavor ingredient names.
+    get_flavor_ing_amounts():
+        Amounts of all of the flavor ingredients, in name order.
     get_amount_by_name(ingr_name):
         Returns the amount of a given ingredient. 
     get_mix_in():
@@ -68,97 +92,113 @@ class FlavorIngredients:
         String repreasentation of all of the spices and their amounts.
     """
     
-    def __init__(self, ing_list): 
+    def __init__(self, ing_list, rng=None): 
         """ Initialize empty ingredient sub-category dictionaries.
             Args:
                 ing_list (list) : list of ingredient objects.
+                rng (np.random.Generator) : random number generator, a fresh
+                                            unseeded one if None
         """
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.spices = {}
         self.mix_ins = {}
         self.oils = {}
+        self.version = 0
         self.sort_ingredients(ing_list)
     
     def sort_ingredients(self, ing_list):
         """ From a list of flavors in the recipe, sort into either spices 
             (including cinnamon, pepper, basil, etc.) or mix-ins (including 
             chocolate chips, nuts, dried fruit, etc.). Note that spices will
-            have a much smaller volume compared to mix-ins.
+            have a much smaller volume compared to mix-ins. Categories are
+            looked up in FLAVOR_CATEGORIES.
             Args: 
                 ing_list (list) : list of ingredient objects
         """
-        for ing in ing_list: 
-            name = ing.get_name().lower()
-            if name in FLAVOR_INGREDIENT_TYPES["spices"]: 
+        names = [ing.get_name().lower() for ing in ing_list]
+        for ing, name, category in zip(ing_list, names, 
+                                       FLAVOR_CATEGORIES.get_categories(names)): 
+            if category == "spices": 
                 self.spices[name] = ing
-            elif name in FLAVOR_INGREDIENT_TYPES["mix-ins"]: 
+            elif category == "mix-ins": 
                 self.mix_ins[name] = ing
-            elif name in FLAVOR_INGREDIENT_TYPES["oils"]: 
+            elif category == "oils": 
                 self.oils[name] = ing
 
+    def random_choice(self, options):
+        """ Returns one element of the given sequence chosen uniformly at 
+            random.
+            Args:
+                options (sequence) : the elements to choose from
+        """
+        options = tuple(options)
+        return options[self.rng.integers(len(options))]
+
     def add_ingredient(self):
         """ With equal probability, add a new spice, mix-in, or oil to their 
             respective dictionaries from the constant list 
             FLAVOR_INGREDIENT_TYPES. If adding a mix-in, normalize the amount. 
         """
-        prob = np.random.randint(0,3)
+        prob = self.rng.integers(0,3)
         if prob == 0:
-            new_spice = np.random.choice(
-                                    tuple(FLAVOR_INGREDIENT_TYPES["spices"]))
-            amt = random.randint(1,4) * 0.5
+            new_spice = self.random_choice(
+                                    FLAVOR_INGREDIENT_TYPES["spices"])
+            amt = self.rng.integers(1,5) * 0.5
             new_ing = Ingredient(new_spice, amt, "tsp")
             self.spices[new_spice] = new_ing
         elif prob == 1: 
-            new_mix_in = np.random.choice(
-                                    tuple(FLAVOR_INGREDIENT_TYPES["mix-ins"]))
-            amt = random.randint(1,4) * 50
+            new_mix_in = self.random_choice(
+                                    FLAVOR_INGREDIENT_TYPES["mix-ins"])
+            amt = self.rng.integers(1,5) * 50
             new_ing = Ingredient(new_mix_in, amt)
             self.mix_ins[new_mix_in] = new_ing
             self.normalize_mix_in_amt()
         elif prob == 2:
-            new_oil = np.random.choice(
-                                    tuple(FLAVOR_INGREDIENT_TYPES["oils"]))
-            amt = random.randint(1,4) * 0.5
+            new_oil = self.random_choice(
+                                    FLAVOR_INGREDIENT_TYPES["oils"])
+            amt = self.rng.integers(1,5) * 0.5
             new_ing = Ingredient(new_oil, amt, "tsp")
             self.oils[new_oil] = new_ing
+        self.version += 1
 
     def delete_ingredient(self):
         """ With equal probability, delete a spice or mix-in from their 
             respective dictionaries. 
         """
-        prob = np.random.randint(0,1)
+        prob = self.rng.integers(0,1)
         if prob == 0 and len(self.spices.keys()) > 0:
-            spice = np.random.choice(
-                                tuple(self.spices.keys()))
+            spice = self.random_choice(self.spices.keys())
             del self.spices[spice]
+            self.version += 1
         elif len(self.mix_ins.keys()) > 0: 
-            mix_in = np.random.choice(
-                                tuple(self.mix_ins.keys()))
+            mix_in = self.random_choice(self.mix_ins.keys())
             del self.mix_ins[mix_in]
+            self.version += 1
 
     def swap_ingredient(self):
         """ With equal probability, swap a spice or mix-in from their 
             respective dictionaries with a new spice or mix-in from the 
             constant list FLAVOR_INGREDIENT_TYPES.
         """
-        prob = np.random.randint(0,1)
+        prob = self.rng.integers(0,1)
         if prob == 0 and len(self.spices.keys()) > 0:
-            spice = np.random.choice(
-                                tuple(self.spices.keys()))
+            spice = self.random_choice(self.spices.keys())
             del self.spices[spice]
-            new_spice = np.random.choice(
-                                tuple(FLAVOR_INGREDIENT_TYPES["spices"]))
+            new_spice = self.random_choice(
+                                    FLAVOR_INGREDIENT_TYPES["spices"])
             # preset volume to 0.5 tsp 
             new_ing = Ingredient(new_spice, .5, "tsp")
             self.spices[new_spice] = new_ing
+            self.version += 1
         elif len(self.mix_ins.keys()) > 0: 
-            mix_in = np.random.choice(
-                                tuple(self.mix_ins.keys()))
+            mix_in = self.random_choice(self.mix_ins.keys())
             del self.mix_ins[mix_in]
-            new_mix_in = np.random.choice(
-                                tuple(FLAVOR_INGREDIENT_TYPES["mix-ins"]))
+            new_mix_in = self.random_choice(
+                                    FLAVOR_INGREDIENT_TYPES["mix-ins"])
             # preset volume to 50 g
             new_ing = Ingredient(new_mix_in, 50)
             self.mix_ins[new_mix_in] = new_ing
+            self.version += 1
 
     def normalize_mix_in_amt(self):
         """ After adding a new mix-in ingredient, normalize to ensure the total
@@ -177,7 +217,7 @@ class FlavorIngredients:
     def mutate(self):
         """ Calls an above mutation with equal probability.
         """
-        mutation = np.random.randint(0,3)
+        mutation = self.rng.integers(0,3)
         if mutation == 0: 
             self.add_ingredient() 
         elif mutation == 1: 
@@ -198,6 +238,16 @@ class FlavorIngredients:
             ing_list.append(ing.get_name())
         return ing_list
 
+    def get_flavor_ing_amounts(self):
+        """ Returns the amounts of the flavor ingredients in the same order
+            as get_flavor_ing_names.
+        """
+        amounts = []
+        for flav_type in [self.spices, self.mix_ins, self.oils]:
+            for ing in flav_type.values():
+                amounts.append(ing.get_amount())
+        return amounts
+
     def get_amount_by_name(self, ingr_name):
         """ Search for the amount of flavor ingredient with the flavor 
             ingredient string, returning the amount if the ingredient exists. 
@@ -1,11 +1,27 @@
 import numpy as np
+from resources import RESOURCES
+
+# WORD_EMBED_VALS, INGRED_CATEGORIES and INGREDIENT_LIST are loaded from the
+# shared resource registry the first time they are accessed, not on import
+LAZY_ATTRIBUTES = {
+    "WORD_EMBED_VALS": lambda: RESOURCES.get_word_embeddings(),
+    "INGRED_CATEGORIES": lambda: RESOURCES.get_ingredient_categories(),
+    "INGREDIENT_LIST": lambda: sorted(RESOURCES.get_word_embeddings().keys()),
+}
+
+
+def __getattr__(name):
+    """Loads the lazily defined module attributes on first access."""
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = LAZY_ATTRIBUTES[name]()
+    globals()[name] = value
+    return value
 
-WORD_EMBED_VALS = np.load('flavors/ingred_word_emb.npy', allow_pickle=True).item()
-INGRED_CATEGORIES = np.load('flavors/ingred_categories.npy', allow_pickle=True).item()
-INGREDIENT_LIST = sorted(WORD_EMBED_VALS.keys())
 
 def similarity(n1, n2):
     """Returns the similarity between two ingredients based on our data."""
-    v1 = WORD_EMBED_VALS[n1]
-    v2 = WORD_EMBED_VALS[n2]
-    return np.dot(v1, v2)
\ No newline at end of file
+    word_embed_vals = RESOURCES.get_word_embeddings()
+    v1 = word_embed_vals[n1]
+    v2 = word_embed_vals[n2]
+    return np.dot(v1, v2)
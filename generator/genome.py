@@ -0,0 +1,156 @@
+import numpy as np
+from ingredient import Ingredient
+from flavor_ingredients import FLAVOR_CATEGORIES
+from resources import RESOURCES
+from vocabulary import Vocabulary
+
+UNITS = Vocabulary(["g", "tsp", "tbsp"])
+
+
+def flavor_mask(width):
+    """ Returns a boolean array marking which of the first width ingredient
+        IDs are flavor ingredients.
+        Args:
+            width (int) : number of ingredient IDs covered by the mask
+    """
+    return FLAVOR_CATEGORIES.get_codes(width) >= 0
+
+
+def crossover_genomes(genome1, genome2, rng):
+    """ Chooses the base ingredients and instructions of one genome with equal
+        probability and splits the flavor ingredients at a random pivot,
+        returning the child genome.
+        Args:
+            genome1 (Genome) : first genome to be crossed
+            genome2 (Genome) : second genome to be crossed
+            rng (np.random.Generator) : random number generator
+    """
+    # choose base ingredients of one recipe with equal probability 
+    base_parent = (genome1, genome2)[rng.integers(0, 2)]
+
+    # randomly select pivot to split flavor ingredients
+    num_flavors = min(len(genome1.get_flavor_ids()), 
+                      len(genome2.get_flavor_ids()))
+    pivot = rng.integers(0, max(num_flavors, 1))
+
+    # choose instructions of one recipe with equal probability 
+    instr_parent = (genome1, genome2)[rng.integers(0, 2)]
+    return genome1.crossover(genome2, base_parent, pivot, instr_parent)
+
+
+class Genome():
+    """ A compact, array-backed representation of a recipe used by crossover.
+        Ingredient amounts are stored at full precision in a fixed-width array
+        over the global ingredient vocabulary, so genomes can be combined
+        without formatting and re-parsing ingredient strings.
+
+    ...
+
+    Attributes
+    ----------
+    amounts : np.ndarray
+        Ingredient amounts indexed by ingredient ID.
+    units : np.ndarray
+        Unit ID of every ingredient, or -1 for absent ingredients.
+    instructions : tuple
+        The (temp, bake_time, rest_time, size, song) instruction parameters.
+
+    Methods
+    -------
+    from_recipe(recipe):
+        Builds the genome of a Recipe.
+    resize(width):
+        Returns the genome padded to cover width ingredient IDs.
+    get_flavor_ids():
+        Returns the IDs of the flavor ingredients present in the genome.
+    crossover(other, base_parent, pivot, instr_parent):
+        Returns a child genome combining this genome with another one.
+    to_ingredient_list():
+        Converts the genome back into a list of Ingredient objects.
+    """
+
+    def __init__(self, amounts, units, instructions):
+        """ Creates a genome from its arrays.
+            Args:
+                amounts (np.ndarray) : ingredient amounts by ingredient ID
+                units (np.ndarray) : unit IDs by ingredient ID, -1 if absent
+                instructions (tuple) : temp, bake_time, rest_time, size and
+                                       song
+        """
+        self.amounts = amounts
+        self.units = units
+        self.instructions = instructions
+
+    @classmethod
+    def from_recipe(cls, recipe):
+        """ Builds the genome of a recipe from its base and flavor ingredient
+            objects and instruction parameters.
+            Args:
+                recipe (Recipe) : the recipe to encode
+        """
+        vocabulary = RESOURCES.get_vocabulary()
+        base, flavor = recipe.base_ingredients, recipe.flavor_ingredients
+        ings = []
+        for ing_dic in [base.flour, base.sugars, base.fats, base.dry,
+                        base.wet, flavor.spices, flavor.mix_ins, flavor.oils]:
+            ings.extend(ing_dic.values())
+        ids = [vocabulary.intern(ing.get_name()) for ing in ings]
+
+        amounts = np.zeros(len(vocabulary))
+        units = np.full(len(vocabulary), -1, dtype=np.int8)
+        amounts[ids] = [ing.get_amount() for ing in ings]
+        units[ids] = [UNITS.intern(ing.unit) for ing in ings]
+        return cls(amounts, units, recipe.get_instructions().get_params())
+
+    def resize(self, width):
+        """ Returns this genome padded with absent ingredients so it covers
+            width ingredient IDs, e.g. after new names were interned.
+            Args:
+                width (int) : number of ingredient IDs to cover
+        """
+        if width == len(self.amounts):
+            return self
+        amounts = np.zeros(width)
+        units = np.full(width, -1, dtype=np.int8)
+        amounts[:len(self.amounts)] = self.amounts
+        units[:len(self.units)] = self.units
+        return Genome(amounts, units, self.instructions)
+
+    def get_flavor_ids(self):
+        """ Returns the IDs of the flavor ingredients present in the genome,
+            in ID order.
+        """
+        present = self.units >= 0
+        return np.flatnonzero(present & flavor_mask(len(present)))
+
+    def crossover(self, other, base_parent, pivot, instr_parent):
+        """ Returns a child genome with the base ingredients of base_parent,
+            the flavors of this genome before the pivot followed by the flavors
+            of the other genome from the pivot on, and the instructions of
+            instr_parent.
+            Args:
+                other (Genome) : the second parent
+                base_parent (Genome) : parent providing the base ingredients
+                pivot (int) : index splitting the parents' flavor ingredients
+                instr_parent (Genome) : parent providing the instructions
+        """
+        width = max(len(self.amounts), len(other.amounts))
+        parent1, parent2 = self.resize(width), other.resize(width)
+        base_parent = base_parent.resize(width)
+
+        is_flavor = flavor_mask(width)
+        amounts = np.where(is_flavor, 0.0, base_parent.amounts)
+        units = np.where(is_flavor, -1, base_parent.units).astype(np.int8)
+        head = parent1.get_flavor_ids()[:pivot]
+        tail = parent2.get_flavor_ids()[pivot:]
+        amounts[head], units[head] = parent1.amounts[head], parent1.units[head]
+        amounts[tail], units[tail] = parent2.amounts[tail], parent2.units[tail]
+        return Genome(amounts, units, instr_parent.instructions)
+
+    def to_ingredient_list(self):
+        """ Converts the genome back into Ingredient objects, in ID order.
+        """
+        names = RESOURCES.get_vocabulary().names
+        return [Ingredient(names[i], float(self.amounts[i]), 
+                           UNITS.get_name(self.units[i]))
+                for i in np.flatnonzero(self.units >= 0)]
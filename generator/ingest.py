@@ -0,0 +1,421 @@
+import numpy as np
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from paths import INSPIRING_SET_DIR, CORPUS_PATH
+
+CORPUS_VERSION = 1
+SECTIONS = {"-Base Ingredients": False, "-Flavor Ingredients": True}
+# butter measured in tablespoons is stored in grams
+BUTTER_TBSP_GRAMS = 14.2
+
+
+def parse_ingredient_line(line):
+    """ Parses an "<amount> <unit> <name>" ingredient line and returns its
+        (name, amount, unit), converting butter measured in tablespoons to
+        grams. Raises ValueError for a malformed line.
+        Args:
+            line (str) : the ingredient line
+    """
+    split_line = line.split(" ")
+    if len(split_line) < 3:
+        raise ValueError(f"expected '<amount> <unit> <name>': {line!r}")
+    amt = float(split_line[0])
+    unit = split_line[1]
+    ingr_name = " ".join(split_line[2:]).strip()
+    if not math.isfinite(amt) or amt < 0 or unit == "" or ingr_name == "":
+        raise ValueError(f"invalid ingredient line: {line!r}")
+    if "butter" in ingr_name and unit == "tbsp":
+        amt *= BUTTER_TBSP_GRAMS
+    return ingr_name, amt, unit
+
+
+def parse_recipe(lines):
+    """ Parses and validates the lines of a recipe file, which hold a
+        "-Base Ingredients" and a "-Flavor Ingredients" section of ingredient
+        lines, and returns one (name, amount, unit, is_flavor) tuple per
+        ingredient. Raises ValueError naming the offending line otherwise.
+        Args:
+            lines (list) : lines of the recipe file
+    """
+    rows = []
+    is_flavor = None
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\n")
+        if line.strip() == "":
+            continue
+        if line.startswith("-"):
+            if line.strip() not in SECTIONS:
+                raise ValueError(f"line {number}: unknown section {line!r}")
+            is_flavor = SECTIONS[line.strip()]
+            continue
+        if is_flavor is None:
+            raise ValueError(f"line {number}: ingredient before a section")
+        try:
+            rows.append(parse_ingredient_line(line) + (is_flavor,))
+        except ValueError as error:
+            raise ValueError(f"line {number}: {error}") from None
+    if not any(row[3] for row in rows) or all(row[3] for row in rows):
+        raise ValueError("a recipe needs base and flavor ingredients")
+    return rows
+
+
+def read_recipe_file(path, known_digest=None):
+    """ Reads, hashes and parses one recipe file and returns its (digest,
+        rows, error). The rows are None if the file's digest equals
+        known_digest, and the error is None unless the file is invalid.
+        Args:
+            path (str) : path of the recipe file
+            known_digest (str) : SHA-256 digest of an already parsed version
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_digest:
+        return digest, None, None
+    try:
+        return digest, parse_recipe(data.decode().splitlines()), None
+    except (ValueError, UnicodeDecodeError) as error:
+        return digest, None, str(error)
+
+
+class Corpus():
+    """ A set of parsed recipes stored as flat arrays: one row per ingredient
+        with the ID of its name in the corpus' own name table, its amount,
+        unit and section, and an offsets array delimiting every recipe. It is
+        saved as a single .npz file, indexed by recipe, together with the
+        folder and the modification time, size and digest of every source
+        file, and the modification time and size of the invalid files left
+        out.
+
+    ...
+
+    Attributes
+    ----------
+    files : list
+        Source file name of every recipe.
+    sources : list
+        (mtime_ns, size, sha256) of every recipe's source file.
+    names : list
+        Ingredient names, indexed by name_ids.
+    unit_names : list
+        Unit names, indexed by units.
+    offsets : np.ndarray
+        Start of every recipe's rows, followed by the total row count.
+    name_ids : np.ndarray
+        Name table ID of every ingredient row.
+    amounts : np.ndarray
+        Amount of every ingredient row.
+    units : np.ndarray
+        Unit table ID of every ingredient row.
+    flavor : np.ndarray
+        Whether every ingredient row is a flavor ingredient.
+    skipped : dict
+        (mtime_ns, size) of every invalid source file left out.
+    source_dir : str
+        Absolute path of the folder the recipes were ingested from, None if
+        unknown.
+
+    Methods
+    -------
+    from_rows(files, sources, recipes, skipped, source_dir):
+        Builds a corpus from parsed recipe rows.
+    rows(i):
+        Returns the parsed rows of a recipe.
+    ingredients(i):
+        Returns the (name, amount, unit) of every ingredient of a recipe.
+    flavor_matrix(vocabulary):
+        Returns the flavor amounts of every recipe by vocabulary ID.
+    digest():
+        Returns a digest of all source files.
+    """
+
+    def __init__(self, files, sources, names, unit_names, offsets, name_ids,
+                 amounts, units, flavor, skipped=None, source_dir=None):
+        """ Creates the corpus from its tables and arrays.
+            Args:
+                files (list) : source file name of every recipe
+                sources (list) : (mtime_ns, size, sha256) of every file
+                names (list) : ingredient name table
+                unit_names (list) : unit name table
+                offsets (np.ndarray) : start of every recipe's rows
+                name_ids (np.ndarray) : name ID of every row
+                amounts (np.ndarray) : amount of every row
+                units (np.ndarray) : unit ID of every row
+                flavor (np.ndarray) : flavor flag of every row
+                skipped (dict) : (mtime_ns, size) of every invalid file
+                source_dir (str) : folder the recipes were ingested from
+        """
+        self.files = files
+        self.sources = sources
+        self.names = names
+        self.unit_names = unit_names
+        self.offsets = offsets
+        self.name_ids = name_ids
+        self.amounts = amounts
+        self.units = units
+        self.flavor = flavor
+        self.skipped = dict(skipped or {})
+        self.source_dir = source_dir
+
+    @classmethod
+    def from_rows(cls, files, sources, recipes, skipped=None,
+                  source_dir=None):
+        """ Builds a corpus from the parse_recipe rows of every recipe. Names
+            are numbered in order of first appearance.
+            Args:
+                files (list) : source file name of every recipe
+                sources (list) : (mtime_ns, size, sha256) of every file
+                recipes (list) : parse_recipe rows of every recipe
+                skipped (dict) : (mtime_ns, size) of every invalid file
+                source_dir (str) : folder the recipes were ingested from
+        """
+        name_index, unit_index = {}, {}
+        offsets = np.zeros(len(recipes) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(rows) for rows in recipes])
+        rows = [row for recipe_rows in recipes for row in recipe_rows]
+        name_ids = np.fromiter((name_index.setdefault(row[0], len(name_index))
+                                for row in rows), dtype=np.int32,
+                               count=len(rows))
+        units = np.fromiter((unit_index.setdefault(row[2], len(unit_index))
+                             for row in rows), dtype=np.int16, count=len(rows))
+        amounts = np.array([row[1] for row in rows], dtype=np.float64)
+        flavor = np.array([row[3] for row in rows], dtype=bool)
+        return cls(list(files), list(sources), list(name_index),
+                   list(unit_index), offsets, name_ids, amounts, units, flavor,
+                   skipped, source_dir)
+
+    def __len__(self):
+        """ Returns the number of recipes.
+        """
+        return len(self.files)
+
+    def rows(self, i):
+        """ Returns the (name, amount, unit, is_flavor) rows of a recipe.
+            Args:
+                i (int) : index of the recipe
+        """
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return [(self.names[name_id], amount, self.unit_names[unit],
+                 is_flavor)
+                for name_id, amount, unit, is_flavor in zip(
+                    self.name_ids[start:end].tolist(),
+                    self.amounts[start:end].tolist(),
+                    self.units[start:end].tolist(),
+                    self.flavor[start:end].tolist())]
+
+    def ingredients(self, i):
+        """ Returns the (name, amount, unit) of every ingredient of a recipe,
+            in file order, from which Ingredient objects are built.
+            Args:
+                i (int) : index of the recipe
+        """
+        return [row[:3] for row in self.rows(i)]
+
+    def flavor_matrix(self, vocabulary):
+        """ Returns a dense array with one row per recipe and one column per
+            ID of the vocabulary, holding the flavor ingredient amounts.
+            Names missing from the vocabulary are interned first.
+            Args:
+                vocabulary (Vocabulary) : the global ingredient vocabulary
+        """
+        global_ids = np.array([vocabulary.intern(name) for name in self.names],
+                              dtype=np.intp)
+        recipe_rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        matrix = np.zeros((len(self), len(vocabulary)))
+        flavor = self.flavor
+        # a name listed twice in one recipe keeps its last amount
+        matrix[recipe_rows[flavor], global_ids[self.name_ids[flavor]]] = \
+            self.amounts[flavor]
+        return matrix
+
+    def digest(self):
+        """ Returns a digest of the corpus' source files and their order.
+        """
+        text = json.dumps([[file, source[2]] for file, source
+                           in zip(self.files, self.sources)])
+        return hashlib.sha256(text.encode()).hexdigest()
+
+
+def write_corpus(corpus, path):
+    """ Saves a corpus to an .npz file, writing a temporary file first and
+        renaming it, so readers never see a half-written corpus.
+        Args:
+            corpus (Corpus) : the corpus
+            path (str) : path of the corpus file
+    """
+    header = {"version": CORPUS_VERSION, "files": corpus.files,
+              "sources": corpus.sources, "names": corpus.names,
+              "unit_names": corpus.unit_names, "skipped": corpus.skipped,
+              "source_dir": corpus.source_dir}
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, header=np.array(json.dumps(header)),
+                 offsets=corpus.offsets, name_ids=corpus.name_ids,
+                 amounts=corpus.amounts, units=corpus.units,
+                 flavor=corpus.flavor)
+    os.replace(temp_path, path)
+
+
+def load_corpus(path):
+    """ Reads a corpus file, returning None if it does not exist or was
+        written by another CORPUS_VERSION.
+        Args:
+            path (str) : path of the corpus file
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        header = json.loads(data["header"].item())
+        if header["version"] != CORPUS_VERSION:
+            return None
+        return Corpus(header["files"], [tuple(source) for source
+                                        in header["sources"]],
+                      header["names"], header["unit_names"], data["offsets"],
+                      data["name_ids"], data["amounts"], data["units"],
+                      data["flavor"], {file: tuple(stamp) for file, stamp
+                                       in header.get("skipped", {}).items()},
+                      header.get("source_dir"))
+
+
+def ingest(source_dir=INSPIRING_SET_DIR, corpus_path=CORPUS_PATH, workers=1,
+           chunk_size=256, write=True):
+    """ Brings the corpus file up to date with the recipe files of a folder
+        and returns the corpus with ingestion statistics. Files whose
+        modification time and size are unchanged are not read; files whose
+        content digest is unchanged are not parsed again. The remaining files
+        are read and parsed in worker processes when workers is above 1.
+        Invalid files are left out and reported under "errors".
+        Args:
+            source_dir (str) : folder of the recipe files
+            corpus_path (str) : path of the corpus file
+            workers (int) : number of parsing processes
+            chunk_size (int) : number of files handed to a worker at once
+            write (bool) : whether to save the updated corpus file
+    """
+    previous = load_corpus(corpus_path)
+    known = {}
+    if previous is not None:
+        known = {file: (source, i) for i, (file, source)
+                 in enumerate(zip(previous.files, previous.sources))}
+
+    files = sorted(file for file in os.listdir(source_dir)
+                   if os.path.isfile(os.path.join(source_dir, file)))
+    stats = {"unchanged": 0, "rehashed": 0, "parsed": 0,
+             "removed": len(set(known) - set(files)), "errors": {}}
+    stamps, to_read = {}, []
+    for file in files:
+        info = os.stat(os.path.join(source_dir, file))
+        stamps[file] = (info.st_mtime_ns, info.st_size)
+        source = known.get(file, (None,))[0]
+        if source is None or tuple(source[:2]) != stamps[file]:
+            to_read.append(file)
+
+    paths = [os.path.join(source_dir, file) for file in to_read]
+    digests = [known[file][0][2] if file in known else None
+               for file in to_read]
+    if workers > 1 and len(paths) > chunk_size:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_recipe_file, paths, digests,
+                                        chunksize=chunk_size))
+    else:
+        results = list(map(read_recipe_file, paths, digests))
+    read = dict(zip(to_read, results))
+
+    kept_files, sources, recipes, skipped = [], [], [], {}
+    for file in files:
+        if file in read:
+            digest, rows, error = read[file]
+            if error is not None:
+                stats["errors"][file] = error
+                skipped[file] = stamps[file]
+                continue
+            if rows is None:
+                stats["rehashed"] += 1
+                rows = previous.rows(known[file][1])
+            else:
+                stats["parsed"] += 1
+        else:
+            stats["unchanged"] += 1
+            digest = known[file][0][2]
+            rows = previous.rows(known[file][1])
+        kept_files.append(file)
+        sources.append(stamps[file] + (digest,))
+        recipes.append(rows)
+
+    corpus = Corpus.from_rows(kept_files, sources, recipes, skipped,
+                              os.path.abspath(source_dir))
+    if write:
+        write_corpus(corpus, corpus_path)
+    return corpus, stats
+
+
+def stale_files(corpus, source_dir):
+    """ Returns the recipe files of a folder that were added, removed or
+        changed since the folder was ingested into the corpus. Files are
+        compared by size and modification time; only a file whose size is
+        unchanged but whose modification time differs is hashed.
+        Args:
+            corpus (Corpus) : the loaded corpus
+            source_dir (str) : folder of the recipe files
+    """
+    files = sorted(file for file in os.listdir(source_dir)
+                   if os.path.isfile(os.path.join(source_dir, file)))
+    known = dict(zip(corpus.files, corpus.sources))
+    stale = sorted((set(known) | set(corpus.skipped)) - set(files))
+    for file in files:
+        path = os.path.join(source_dir, file)
+        info = os.stat(path)
+        stamp = (info.st_mtime_ns, info.st_size)
+        if file in corpus.skipped:
+            changed = tuple(corpus.skipped[file]) != stamp
+        elif file not in known:
+            changed = True
+        elif info.st_size != known[file][1]:
+            changed = True
+        elif info.st_mtime_ns != known[file][0]:
+            with open(path, "rb") as f:
+                changed = hashlib.sha256(f.read()).hexdigest() != \
+                    known[file][2]
+        else:
+            changed = False
+        if changed:
+            stale.append(file)
+    return stale
+
+
+def main(argv=None):
+    """ Ingests a folder of recipe files into the corpus file and prints the
+        ingestion statistics, exiting with status 1 if a file was invalid.
+        Args:
+            argv (list) : arguments to parse, None for sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Parse recipe files into an indexed corpus file.")
+    parser.add_argument("--source-dir", default=INSPIRING_SET_DIR,
+                        help="folder of the recipe files")
+    parser.add_argument("--corpus", default=CORPUS_PATH,
+                        help="corpus file to create or update")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of parsing processes")
+    args = parser.parse_args(argv)
+
+    corpus, stats = ingest(args.source_dir, args.corpus, args.workers)
+    print(f"Corpus of {len(corpus)} recipes and {len(corpus.names)} "
+          f"ingredients written to {args.corpus}: {stats['parsed']} parsed, "
+          f"{stats['rehashed']} unchanged after hashing, "
+          f"{stats['unchanged']} unchanged, {stats['removed']} removed")
+    for file, error in stats["errors"].items():
+        print(f"Skipped {file}: {error}")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
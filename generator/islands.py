@@ -0,0 +1,695 @@
+import numpy as np
+import argparse
+import queue
+import threading
+import time
+from cookie_generator import RecipeManager
+from recipe import Recipe
+from recipe_instructions import RecipeInstructions
+from ingredient import Ingredient
+from checkpoint import COMPONENTS, recipe_ingredients
+from export import (FORMATS, top_recipes, export_recipes,
+                    missing_format_dependencies)
+from telemetry import fitness_stats
+from paths import FITTEST_RECIPES_DIR
+
+SECRET_ENV = "EMOTIMAKER_ISLAND_SECRET"
+CONNECT_TIMEOUT = 60
+MIGRATION_TIMEOUT = 600
+RESULT_POLL = 1
+
+
+def ring_topology(index, count):
+    """ Returns the island the given island sends migrants to: the next one
+        on a ring.
+        Args:
+            index (int) : index of the sending island
+            count (int) : number of islands
+    """
+    return [(index + 1) % count] if count > 1 else []
+
+
+def fully_connected_topology(index, count):
+    """ Returns the islands the given island sends migrants to: all others.
+        Args:
+            index (int) : index of the sending island
+            count (int) : number of islands
+    """
+    return [i for i in range(count) if i != index]
+
+
+TOPOLOGIES = {
+    "ring": ring_topology,
+    "full": fully_connected_topology,
+}
+
+
+def pack_recipe(recipe):
+    """ Returns a compact, picklable form of a scored recipe: its ingredient
+        names, amounts and units, instruction parameters, name and weighted
+        fitness components. Names are used instead of ingredient IDs, which
+        may differ between processes.
+        Args:
+            recipe (Recipe) : the recipe
+    """
+    ings = recipe_ingredients(recipe)
+    return (tuple(ing.get_name() for ing in ings),
+            np.array([ing.get_amount() for ing in ings], dtype=np.float64),
+            tuple(ing.unit for ing in ings),
+            tuple(recipe.get_instructions().get_params()), recipe.name,
+            tuple(float(recipe.fitness.components[name])
+                  for name in COMPONENTS))
+
+
+def unpack_recipe(packed, emotion, rng):
+    """ Rebuilds a scored recipe from its pack_recipe form without rescoring
+        it.
+        Args:
+            packed (tuple) : the packed recipe
+            emotion (str) : emotion the recipe was scored for
+            rng (np.random.Generator) : random number generator of the recipe
+    """
+    names, amounts, units, instructions, name, components = packed
+    ings = [Ingredient(ingr_name, amount, unit) for ingr_name, amount, unit
+            in zip(names, amounts.tolist(), units)]
+    recipe = Recipe(ings, emotion,
+                    RecipeInstructions(emotion, *instructions, rng=rng), rng)
+    recipe.name = name
+    recipe.fitness.set_components(dict(zip(COMPONENTS, components)))
+    return recipe
+
+
+class QueueEndpoint():
+    """ Migration transport between the islands of one machine, with one
+        multiprocessing queue per island as its inbox.
+
+    ...
+
+    Attributes
+    ----------
+    queues : list
+        Inbox queue of every island.
+    index : int
+        Index of the island using the endpoint.
+
+    Methods
+    -------
+    open():
+        Prepares the endpoint for use in the island's process.
+    send(target, message):
+        Sends a message to another island.
+    receive(timeout):
+        Returns the next message sent to this island.
+    close():
+        Releases the endpoint.
+    """
+
+    def __init__(self, queues, index):
+        """ Stores the inboxes.
+            Args:
+                queues (list) : inbox queue of every island
+                index (int) : index of the island using the endpoint
+        """
+        self.queues = queues
+        self.index = index
+
+    def open(self):
+        """ Nothing to prepare, the queues are created by the parent process.
+        """
+
+    def send(self, target, message):
+        """ Puts a message in the inbox of another island.
+            Args:
+                target (int) : index of the receiving island
+                message (tuple) : the picklable message
+        """
+        self.queues[target].put(message)
+
+    def receive(self, timeout=None):
+        """ Waits for and returns the next message in this island's inbox,
+            raising queue.Empty if none arrives within timeout seconds.
+            Args:
+                timeout (float) : seconds to wait, None to wait forever
+        """
+        return self.queues[self.index].get(timeout=timeout)
+
+    def close(self):
+        """ Nothing to release.
+        """
+
+
+class SocketEndpoint():
+    """ Migration transport over authenticated TCP connections, so islands
+        can run in separate processes on one or several machines. Every
+        island listens on its own address and connects to the listener of
+        an island for every message it sends. Connections are accepted by a
+        background thread and each one is served by a thread of its own, as
+        a sender waits for the receiver to answer the authentication
+        challenge while the receiver may itself be sending. Both ends give
+        up on a connection that is not done within CONNECT_TIMEOUT seconds,
+        so a port probe or a stalled peer cannot block an island. Received
+        messages are unpickled, so the shared secret must be kept from
+        anyone who can reach the listeners.
+
+    ...
+
+    Attributes
+    ----------
+    addresses : list
+        (host, port) address every island listens on.
+    index : int
+        Index of the island using the endpoint.
+    authkey : bytes
+        Shared secret authenticating the connections.
+    bind : tuple
+        (host, port) address the listener of this island binds to.
+    listener : socket.socket
+        Listening socket of this island, created by open.
+    inbox : queue.Queue
+        Messages received by the connection threads.
+
+    Methods
+    -------
+    open():
+        Starts listening on this island's address.
+    accept_messages(listener):
+        Serves every connection accepted by the listener.
+    receive_message(sock):
+        Authenticates a connection and puts its message in the inbox.
+    send(target, message):
+        Sends a message to another island.
+    receive(timeout):
+        Returns the next message sent to this island.
+    close():
+        Stops listening.
+    """
+
+    def __init__(self, addresses, index, authkey, bind=None):
+        """ Stores the addresses without opening any socket.
+            Args:
+                addresses (list) : (host, port) address of every island
+                index (int) : index of the island using the endpoint
+                authkey (bytes) : shared secret of all islands
+                bind (tuple) : (host, port) address the listener binds to,
+                               None for this island's port on localhost
+        """
+        if not authkey:
+            raise ValueError("Socket transport needs a shared secret")
+        self.addresses = [tuple(address) for address in addresses]
+        self.index = index
+        self.authkey = authkey
+        self.bind = tuple(bind) if bind is not None else \
+            ("127.0.0.1", self.addresses[index][1])
+        self.listener = None
+        self.inbox = None
+
+    def open(self):
+        """ Starts listening on the bind address and accepting messages in a
+            background thread.
+        """
+        import socket
+        self.listener = socket.create_server(self.bind,
+                                             backlog=len(self.addresses))
+        self.inbox = queue.Queue()
+        threading.Thread(target=self.accept_messages, args=(self.listener,),
+                         daemon=True).start()
+
+    def accept_messages(self, listener):
+        """ Hands every accepted connection to a thread of its own until the
+            listener is closed.
+            Args:
+                listener (socket.socket) : the listening socket
+        """
+        while True:
+            try:
+                sock = listener.accept()[0]
+            except OSError:
+                if self.listener is not listener:
+                    return
+                # e.g. a connection reset before it was accepted
+                time.sleep(0.05)
+                continue
+            threading.Thread(target=self.receive_message, args=(sock,),
+                             daemon=True).start()
+
+    def receive_message(self, sock):
+        """ Authenticates an accepted connection and puts the message it
+            carries in the inbox. Connections that fail to authenticate, send
+            no valid message or take longer than CONNECT_TIMEOUT are dropped.
+            Args:
+                sock (socket.socket) : the accepted connection
+        """
+        from multiprocessing.connection import (answer_challenge,
+                                                deliver_challenge)
+        connection, timer = timed_connection(sock, CONNECT_TIMEOUT)
+        try:
+            with connection:
+                deliver_challenge(connection, self.authkey)
+                answer_challenge(connection, self.authkey)
+                message = connection.recv()
+        except Exception:
+            return
+        finally:
+            timer.cancel()
+            sock.close()
+        self.inbox.put(message)
+
+    def send(self, target, message):
+        """ Connects to another island and sends it a message, waiting for
+            its listener to start if needed. Raises TimeoutError if the
+            message is not delivered within CONNECT_TIMEOUT seconds.
+            Args:
+                target (int) : index of the receiving island
+                message (tuple) : the picklable message
+        """
+        import socket
+        from multiprocessing.connection import (answer_challenge,
+                                                deliver_challenge)
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while True:
+            try:
+                sock = socket.create_connection(
+                    self.addresses[target],
+                    timeout=max(deadline - time.monotonic(), 0.05))
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        connection, timer = timed_connection(
+            sock, max(deadline - time.monotonic(), 0.05))
+        try:
+            with connection:
+                answer_challenge(connection, self.authkey)
+                deliver_challenge(connection, self.authkey)
+                connection.send(message)
+        except (OSError, EOFError) as error:
+            if timer.finished.is_set():
+                raise TimeoutError(f"Island {target} did not take a message "
+                                   f"within {CONNECT_TIMEOUT} s") from error
+            raise
+        finally:
+            timer.cancel()
+            sock.close()
+
+    def receive(self, timeout=None):
+        """ Waits for and returns the next message sent to this island,
+            raising queue.Empty if none arrives within timeout seconds.
+            Args:
+                timeout (float) : seconds to wait, None to wait forever
+        """
+        return self.inbox.get(timeout=timeout)
+
+    def close(self):
+        """ Stops listening.
+        """
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.close()
+
+
+def timed_connection(sock, timeout):
+    """ Wraps a connected socket in a multiprocessing connection and starts
+        a timer shutting the socket down after timeout seconds, which makes
+        a blocked handshake, send or receive fail instead of waiting
+        forever. Returns the connection and the timer, which the caller
+        cancels once done with the connection.
+        Args:
+            sock (socket.socket) : the connected socket
+            timeout (float) : seconds the connection may take
+    """
+    import os
+    import socket
+    from multiprocessing.connection import Connection
+
+    def shut_down():
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # the connection reads and writes the descriptor directly, which needs
+    # a blocking socket
+    sock.setblocking(True)
+    connection = Connection(os.dup(sock.fileno()))
+    timer = threading.Timer(timeout, shut_down)
+    timer.daemon = True
+    timer.start()
+    return connection, timer
+
+
+def island_secret(secret=None):
+    """ Returns the shared secret of socket transport as bytes: the given
+        one, or else the value of the SECRET_ENV environment variable. There
+        is no default secret, as anyone knowing it can make the islands
+        unpickle arbitrary data; ValueError is raised if neither is set.
+        Args:
+            secret (str) : the secret, None to read SECRET_ENV
+    """
+    import os
+    secret = secret or os.environ.get(SECRET_ENV)
+    if not secret:
+        raise ValueError(f"Socket transport needs a shared secret: set "
+                         f"{SECRET_ENV} or pass --island-secret")
+    return secret.encode()
+
+
+def free_addresses(count, host="127.0.0.1"):
+    """ Returns count local addresses with ports that are free right now.
+        Args:
+            count (int) : number of addresses
+            host (str) : host name of the addresses
+    """
+    import socket
+    sockets = [socket.socket() for _ in range(count)]
+    try:
+        for sock in sockets:
+            sock.bind((host, 0))
+        return [(host, sock.getsockname()[1]) for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def island_rngs(seed, count):
+    """ Returns the independent random number generator of every island,
+        spawned from the seed so that each island evolves the same way
+        whatever process or machine it runs on.
+        Args:
+            seed (int) : seed of the run, None for an unseeded run
+            count (int) : number of islands
+    """
+    return [np.random.default_rng(child)
+            for child in np.random.SeedSequence(seed).spawn(count)]
+
+
+def receive_migrants(endpoint, sources, generation, pending,
+                     timeout=MIGRATION_TIMEOUT):
+    """ Returns the migrants the source islands sent after the given
+        generation, in source order. Messages of later migrations that
+        arrive early are kept in pending. Raises TimeoutError if a source
+        island sends nothing for timeout seconds, as it has likely died.
+        Args:
+            endpoint (QueueEndpoint) : transport of the island
+            sources (list) : indices of the islands sending to this island
+            generation (int) : generation the migration follows
+            pending (dict) : early messages keyed by (source, generation)
+            timeout (float) : seconds to wait for every message
+    """
+    while any((source, generation) not in pending for source in sources):
+        try:
+            source, sent_generation, packed = endpoint.receive(timeout)
+        except queue.Empty:
+            missing = [source for source in sources
+                       if (source, generation) not in pending]
+            raise TimeoutError(
+                f"No migrants from islands {missing} after generation "
+                f"{generation} within {timeout} s") from None
+        pending[(source, sent_generation)] = packed
+    return [packed for source in sources
+            for packed in pending.pop((source, generation))]
+
+
+def immigrate(manager, migrants):
+    """ Replaces the least fit recipes of an island with the fittest of the
+        received migrants, keeping at least half of the island's own recipes.
+        Args:
+            manager (RecipeManager) : manager of the island
+            migrants (list) : the received recipes
+    """
+    size = len(manager.recipes)
+    count = min(len(migrants), size // 2)
+    manager.recipes = top_recipes(manager.recipes, size - count) + \
+        top_recipes(migrants, count)
+
+
+def run_island(index, count, emotion, generations, rng, endpoint,
+               topology="ring", interval=5, migrants=2, selection="roulette",
+               top_k=1, fitness_cache=None, population=None):
+    """ Evolves one island and returns its summary with its top_k recipes in
+        packed form. Every interval generations the island sends its fittest
+        migrants to the islands given by the topology and waits for the
+        migrants of the islands sending to it, so all islands migrate in
+        step and a seeded run is reproducible.
+        Args:
+            index (int) : index of the island
+            count (int) : number of islands
+            emotion (str) : emotion key or name
+            generations (int) : number of generations
+            rng (np.random.Generator) : generator of the island
+            endpoint (QueueEndpoint) : migration transport of the island
+            topology (str) : key of TOPOLOGIES
+            interval (int) : generations between migrations
+            migrants (int) : number of recipes every migration sends
+            selection (str) : parent selection strategy
+            top_k (int) : number of fittest recipes returned
+            fitness_cache (str) : persistent fitness cache file, None for none
+            population (dict) : population_size, offspring and elitism
+                                arguments of the island's RecipeManager
+    """
+    start = time.perf_counter()
+    targets = TOPOLOGIES[topology](index, count)
+    sources = [i for i in range(count)
+               if index in TOPOLOGIES[topology](i, count)]
+    manager = RecipeManager(selection=selection, rng=rng,
+                            fitness_cache=fitness_cache, **(population or {}))
+    manager.set_emotion(emotion)
+    manager.parse_files()
+    endpoint.open()
+    pending = {}
+    try:
+        while manager.generation < generations:
+            for _ in range(min(interval, generations - manager.generation)):
+                manager.genetic_algo()
+                manager.generation += 1
+            if manager.generation == generations or count == 1:
+                continue
+            packed = [pack_recipe(recipe) for recipe
+                      in top_recipes(manager.recipes, migrants)]
+            for target in targets:
+                endpoint.send(target, (index, manager.generation, packed))
+            received = receive_migrants(endpoint, sources, manager.generation,
+                                        pending)
+            immigrate(manager, [unpack_recipe(recipe, manager.emotion, rng)
+                                for recipe in received])
+    finally:
+        endpoint.close()
+    manager.close()
+    return {"island": index, "emotion": manager.emotion,
+            "fitness": fitness_stats(manager.recipes),
+            "seconds": time.perf_counter() - start,
+            "top": [pack_recipe(recipe) for recipe
+                    in top_recipes(manager.recipes, top_k)]}
+
+
+def island_process(results, index, *args, **kwargs):
+    """ Entry point of an island's process, putting the island's summary on
+        the results queue, or the traceback of the exception that stopped
+        the island under "error".
+        Args:
+            results (multiprocessing.Queue) : queue collecting the summaries
+            index (int) : index of the island
+            *args, **kwargs : other arguments of run_island
+    """
+    import traceback
+    try:
+        summary = run_island(index, *args, **kwargs)
+    except Exception:
+        # the exception itself may not be picklable
+        summary = {"island": index, "error": traceback.format_exc()}
+    results.put(summary)
+
+
+def collect_summaries(results, processes):
+    """ Returns the summary of every island process, sorted by island.
+        Raises RuntimeError as soon as an island reports an exception or a
+        process exits without reporting, after terminating the others, which
+        would otherwise wait for the failed island's migrants.
+        Args:
+            results (multiprocessing.Queue) : queue collecting the summaries
+            processes (list) : process of every island
+    """
+    summaries, exited = [], set()
+    try:
+        while len(summaries) < len(processes):
+            try:
+                summary = results.get(timeout=RESULT_POLL)
+            except queue.Empty:
+                # a process writes its result before exiting, so an island
+                # that exited a whole poll ago without a result has failed
+                reported = {summary["island"] for summary in summaries}
+                failed = sorted(exited - reported)
+                if failed:
+                    raise RuntimeError(
+                        f"Island {failed[0]} exited with code "
+                        f"{processes[failed[0]].exitcode} without a result")
+                exited = {i for i, process in enumerate(processes)
+                          if process.exitcode is not None}
+                continue
+            if "error" in summary:
+                raise RuntimeError(f"Island {summary['island']} failed:\n"
+                                   f"{summary['error']}")
+            summaries.append(summary)
+    except BaseException:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        raise
+    return sorted(summaries, key = lambda x : x["island"])
+
+
+def run_islands(emotion, generations, islands=4, seed=None, interval=5,
+                migrants=2, topology="ring", transport="queue",
+                selection="roulette", top_k=1, fitness_cache=None,
+                population=None, secret=None):
+    """ Runs every island in its own process on this machine and returns the
+        summary of the run: the island summaries, without their packed
+        recipes, and the overall top_k recipes under "recipes".
+        Args:
+            emotion (str) : emotion key or name
+            generations (int) : number of generations of every island
+            islands (int) : number of islands and processes
+            seed (int) : seed of the run, None for an unseeded run
+            interval (int) : generations between migrations
+            migrants (int) : number of recipes every migration sends
+            topology (str) : key of TOPOLOGIES
+            transport (str) : "queue" or "socket"
+            selection (str) : parent selection strategy
+            top_k (int) : number of fittest recipes returned
+            fitness_cache (str) : persistent fitness cache file, None for none
+            population (dict) : population_size, offspring and elitism
+                                arguments of every island's RecipeManager
+            secret (str) : shared secret of socket transport, None to read
+                           it from the SECRET_ENV environment variable
+    """
+    import multiprocessing
+
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown island topology: {topology}")
+    if transport == "queue":
+        queues = [multiprocessing.Queue() for _ in range(islands)]
+        endpoints = [QueueEndpoint(queues, i) for i in range(islands)]
+    elif transport == "socket":
+        authkey = island_secret(secret)
+        addresses = free_addresses(islands)
+        endpoints = [SocketEndpoint(addresses, i, authkey)
+                     for i in range(islands)]
+    else:
+        raise ValueError(f"Unknown island transport: {transport}")
+
+    start = time.perf_counter()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(
+                     target=island_process,
+                     args=(results, i, islands, emotion, generations, rng,
+                           endpoints[i], topology, interval, migrants,
+                           selection, top_k, fitness_cache, population))
+                 for i, rng in enumerate(island_rngs(seed, islands))]
+    for process in processes:
+        process.start()
+    # drain the results before joining, a process exits only once its
+    # result was read
+    try:
+        summaries = collect_summaries(results, processes)
+    finally:
+        for process in processes:
+            process.join()
+
+    rng = np.random.default_rng(seed)
+    recipes = [unpack_recipe(packed, summary["emotion"], rng)
+               for summary in summaries for packed in summary.pop("top")]
+    return {"islands": summaries, "recipes": top_recipes(recipes, top_k),
+            "seconds": time.perf_counter() - start}
+
+
+def parse_address(text):
+    """ Returns the (host, port) tuple of a "host:port" string.
+        Args:
+            text (str) : the address
+    """
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+
+def main(argv=None):
+    """ Runs one island of a run spread over several machines. Every machine
+        is given the same arguments except --index and --bind, and the island
+        listens on the port of its own entry of --addresses, on localhost
+        unless --bind gives the interface to listen on.
+        Args:
+            argv (list) : arguments to parse, None for sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        description="Run one island of a multi-machine island-model run.")
+    parser.add_argument("--index", type=int, required=True,
+                        help="index of this island in --addresses")
+    parser.add_argument("--addresses", required=True,
+                        help="comma-separated host:port of every island")
+    parser.add_argument("--bind",
+                        help="host or host:port this island listens on; "
+                             "127.0.0.1 on its --addresses port if omitted")
+    parser.add_argument("--island-secret",
+                        help="shared secret of all islands; read from "
+                             f"{SECRET_ENV} if omitted, which keeps it out "
+                             "of the process list")
+    parser.add_argument("--emotion", required=True,
+                        help="emotion name or key 1-6")
+    parser.add_argument("--generations", type=int, required=True,
+                        help="number of generations")
+    parser.add_argument("--seed", type=int, help="random seed of the run")
+    parser.add_argument("--migration-interval", type=int, default=5,
+                        help="generations between migrations")
+    parser.add_argument("--migrants", type=int, default=2,
+                        help="number of recipes sent by every migration")
+    parser.add_argument("--topology", default="ring", choices=TOPOLOGIES,
+                        help="islands every island sends migrants to")
+    parser.add_argument("--selection", default="roulette",
+                        choices=["roulette", "sus", "tournament", "rank"],
+                        help="parent selection strategy")
+    parser.add_argument("--population-size", type=int,
+                        help="number of recipes on the island")
+    parser.add_argument("--offspring", type=int,
+                        help="number of offspring bred every generation")
+    parser.add_argument("--elitism", type=int,
+                        help="number of the fittest recipes kept every "
+                             "generation")
+    parser.add_argument("--output-dir", default=FITTEST_RECIPES_DIR,
+                        help="folder the island's fittest recipes are "
+                             "written to")
+    parser.add_argument("--top-k", type=int, default=1,
+                        help="number of fittest recipes written")
+    parser.add_argument("--format", nargs="+", default=["text"],
+                        choices=FORMATS, dest="formats",
+                        help="output formats of the fittest recipes")
+    args = parser.parse_args(argv)
+    if missing_format_dependencies(args.formats):
+        parser.error("--format needs "
+                     f"{', '.join(missing_format_dependencies(args.formats))}"
+                     ", which is not installed")
+    try:
+        authkey = island_secret(args.island_secret)
+    except ValueError as error:
+        parser.error(str(error))
+
+    addresses = [parse_address(text) for text in args.addresses.split(",")]
+    bind = None
+    if args.bind is not None:
+        bind = parse_address(args.bind) if ":" in args.bind else \
+            (args.bind, addresses[args.index][1])
+    rng = island_rngs(args.seed, len(addresses))[args.index]
+    summary = run_island(args.index, len(addresses), args.emotion,
+                         args.generations, rng,
+                         SocketEndpoint(addresses, args.index, authkey, bind),
+                         args.topology, args.migration_interval,
+                         args.migrants, args.selection, args.top_k,
+                         population={"population_size": args.population_size,
+                                     "offspring": args.offspring,
+                                     "elitism": args.elitism})
+    recipes = [unpack_recipe(packed, summary["emotion"], rng)
+               for packed in summary["top"]]
+    export_recipes(recipes, args.output_dir, args.top_k, args.formats)
+    print(f"Island {args.index} done, fitness {summary['fitness']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,8 @@ class Name():
         Emotion associated with recipe.
     name : string
         Name of recipe.
+    rng : np.random.Generator
+        Random number generator choosing the synonym.
 
     Methods
     -------
@@ -41,12 +43,15 @@ class Name():
         Returns the name.
     """
         
-    def __init__(self, emotion):
+    def __init__(self, emotion, rng=None):
         """ Calls the name to be generated.
             Args:
                 emotion (string) : user's current emotion
+                rng (np.random.Generator) : random number generator, a fresh
+                                            unseeded one if None
         """
         self.emotion = emotion
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.name = self.name_generator()
 
     def name_generator(self):
@@ -55,7 +60,7 @@ class Name():
                 emotion (str) : recipe's associated emotion
         """
         syn_opts = EMOTIONAL_REPETOIRE[self.emotion]
-        syn_choice = np.random.choice(syn_opts)       
+        syn_choice = syn_opts[self.rng.integers(len(syn_opts))]
         return syn_choice + " " + self.emotion + " Cookies" 
     
     def get_name(self):
@@ -0,0 +1,337 @@
+import numpy as np
+from abc import ABC, abstractmethod
+
+# largest number of query by corpus distances computed in one block
+BLOCK_SIZE = 1 << 22
+# inspiring recipes every query is compared with to estimate its mean distance
+SAMPLE_SIZE = 1024
+
+
+def brute_force_search(queries, points, sq_norms, k):
+    """ Returns the squared distances and indices of the k nearest points of
+        every query, nearest first, comparing the queries with every point
+        through matrix products in blocks that bound the memory used.
+        Args:
+            queries (np.ndarray) : one query per row
+            points (np.ndarray) : one point per row
+            sq_norms (np.ndarray) : squared norm of every point
+            k (int) : number of neighbours, at most len(points)
+    """
+    sq_dists = np.empty((len(queries), k))
+    indices = np.empty((len(queries), k), dtype=np.intp)
+    block = max(1, BLOCK_SIZE // max(len(points), 1))
+    for start in range(0, len(queries), block):
+        rows = queries[start:start + block]
+        block_dists = np.maximum(
+            (rows ** 2).sum(axis=1)[:, None] - 2 * rows @ points.T
+            + sq_norms[None, :], 0)
+        if k < len(points):
+            nearest = np.argpartition(block_dists, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.tile(np.arange(k), (len(rows), 1))
+        nearest_dists = np.take_along_axis(block_dists, nearest, axis=1)
+        order = np.argsort(nearest_dists, axis=1)
+        sq_dists[start:start + block] = np.take_along_axis(
+            nearest_dists, order, axis=1)
+        indices[start:start + block] = np.take_along_axis(
+            nearest, order, axis=1)
+    return sq_dists, indices
+
+
+class NeighborIndex(ABC):
+    """ Base of the nearest-neighbour indexes over the flavor amount vectors
+        of the inspiring set. Only the columns of flavors that appear in the
+        inspiring set are indexed: the other amounts of a recipe add the same
+        squared distance to every inspiring recipe, which is kept aside as the
+        recipe's rest. The index also holds the corpus statistics the
+        dissimilarity estimate of neighbor_distance_scores needs.
+
+    ...
+
+    Attributes
+    ----------
+    requires : tuple
+        Optional modules the index needs, checked by missing_dependencies.
+    columns : np.ndarray
+        Ingredient IDs of the indexed columns.
+    positions : np.ndarray
+        Indexed column of every ingredient ID, -1 if it is not indexed.
+    points : np.ndarray
+        Indexed amounts of every inspiring recipe.
+    centroid : np.ndarray
+        Mean of the points.
+    spread : float
+        Mean squared distance of the points to their centroid.
+    radius : float
+        Largest distance of a point to the centroid.
+    sample : np.ndarray
+        Indices of at most SAMPLE_SIZE points estimating mean distances.
+
+    Methods
+    -------
+    project(id_lists, amount_lists):
+        Returns the indexed amounts and rests of several recipes.
+    query(queries, k):
+        Returns the k nearest inspiring recipes of every query.
+    """
+
+    requires = ()
+
+    def __init__(self, matrix):
+        """ Keeps the columns of the inspiring matrix that hold any amount
+            and computes the corpus statistics and sample.
+            Args:
+                matrix (np.ndarray) : inspiring recipe by ingredient ID
+                                      amount matrix
+        """
+        self.columns = np.flatnonzero((matrix != 0).any(axis=0))
+        self.positions = np.full(matrix.shape[1], -1, dtype=np.intp)
+        self.positions[self.columns] = np.arange(len(self.columns))
+        self.points = np.ascontiguousarray(matrix[:, self.columns])
+        self.centroid = self.points.mean(axis=0)
+        sq_spreads = ((self.points - self.centroid) ** 2).sum(axis=1)
+        self.spread = float(sq_spreads.mean())
+        self.radius = float(np.sqrt(sq_spreads.max()))
+        # the sample is drawn from a generator of its own, so scores do not
+        # depend on the run's random stream
+        self.sample = np.arange(len(self.points))
+        if len(self.points) > SAMPLE_SIZE:
+            self.sample = np.sort(np.random.default_rng(0).choice(
+                len(self.points), SAMPLE_SIZE, replace=False))
+
+    def __len__(self):
+        """ Returns the number of indexed inspiring recipes.
+        """
+        return len(self.points)
+
+    def project(self, id_lists, amount_lists):
+        """ Splits the flavor amounts of several recipes into a matrix of
+            their indexed amounts and the squared norm of all other amounts.
+            Args:
+                id_lists (list) : one array of flavor ingredient IDs per recipe
+                amount_lists (list) : the matching ingredient amounts per recipe
+        """
+        queries = np.zeros((len(id_lists), len(self.columns)))
+        rests = np.zeros(len(id_lists))
+        for row, (ids, amounts) in enumerate(zip(id_lists, amount_lists)):
+            ids = np.asarray(ids, dtype=np.intp)
+            amounts = np.asarray(amounts, dtype=float)
+            positions = np.where(ids < len(self.positions),
+                                 self.positions[np.minimum(
+                                     ids, len(self.positions) - 1)], -1)
+            indexed = positions >= 0
+            queries[row, positions[indexed]] = amounts[indexed]
+            rests[row] = (amounts[~indexed] ** 2).sum()
+        return queries, rests
+
+    @abstractmethod
+    def query(self, queries, k):
+        """ Returns the squared distances and indices of the k nearest
+            inspiring recipes of every query, nearest first.
+            Args:
+                queries (np.ndarray) : indexed amounts, one query per row
+                k (int) : number of neighbours, at most len(self)
+        """
+
+
+class BruteForceIndex(NeighborIndex):
+    """ Exact index comparing every query with every inspiring recipe through
+        matrix products, in blocks of queries that bound the memory used.
+        Building it is free and a query costs O(N * d) for N inspiring recipes
+        of d indexed flavors.
+    """
+
+    def __init__(self, matrix):
+        """ Indexes the inspiring matrix.
+            Args:
+                matrix (np.ndarray) : inspiring recipe by ingredient ID
+                                      amount matrix
+        """
+        super().__init__(matrix)
+        self.sq_norms = (self.points ** 2).sum(axis=1)
+
+    def query(self, queries, k):
+        """ Returns the squared distances and indices of the exact k nearest
+            inspiring recipes of every query, nearest first.
+            Args:
+                queries (np.ndarray) : indexed amounts, one query per row
+                k (int) : number of neighbours, at most len(self)
+        """
+        return brute_force_search(queries, self.points, self.sq_norms, k)
+
+
+class KDTreeIndex(NeighborIndex):
+    """ Exact index backed by scipy's k-d tree. Building it costs
+        O(N log N); queries are sublinear while few flavors are indexed, but
+        degrade towards brute force as the number of distinct flavors in the
+        inspiring set grows. Needs scipy.
+    """
+
+    requires = ("scipy",)
+
+    def __init__(self, matrix):
+        """ Builds the k-d tree over the inspiring matrix.
+            Args:
+                matrix (np.ndarray) : inspiring recipe by ingredient ID
+                                      amount matrix
+        """
+        # imported here, as scipy is only needed by this backend
+        from scipy.spatial import cKDTree
+
+        super().__init__(matrix)
+        self.tree = cKDTree(self.points)
+
+    def query(self, queries, k):
+        """ Returns the squared distances and indices of the exact k nearest
+            inspiring recipes of every query, nearest first.
+            Args:
+                queries (np.ndarray) : indexed amounts, one query per row
+                k (int) : number of neighbours, at most len(self)
+        """
+        dists, indices = self.tree.query(queries, k=k)
+        dists = np.asarray(dists).reshape(len(queries), k)
+        indices = np.asarray(indices, dtype=np.intp).reshape(len(queries), k)
+        return dists ** 2, indices
+
+
+class RandomProjectionIndex(NeighborIndex):
+    """ Approximate index searching a random projection of the inspiring set:
+        the indexed amounts are multiplied by a random Gaussian matrix into a
+        few dimensions, which preserves distances up to a small relative
+        error. A query finds the nearest oversample * k recipes in the
+        projected space and ranks only those by their exact distance. A
+        query costs O(N * dimensions + oversample * k * d) instead of
+        O(N * d); more dimensions or a larger oversample find more of the
+        true neighbours at a higher cost.
+
+    ...
+
+    Attributes
+    ----------
+    dimensions : int
+        Number of random projections.
+    oversample : int
+        Number of candidates ranked exactly per requested neighbour.
+    directions : np.ndarray
+        Random projection matrix, one column per dimension.
+    projected : np.ndarray
+        Projected amounts of every inspiring recipe.
+    projected_sq_norms : np.ndarray
+        Squared norm of every projected inspiring recipe.
+
+    Methods
+    -------
+    query(queries, k):
+        Returns approximately the k nearest inspiring recipes of every query.
+    """
+
+    def __init__(self, matrix, dimensions=16, oversample=4, seed=0):
+        """ Projects the inspiring matrix. The projection is drawn from a
+            generator of its own, so scores do not depend on the run's random
+            stream.
+            Args:
+                matrix (np.ndarray) : inspiring recipe by ingredient ID
+                                      amount matrix
+                dimensions (int) : number of random projections
+                oversample (int) : candidates ranked exactly per neighbour
+                seed (int) : seed of the random projection
+        """
+        super().__init__(matrix)
+        self.dimensions = dimensions
+        self.oversample = oversample
+        rng = np.random.default_rng(seed)
+        self.directions = rng.standard_normal(
+            (len(self.columns), dimensions)) / np.sqrt(dimensions)
+        self.projected = self.points @ self.directions
+        self.projected_sq_norms = (self.projected ** 2).sum(axis=1)
+
+    def query(self, queries, k):
+        """ Returns the squared distances and indices of approximately the k
+            nearest inspiring recipes of every query, nearest first.
+            Args:
+                queries (np.ndarray) : indexed amounts, one query per row
+                k (int) : number of neighbours, at most len(self)
+        """
+        count = min(len(self), self.oversample * k)
+        candidates = brute_force_search(queries @ self.directions,
+                                        self.projected,
+                                        self.projected_sq_norms, count)[1]
+        sq_dists = np.empty((len(queries), k))
+        indices = np.empty((len(queries), k), dtype=np.intp)
+        block = max(1, BLOCK_SIZE // max(count * len(self.columns), 1))
+        for start in range(0, len(queries), block):
+            rows = candidates[start:start + block]
+            cand_dists = ((self.points[rows]
+                           - queries[start:start + block, None, :]) ** 2
+                          ).sum(axis=2)
+            nearest = np.argsort(cand_dists, axis=1, kind="stable")[:, :k]
+            sq_dists[start:start + block] = np.take_along_axis(
+                cand_dists, nearest, axis=1)
+            indices[start:start + block] = np.take_along_axis(
+                rows, nearest, axis=1)
+        return sq_dists, indices
+
+
+NEIGHBOR_INDEXES = {"brute": BruteForceIndex, "kdtree": KDTreeIndex,
+                    "projection": RandomProjectionIndex}
+
+
+def missing_dependencies(backend):
+    """ Returns the optional modules a neighbour backend needs that are not
+        installed, so a missing one is reported before any work is done.
+        Args:
+            backend (str) : key of NEIGHBOR_INDEXES
+    """
+    from importlib.util import find_spec
+    return [module for module in NEIGHBOR_INDEXES[backend].requires
+            if find_spec(module) is None]
+
+
+def neighbor_distance_scores(index, id_lists, amount_lists, k):
+    """ Returns the dissimilarity score of several recipes from their k
+        nearest inspiring recipes and the corpus statistics of the index.
+        The exact score averages the min-max scaled distances to all N
+        inspiring recipes, i.e. (mean - min) / (max - min). Here the minimum
+        is the nearest distance found; the mean sums the k nearest distances
+        and N - k times the mean distance to the index's sample; the maximum
+        is bounded by the distance to the centroid plus the radius, and by
+        the square root of the summed squares of the other N - k distances,
+        which is exact from the centroid and spread. With k >= N and an exact
+        index the score equals the exact one. With fewer neighbours, the
+        score of a recipe typically differs by a few hundredths and recipes
+        keep most of their ranking; `python benchmark.py neighbors` measures
+        both for every backend.
+        Args:
+            index (NeighborIndex) : index of the inspiring set
+            id_lists (list) : one array of flavor ingredient IDs per recipe
+            amount_lists (list) : the matching ingredient amounts per recipe
+            k (int) : number of nearest inspiring recipes used
+    """
+    count = len(index)
+    k = min(k, count)
+    queries, rests = index.project(id_lists, amount_lists)
+    knn_sq, _ = index.query(queries, k)
+    knn_sq = knn_sq + rests[:, None]
+    knn = np.sqrt(knn_sq)
+    nearest, farthest = knn[:, 0], knn[:, -1]
+    if k == count:
+        means = knn.mean(axis=1)
+    else:
+        points = index.points[index.sample]
+        sample_dists = np.sqrt(np.maximum(
+            (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ points.T
+            + (points ** 2).sum(axis=1)[None, :], 0) + rests[:, None])
+        if len(index.sample) == count:
+            means = sample_dists.mean(axis=1)
+        else:
+            means = (knn.sum(axis=1)
+                     + (count - k) * sample_dists.mean(axis=1)) / count
+        center_sq = ((queries - index.centroid) ** 2).sum(axis=1)
+        others_sq = np.maximum(count * (center_sq + rests + index.spread)
+                               - knn_sq.sum(axis=1), 0)
+        bound = np.sqrt((np.sqrt(center_sq) + index.radius) ** 2 + rests)
+        farthest = np.maximum(farthest, np.minimum(bound,
+                                                   np.sqrt(others_sq)))
+    spans = farthest - nearest
+    return np.divide(means - nearest, spans, out=means.copy(),
+                     where=spans > 0)
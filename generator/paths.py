@@ -0,0 +1,19 @@
+import os
+
+# every data file is located relative to this folder, so the generator can be
+# run and imported from any working directory
+GENERATOR_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(GENERATOR_DIR)
+
+WORD_EMBEDDING_PATH = os.path.join(GENERATOR_DIR, "flavors", 
+                                   "ingred_word_emb.npy")
+CATEGORIES_PATH = os.path.join(GENERATOR_DIR, "flavors", 
+                               "ingred_categories.npy")
+BUNDLE_DIR = os.path.join(GENERATOR_DIR, "flavors", "bundle")
+EMOTION_MATRIX_PATH = os.path.join(REPO_DIR, "Ingredient_Matrix.xlsx")
+INSPIRING_SET_DIR = os.path.join(REPO_DIR, "inspiring_set")
+CORPUS_PATH = os.path.join(GENERATOR_DIR, "flavors", "inspiring_corpus.npz")
+FITTEST_RECIPES_DIR = os.path.join(GENERATOR_DIR, "fittest_recipes")
+FITNESS_CACHE_PATH = os.path.join(GENERATOR_DIR, "fitness_cache.sqlite")
+BENCHMARK_BASELINE_PATH = os.path.join(REPO_DIR, "Metrics", 
+                                       "benchmark_baseline.json")
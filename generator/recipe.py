@@ -5,6 +5,8 @@ from base_ingredients import BaseIngredients
 from flavor_ingredients import FlavorIngredients
 from fitness import Fitness
 from name_generator import Name
+from genome import Genome
+from ingest import parse_ingredient_line
 
 
 class Recipe:
@@ -26,9 +28,13 @@ class Recipe:
         Stores and computes the recipe's fitness score.
     name : String
         The recipe's name.
+    rng : np.random.Generator
+        Random number generator shared by the recipe's mutation operators.
 
     Methods
     -------
+    from_genome(genome, emot):
+        Creates a recipe directly from a Genome.
     make_ingredient_list():
         Converts string representation of recipe into list of Ingredient 
         objects.
@@ -45,55 +51,72 @@ class Recipe:
         Returns recipe's flavor ingredient objects.
     get_instructions():
         Returns recipe's baking instructions.
+    get_genome():
+        Returns recipe's compact Genome representation.
     get_name():
         Returns recipe's name.
     get_fitness():
         Returns recipe's fitness score.
     """
 
-    def __init__(self, recipe_strs, emot, instructions=""):
+    def __init__(self, recipe_strs, emot, instructions="", rng=None):
         """ Creates recipe based on user's emotion, the instructions for baking
             the recipe, and populates the recipe's ingredient storage objects.
             Args:
-                recipe_strs (list) : list of ingredient strings to be converted
-                                     into ingredient objects
+                recipe_strs (list) : list of ingredient strings (or already
+                                     built Ingredient objects) to be 
+                                     converted into ingredient objects
                 emot (string) : the user's current emotion
                 instructions (RecipeInstructions) : the instructions for baking
                                                     this recipe
+                rng (np.random.Generator) : random number generator passed
+                                            to every mutation operator, a 
+                                            fresh unseeded one if None
         """
         self.emotion = emot
+        self.rng = rng if rng is not None else np.random.default_rng()
 
         ing_list = self.make_ingredient_list(recipe_strs)
-        self.base_ingredients = BaseIngredients(ing_list)
-        self.flavor_ingredients = FlavorIngredients(ing_list)
+        self.base_ingredients = BaseIngredients(ing_list, self.rng)
+        self.flavor_ingredients = FlavorIngredients(ing_list, self.rng)
 
         self.fitness = Fitness(self.flavor_ingredients, emot)
-        name_obj = Name(emot)
+        name_obj = Name(emot, self.rng)
         self.name = name_obj.get_name()
 
         if instructions == "":
-            self.instructions = RecipeInstructions(emot)
+            self.instructions = RecipeInstructions(emot, rng=self.rng)
         else:
             self.instructions = instructions
 
+    @classmethod
+    def from_genome(cls, genome, emot, rng=None):
+        """ Creates a recipe from a Genome without going through ingredient
+            strings, so amounts keep their full precision.
+            Args:
+                genome (Genome) : the compact recipe representation
+                emot (string) : the user's current emotion
+                rng (np.random.Generator) : random number generator of the
+                                            new recipe
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        return cls(genome.to_ingredient_list(), emot, 
+                   RecipeInstructions(emot, *genome.instructions, rng=rng), 
+                   rng)
     
     def make_ingredient_list(self, recipe_strs):
         """ Reads the string representation of a recipe and converts each
             ingredient to an Ingredient object, storing it in ing_list.
+            Ingredient objects are kept as they are.
             Args:
                 recipe_strs (list) : the strings representing the recipe
         """
         ing_list = []
         for line in recipe_strs: 
-            if not line.startswith("-") and line != "":
-                split_line = line.split(" ")
-                amt = float(split_line[0])
-                unit = split_line[1]
-                ingr_name = " ".join(split_line[2:]).strip()
-                
-                if "butter" in ingr_name and unit == "tbsp":
-                    amt *= 14.2
-                    
+            if isinstance(line, Ingredient):
+                ing_list.append(line)
+            elif not line.startswith("-") and line != "":
+                ingr_name, amt, unit = parse_ingredient_line(line)
                 ing_list.append(Ingredient(ingr_name, amt, unit))
         return ing_list
     
@@ -110,13 +133,13 @@ class Recipe:
             ingredients, flavor ingredients, or recipe instruction with set 
             probability (20%, 60%, and 20% respectively).
         """
-        mutate = np.random.choice([True, False], p=[0.8,0.2])
+        mutate = self.rng.random() < 0.8
         if mutate: 
             self.flavor_ingredients.mutate()       
-        mutate = np.random.choice([True, False], p=[0.3,0.7])
+        mutate = self.rng.random() < 0.3
         if mutate: 
             self.base_ingredients.mutate()
-        mutate = np.random.choice([True, False], p=[0.3,0.7])
+        mutate = self.rng.random() < 0.3
         if mutate: 
             self.instructions.mutate()
     
@@ -140,17 +163,23 @@ class Recipe:
         """
         return self.instructions
 
+    def get_genome(self):
+        """ Returns the compact Genome representation of the recipe.
+        """
+        return Genome.from_recipe(self)
+
     def get_name(self):
         """ Makes Name object to compute name and returns string 
             representation.
         """
-        name_obj = Name(self.emotion)
+        name_obj = Name(self.emotion, self.rng)
         return name_obj.get_name()
  
     def get_fitness(self, do_print=False):
-        """ Calls for fitness computation and returns it.
+        """ Returns the fitness score, only recomputing it when the flavor
+            ingredients changed since it was last computed.
         """
-        self.fitness.set_fitness_val(do_print=do_print)
+        self.fitness.update_fitness_val(do_print=do_print)
         return self.fitness.get_fitness_val()
 
     def __str__(self):
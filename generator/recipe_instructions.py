@@ -1,5 +1,4 @@
 import numpy as np
-import random
 
 EMOTIONAL_SONGS = {
     "Happy" : ["Walking on Sunshine", "Dancing Queen", 
@@ -48,6 +47,10 @@ class RecipeInstructions:
         size of each cookie, in grams.
     emotion : strng
         user's current emotion.
+    song : string
+        song to listen to while baking, associated with the emotion.
+    rng : np.random.Generator
+        random number generator used by the mutations.
 
     Methods
     -------
@@ -61,13 +64,16 @@ class RecipeInstructions:
         Randomly adjust size between 40-60 grams.
     select_song():
         Chooses random song associated with user's emotion.
+    get_params():
+        Returns the instruction parameters as a tuple.
     mutate():
         Chooses and executes one of the mutations above with equal probability.
     fill_in_quantities(recipe):
         Returns formatted, step-by-step instructions for the recipe.
     """
 
-    def __init__(self, emotion, temp=350, bake_time=10, rest_time=2, size=50):
+    def __init__(self, emotion, temp=350, bake_time=10, rest_time=2, size=50,
+                 song=None, rng=None):
         """ Initializes cooking instruction parameters to default settings.
             Args:
                 temp (int) : temperature to preheat oven in F
@@ -75,45 +81,57 @@ class RecipeInstructions:
                 rest_time (int) : how long to leave cookies out after baking
                 size (int) : size of cookie dough on sheet
                 emotion (string) : the user's current emotion
+                song (string) : song to bake to, chosen at random if None
+                rng (np.random.Generator) : random number generator, a fresh
+                                            unseeded one if None
         """
         self.temp = temp
         self.bake_time = bake_time
         self.rest_time = rest_time
         self.size = size
         self.emotion = emotion
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.song = song if song is not None else self.select_song()
 
     def adjust_temp(self):
         """ Randomly sets temperature to a multiple of 25 degrees F between 325
             and 425 inclusive.
         """
-        self.temp = np.random.randint(13, 18) * 25
+        self.temp = int(self.rng.integers(13, 18)) * 25
 
     def adjust_bake_time(self):
         """ Randomly sets bake time to a time between 8 and 12 minutes.
         """
-        self.bake_time = np.random.randint(8,13) 
+        self.bake_time = int(self.rng.integers(8,13))
 
     def adjust_rest_time(self):
         """ Randomly sets rest time to a time between 0 and 12 hours.
         """
-        self.rest_time = np.random.randint(0,13) 
+        self.rest_time = int(self.rng.integers(0,13))
 
     def adjust_size(self):
         """ Randomly sets size to a multiple of 5 between 40 and 60 grams per 
             cookie.
         """
-        self.size = np.random.randint(8, 13) * 5
+        self.size = int(self.rng.integers(8, 13)) * 5
     
     def select_song(self):
         """ Selects a song associated with the user's emotion.
         """
         song_opts = EMOTIONAL_SONGS[self.emotion]  
-        return random.choice(song_opts)
+        return song_opts[self.rng.integers(len(song_opts))]
+
+    def get_params(self):
+        """ Returns the (temp, bake_time, rest_time, size, song) parameters, 
+            from which an equal RecipeInstructions can be rebuilt.
+        """
+        return (self.temp, self.bake_time, self.rest_time, self.size, 
+                self.song)
 
     def mutate(self):
         """ Calls an above mutation.
         """
-        mutation = np.random.randint(0,4)
+        mutation = self.rng.integers(0,4)
         if mutation == 0: 
             self.adjust_temp() 
         elif mutation == 1: 
@@ -131,7 +149,7 @@ class RecipeInstructions:
                 recipe (Recipe) : The recipe whose instructions are written for
         """
         instructions = (f"Put on the {self.emotion.lower()} song, " +
-        f"{self.select_song()}, so that you can get in the mood while baking" +
+        f"{self.song}, so that you can get in the mood while baking" +
         f"!\nStep 1: Preheat the oven to {str(self.temp)} degrees F.\nStep 2" + 
         ": Mix together dry ingredients, combining the following in a large " + 
         "bowl: flour")
@@ -0,0 +1,342 @@
+import numpy as np
+import hashlib
+import os
+import warnings
+from vocabulary import Vocabulary
+from bundle import load_bundle
+from ingest import Corpus, parse_recipe, load_corpus, stale_files, ingest
+from neighbors import NEIGHBOR_INDEXES
+from paths import (WORD_EMBEDDING_PATH, EMOTION_MATRIX_PATH, INSPIRING_SET_DIR,
+                   CATEGORIES_PATH, BUNDLE_DIR, CORPUS_PATH)
+
+EMOTIONS = ["happy", "sad", "angry", "excited", "tired", "stressed"]
+
+
+class Resources():
+    """ Process-wide registry of the read-only data used to score recipes.
+        Every file is loaded the first time it is needed and then shared by
+        all Fitness objects until the registry is invalidated. When a data
+        bundle built by bundle.py exists, the data is memory-mapped from it;
+        otherwise it is read from the source files, which needs pandas.
+        The inspiring set is read from the corpus file written by ingest.py
+        when it exists, and parsed from the recipe files otherwise.
+
+    ...
+
+    Attributes
+    ----------
+    embedding_path : string
+        Path of the pickled ingredient word embedding dictionary.
+    emotion_path : string
+        Path of the ingredient to emotion alignment spreadsheet.
+    inspiring_dir : string
+        Directory holding the inspiring recipe files.
+    corpus_path : string
+        Path of the inspiring set corpus file, None to always parse the
+        recipe files.
+    categories_path : string
+        Path of the pickled ingredient to food category dictionary.
+    bundle_dir : string
+        Directory of the precompiled data bundle, None to always read the
+        source files.
+    neighbor_backend : string
+        Key of NEIGHBOR_INDEXES used to score dissimilarity from the nearest
+        inspiring recipes, None to compare with every inspiring recipe.
+    neighbor_k : int
+        Number of nearest inspiring recipes dissimilarity is scored from.
+
+    Methods
+    -------
+    get_bundle():
+        Returns the loaded data bundle, or None when reading source files.
+    get_word_embeddings():
+        Returns the ingredient name to embedding vector dictionary.
+    get_vocabulary():
+        Returns the Vocabulary assigning integer IDs to ingredients.
+    get_similarity_matrix():
+        Returns the dense ingredient by ingredient similarity matrix.
+    get_pair_indices(n):
+        Returns the cached upper-triangle indices of an n by n matrix.
+    get_emotion_matrix():
+        Returns the emotion alignment DataFrame indexed by ingredient.
+    get_emotion_table():
+        Returns the emotion alignment array indexed by ingredient ID.
+    get_inspiring_recipes():
+        Returns the lines of every inspiring recipe file.
+    get_corpus():
+        Returns the parsed inspiring set as a Corpus.
+    has_corpus_file():
+        Returns whether the inspiring set is read from a corpus file.
+    get_inspiring_matrix():
+        Returns the inspiring set flavor amounts indexed by ingredient ID.
+    get_inspiring_sq_norms():
+        Returns the squared Euclidean norm of every inspiring recipe.
+    get_ingredient_categories():
+        Returns the ingredient name to food category dictionary.
+    configure_neighbors(backend, k):
+        Selects how dissimilarity is scored against the inspiring set.
+    get_neighbor_index():
+        Returns the nearest-neighbour index of the inspiring set.
+    invalidate():
+        Drops every loaded resource so it is read again on next use.
+    reload():
+        Invalidates and then eagerly loads every resource.
+    """
+
+    def __init__(self, embedding_path=WORD_EMBEDDING_PATH,
+                 emotion_path=EMOTION_MATRIX_PATH,
+                 inspiring_dir=INSPIRING_SET_DIR, 
+                 categories_path=CATEGORIES_PATH, bundle_dir=BUNDLE_DIR,
+                 corpus_path=CORPUS_PATH):
+        """ Stores the resource locations without reading anything yet.
+            Args:
+                embedding_path (str) : path of the word embedding file
+                emotion_path (str) : path of the emotion matrix spreadsheet
+                inspiring_dir (str) : directory of inspiring recipe files
+                categories_path (str) : path of the ingredient categories
+                bundle_dir (str) : directory of the data bundle, None to
+                                   read the source files
+                corpus_path (str) : path of the inspiring set corpus file,
+                                    None to parse the recipe files
+        """
+        self.embedding_path = embedding_path
+        self.emotion_path = emotion_path
+        self.inspiring_dir = inspiring_dir
+        self.categories_path = categories_path
+        self.bundle_dir = bundle_dir
+        self.corpus_path = corpus_path
+        self.neighbor_backend = None
+        self.neighbor_k = None
+        self.invalidate()
+
+    def get_bundle(self):
+        """ Returns the memory-mapped data bundle, loading it on first use, or
+            None if there is no bundle of the current version.
+        """
+        if self._bundle is None and self.bundle_dir is not None:
+            self._bundle = load_bundle(self.bundle_dir)
+        return self._bundle
+
+    def get_word_embeddings(self):
+        """ Returns the dictionary mapping ingredient names to their word
+            embedding vectors, loading it on first use.
+        """
+        if self._word_embeddings is None:
+            bundle = self.get_bundle()
+            if bundle is not None:
+                self._word_embeddings = dict(zip(bundle.names, 
+                                                 bundle.embeddings))
+            else:
+                self._word_embeddings = np.load(self.embedding_path,
+                                                allow_pickle=True).item()
+        return self._word_embeddings
+
+    def get_vocabulary(self):
+        """ Returns the Vocabulary of ingredient IDs. The embedded ingredients
+            come first, in sorted order, so that their IDs index the rows and
+            columns of the similarity matrix. They are followed by the other
+            ingredients of the emotion matrix and of the inspiring set. Names
+            first seen later, e.g. when reading other recipes, are appended.
+        """
+        if self._vocabulary is None and self.get_bundle() is not None:
+            self._vocabulary = Vocabulary(self.get_bundle().names)
+        elif self._vocabulary is None:
+            vocabulary = Vocabulary(sorted(self.get_word_embeddings()))
+            for name in self.get_emotion_matrix().index:
+                vocabulary.intern(name)
+            for name in self.get_corpus().names:
+                vocabulary.intern(name)
+            self._vocabulary = vocabulary
+        return self._vocabulary
+
+    def get_similarity_matrix(self):
+        """ Returns the matrix of dot products between every pair of embedded
+            ingredients, indexed by ingredient ID and computed on first use.
+        """
+        if self._similarity_matrix is None:
+            if self.get_bundle() is not None:
+                vectors = self.get_bundle().embeddings
+            else:
+                embeddings = self.get_word_embeddings()
+                names = self.get_vocabulary().names[:len(embeddings)]
+                vectors = np.stack([embeddings[name] for name in names])
+            self._similarity_matrix = (vectors @ vectors.T).astype(np.float64)
+        return self._similarity_matrix
+
+    def get_pair_indices(self, n):
+        """ Returns the row and column indices of the strict upper triangle
+            of an n by n matrix, i.e. every unordered pair of n ingredients.
+            Args:
+                n (int) : number of ingredients
+        """
+        if n not in self._pair_indices:
+            self._pair_indices[n] = np.triu_indices(n, 1)
+        return self._pair_indices[n]
+
+    def get_emotion_matrix(self):
+        """ Returns the emotion alignment DataFrame indexed by ingredient name,
+            loading it from the source spreadsheet on first use.
+        """
+        if self._emotion_matrix is None:
+            import pandas as pd
+            emotion_df = pd.read_excel(self.emotion_path)
+            emotion_df.set_index('Ingredient', inplace=True)
+            self._emotion_matrix = emotion_df
+        return self._emotion_matrix
+
+    def get_emotion_table(self):
+        """ Returns an array with one row per ingredient ID and one column per
+            entry of EMOTIONS, holding NaN for ingredients without alignment
+            data.
+        """
+        if self._emotion_table is None and self.get_bundle() is not None:
+            self._emotion_table = self.get_bundle().emotion_table
+        elif self._emotion_table is None:
+            vocabulary = self.get_vocabulary()
+            emotion_df = self.get_emotion_matrix()
+            table = np.full((len(vocabulary), len(EMOTIONS)), np.nan)
+            table[vocabulary.get_ids(list(emotion_df.index))] = \
+                emotion_df[EMOTIONS].to_numpy(dtype=np.float64)
+            self._emotion_table = table
+        return self._emotion_table
+
+    def get_inspiring_recipes(self):
+        """ Returns one list of lines per inspiring recipe file, in file name
+            order, reading the inspiring set on first use.
+        """
+        if self._inspiring_recipes is None and self.get_bundle() is not None:
+            self._inspiring_recipes = self.get_bundle().inspiring_recipes
+        elif self._inspiring_recipes is None:
+            recipes = []
+            for file in sorted(os.listdir(self.inspiring_dir)):
+                with open(os.path.join(self.inspiring_dir, file), "r") as f:
+                    recipes.append(f.readlines())
+            self._inspiring_recipes = recipes
+        return self._inspiring_recipes
+
+    def get_corpus(self):
+        """ Returns the inspiring set as a Corpus, loading the corpus file on
+            first use. The corpus is checked against the folder it was
+            ingested from, the inspiring set folder for corpus files that do
+            not record it; if recipe files changed since, a warning is given
+            and only the changed files are parsed, without saving the file.
+            Without a corpus file, the inspiring recipes are parsed instead
+            and identified by their index and content digest.
+        """
+        if self._corpus is None and self.corpus_path is not None:
+            self._corpus = load_corpus(self.corpus_path)
+            source_dir = self.inspiring_dir
+            if self._corpus is not None and \
+                    self._corpus.source_dir is not None:
+                source_dir = self._corpus.source_dir
+            if self._corpus is not None and os.path.isdir(source_dir):
+                stale = stale_files(self._corpus, source_dir)
+                if stale:
+                    warnings.warn(
+                        f"Corpus file {self.corpus_path} is out of date with "
+                        f"{source_dir}, {len(stale)} recipe files changed "
+                        f"(first {stale[0]}); parsing the changed files. "
+                        "Save them with python ingest.py.", stacklevel=2)
+                    self._corpus = ingest(source_dir, self.corpus_path,
+                                          write=False)[0]
+        if self._corpus is None:
+            recipes = self.get_inspiring_recipes()
+            self._corpus = Corpus.from_rows(
+                [str(i) for i in range(len(recipes))],
+                [(None, None, hashlib.sha256("".join(lines).encode()
+                                             ).hexdigest())
+                 for lines in recipes],
+                [parse_recipe(lines) for lines in recipes])
+        return self._corpus
+
+    def has_corpus_file(self):
+        """ Returns whether the inspiring set is read from a corpus file.
+        """
+        return self.corpus_path is not None and \
+            os.path.exists(self.corpus_path)
+
+    def get_inspiring_matrix(self):
+        """ Returns a dense array with one row per inspiring recipe and one
+            column per ingredient ID, holding the flavor ingredient amounts.
+        """
+        if self._inspiring_matrix is None and not self.has_corpus_file() \
+                and self.get_bundle() is not None:
+            self._inspiring_matrix = self.get_bundle().inspiring_matrix
+        elif self._inspiring_matrix is None:
+            self._inspiring_matrix = self.get_corpus().flavor_matrix(
+                self.get_vocabulary())
+        return self._inspiring_matrix
+
+    def get_inspiring_sq_norms(self):
+        """ Returns the squared Euclidean norm of every row of the inspiring
+            matrix, computed on first use.
+        """
+        if self._inspiring_sq_norms is None:
+            self._inspiring_sq_norms = (self.get_inspiring_matrix() ** 2
+                                        ).sum(axis=1)
+        return self._inspiring_sq_norms
+
+    def get_ingredient_categories(self):
+        """ Returns the dictionary mapping ingredient names to their food
+            category, loading it on first use.
+        """
+        if self._categories is None and self.get_bundle() is not None:
+            self._categories = self.get_bundle().categories
+        elif self._categories is None:
+            self._categories = np.load(self.categories_path,
+                                       allow_pickle=True).item()
+        return self._categories
+
+    def configure_neighbors(self, backend=None, k=16):
+        """ Selects the nearest-neighbour backend dissimilarity is scored
+            with, see neighbors.neighbor_distance_scores. The configuration
+            survives invalidate and is inherited by forked worker processes.
+            Args:
+                backend (str) : key of NEIGHBOR_INDEXES, None to compare
+                                every recipe with every inspiring recipe
+                k (int) : number of nearest inspiring recipes used
+        """
+        if backend is not None and backend not in NEIGHBOR_INDEXES:
+            raise ValueError(f"Unknown neighbour backend: {backend}")
+        self.neighbor_backend = backend
+        self.neighbor_k = k if backend is not None else None
+        self._neighbor_index = None
+
+    def get_neighbor_index(self):
+        """ Returns the index of the configured backend over the inspiring
+            matrix, building it on first use, or None if no backend is set.
+        """
+        if self._neighbor_index is None and self.neighbor_backend is not None:
+            self._neighbor_index = NEIGHBOR_INDEXES[self.neighbor_backend](
+                self.get_inspiring_matrix())
+        return self._neighbor_index
+
+    def invalidate(self):
+        """ Forgets every loaded resource so that the next access reads the
+            underlying files again.
+        """
+        self._bundle = None
+        self._word_embeddings = None
+        self._vocabulary = None
+        self._similarity_matrix = None
+        self._pair_indices = {}
+        self._emotion_matrix = None
+        self._emotion_table = None
+        self._inspiring_recipes = None
+        self._corpus = None
+        self._inspiring_matrix = None
+        self._inspiring_sq_norms = None
+        self._neighbor_index = None
+        self._categories = None
+
+    def reload(self):
+        """ Invalidates the registry and immediately loads every resource.
+        """
+        self.invalidate()
+        self.get_similarity_matrix()
+        self.get_emotion_table()
+        self.get_inspiring_matrix()
+        self.get_neighbor_index()
+
+
+RESOURCES = Resources()
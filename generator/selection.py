@@ -0,0 +1,123 @@
+import numpy as np
+
+
+def _pairs_from_cumulative(weights, first_draws, second_draws):
+    """ Maps uniform draws in [0, 1) onto parent index pairs through the
+        cumulative weight table. The second parent of every pair is drawn from
+        the distribution with the first parent removed, so a pair never holds
+        the same recipe twice.
+        Args:
+            weights (np.ndarray) : non-negative selection weight of each recipe
+            first_draws (np.ndarray) : uniform draws choosing first parents
+            second_draws (np.ndarray) : uniform draws choosing second parents
+    """
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+    last = len(weights) - 1
+    first = np.minimum(np.searchsorted(cumulative, first_draws * total,
+                                       side="right"), last)
+    # skip over the first parent's slice of the cumulative table
+    targets = second_draws * (total - weights[first])
+    targets = np.where(targets >= cumulative[first] - weights[first],
+                       targets + weights[first], targets)
+    second = np.minimum(np.searchsorted(cumulative, targets, side="right"),
+                        last)
+    return np.stack([first, second], axis=1)
+
+
+def roulette_selection(fitnesses, num_pairs, rng):
+    """ Fitness-proportional selection: builds the cumulative fitness table
+        once and draws every parent pair of the generation with one
+        vectorized binary search.
+        Args:
+            fitnesses (np.ndarray) : fitness of every recipe
+            num_pairs (int) : number of parent pairs to draw
+            rng (np.random.Generator) : random number generator
+    """
+    draws = rng.random((2, num_pairs))
+    return _pairs_from_cumulative(fitnesses, draws[0], draws[1])
+
+
+def stochastic_universal_selection(fitnesses, num_pairs, rng):
+    """ Stochastic universal sampling: first parents are read off the
+        cumulative fitness table at evenly spaced pointers with a single random
+        offset, which keeps the number of times each recipe is picked close to
+        its expected value. The second parents are chosen by roulette.
+        Args:
+            fitnesses (np.ndarray) : fitness of every recipe
+            num_pairs (int) : number of parent pairs to draw
+            rng (np.random.Generator) : random number generator
+    """
+    pointers = (rng.random() + np.arange(num_pairs)) / num_pairs
+    pointers = pointers[rng.permutation(num_pairs)]
+    return _pairs_from_cumulative(fitnesses, pointers,
+                                  rng.random(num_pairs))
+
+
+def tournament_selection(fitnesses, num_pairs, rng, tournament_size=3):
+    """ Tournament selection: every parent is the fittest of tournament_size
+        recipes drawn uniformly at random. Both parents of a pair are distinct,
+        unless the population holds a single recipe, which is paired with
+        itself.
+        Args:
+            fitnesses (np.ndarray) : fitness of every recipe
+            num_pairs (int) : number of parent pairs to draw
+            rng (np.random.Generator) : random number generator
+            tournament_size (int) : number of recipes in every tournament
+    """
+    fitnesses = np.asarray(fitnesses)
+    contestants = rng.integers(0, len(fitnesses),
+                               size=(2, num_pairs, tournament_size))
+    winners = np.take_along_axis(
+        contestants, np.argmax(fitnesses[contestants], axis=2)[..., None],
+        axis=2)[..., 0]
+    # rerun the second tournament among the others when both winners match
+    clashes = np.flatnonzero(winners[0] == winners[1])
+    if len(clashes) > 0 and len(fitnesses) > 1:
+        others = rng.integers(0, len(fitnesses) - 1,
+                              size=(len(clashes), tournament_size))
+        others += others >= winners[0, clashes, None]
+        winners[1, clashes] = others[np.arange(len(clashes)),
+                                     np.argmax(fitnesses[others], axis=1)]
+    return winners.T
+
+
+def rank_selection(fitnesses, num_pairs, rng):
+    """ Rank-based selection: recipes are weighted by their rank in the
+        population (1 for the least fit) instead of their raw fitness, which
+        keeps selection pressure steady when fitness values are close.
+        Args:
+            fitnesses (np.ndarray) : fitness of every recipe
+            num_pairs (int) : number of parent pairs to draw
+            rng (np.random.Generator) : random number generator
+    """
+    ranks = np.empty(len(fitnesses))
+    ranks[np.argsort(fitnesses, kind="stable")] = np.arange(
+        1, len(fitnesses) + 1)
+    draws = rng.random((2, num_pairs))
+    return _pairs_from_cumulative(ranks, draws[0], draws[1])
+
+
+SELECTION_STRATEGIES = {
+    "roulette": roulette_selection,
+    "sus": stochastic_universal_selection,
+    "tournament": tournament_selection,
+    "rank": rank_selection,
+}
+
+
+def select_parents(fitnesses, num_pairs, strategy="roulette", rng=None):
+    """ Returns a (num_pairs, 2) array of parent indices drawn with the named
+        selection strategy.
+        Args:
+            fitnesses (list) : fitness of every recipe in the population
+            num_pairs (int) : number of parent pairs to draw
+            strategy (str) : key of SELECTION_STRATEGIES
+            rng (np.random.Generator) : random number generator, a fresh
+                                        unseeded one if None
+    """
+    if strategy not in SELECTION_STRATEGIES:
+        raise ValueError(f"Unknown selection strategy: {strategy}")
+    rng = rng if rng is not None else np.random.default_rng()
+    return SELECTION_STRATEGIES[strategy](
+        np.asarray(fitnesses, dtype=float), num_pairs, rng)
@@ -0,0 +1,88 @@
+import time
+from telemetry import population_diversity
+
+
+class StoppingCriteria():
+    """ Decides when a run of the genetic algorithm can stop before its fixed
+        generation count: when the best fitness of every population has not
+        improved for a number of generations, when the diversity of every
+        population fell below a threshold, or when the next generation would
+        overrun a wall-clock deadline. Criteria left as None are not checked.
+
+    ...
+
+    Attributes
+    ----------
+    patience : int
+        Generations without improvement of the best fitness before stopping.
+    min_improvement : float
+        Smallest increase of the best fitness counted as an improvement.
+    min_diversity : float
+        Population diversity (see telemetry.population_diversity) below
+        which the run stops.
+    deadline : float
+        Wall-clock seconds the run may take.
+
+    Methods
+    -------
+    reset():
+        Starts tracking a new run.
+    check(generation, populations):
+        Returns the reason to stop after a generation, or None.
+    """
+
+    def __init__(self, patience=None, min_improvement=1e-9,
+                 min_diversity=None, deadline=None):
+        """ Stores the criteria.
+            Args:
+                patience (int) : generations without improvement allowed
+                min_improvement (float) : smallest improvement that counts
+                min_diversity (float) : diversity threshold
+                deadline (float) : wall-clock budget in seconds
+        """
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.min_diversity = min_diversity
+        self.deadline = deadline
+        self.reset()
+
+    def reset(self):
+        """ Forgets the previous run and starts the deadline clock.
+        """
+        self.start = time.perf_counter()
+        self.last_check = self.start
+        self.best = {}
+        self.stale = {}
+
+    def check(self, generation, populations):
+        """ Updates the tracked state with a completed generation and returns
+            "plateau", "diversity" or "deadline" if the run should stop, or
+            None to continue.
+            Args:
+                generation (int) : number of the completed generation
+                populations (dict) : recipes of every population by emotion
+        """
+        now = time.perf_counter()
+        last_duration, self.last_check = now - self.last_check, now
+
+        for emotion, recipes in populations.items():
+            best = max(recipe.get_fitness() for recipe in recipes)
+            if emotion not in self.best or \
+                    best > self.best[emotion] + self.min_improvement:
+                self.best[emotion] = best
+                self.stale[emotion] = 0
+            else:
+                self.stale[emotion] += 1
+
+        if self.patience is not None and \
+                min(self.stale.values()) >= self.patience:
+            return "plateau"
+        if self.min_diversity is not None and \
+                all(population_diversity(recipes) < self.min_diversity
+                    for recipes in populations.values()):
+            return "diversity"
+        # stop if another generation as long as the last would overrun
+        if self.deadline is not None and \
+                now - self.start + last_duration > self.deadline:
+            return "deadline"
+        return None
@@ -0,0 +1,170 @@
+import numpy as np
+import json
+import time
+from contextlib import contextmanager
+
+PHASES = ["selection", "crossover", "mutation", "flavor", "dissimilarity",
+          "emotion", "length", "survival"]
+# rows of the pairwise distance matrix population_diversity computes at once
+DIVERSITY_BLOCK = 256
+
+
+class PhaseTimer():
+    """ Accumulates the time spent in the named phases of a generation.
+
+    ...
+
+    Attributes
+    ----------
+    totals : dict
+        Seconds spent in every phase, keyed by phase name.
+
+    Methods
+    -------
+    phase(name):
+        Context manager adding the time spent in its block to a phase.
+    add(name, seconds):
+        Adds seconds to a phase.
+    merge(totals):
+        Adds the totals of another timer, e.g. one of a worker process.
+    """
+
+    def __init__(self):
+        """ Starts every phase of PHASES at zero seconds.
+        """
+        self.totals = dict.fromkeys(PHASES, 0.0)
+
+    @contextmanager
+    def phase(self, name):
+        """ Adds the time spent in the with block to the named phase.
+            Args:
+                name (str) : name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        """ Adds seconds to the named phase.
+            Args:
+                name (str) : name of the phase
+                seconds (float) : time to add
+        """
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def merge(self, totals):
+        """ Adds the phase totals of another timer to this one.
+            Args:
+                totals (dict) : seconds per phase name
+        """
+        for name, seconds in totals.items():
+            self.add(name, seconds)
+
+
+def fitness_stats(recipes):
+    """ Returns the minimum, mean and maximum fitness of a population.
+        Args:
+            recipes (list) : the scored recipes of the population
+    """
+    fitnesses = np.array([recipe.get_fitness() for recipe in recipes])
+    return {"min": float(fitnesses.min()), "mean": float(fitnesses.mean()),
+            "max": float(fitnesses.max())}
+
+
+def population_diversity(recipes):
+    """ Returns the mean Euclidean distance between the ingredient amount
+        vectors of every pair of recipes in a population, 0 for identical
+        recipes. The distances are summed DIVERSITY_BLOCK rows at a time, so
+        memory grows linearly with the population size.
+        Args:
+            recipes (list) : the recipes of the population
+    """
+    count = len(recipes)
+    if count < 2:
+        return 0.0
+    genomes = [recipe.get_genome() for recipe in recipes]
+    width = max(len(genome.amounts) for genome in genomes)
+    amounts = np.stack([genome.resize(width).amounts for genome in genomes])
+    norms = (amounts ** 2).sum(axis=1)
+    total = 0.0
+    for start in range(0, count, DIVERSITY_BLOCK):
+        stop = min(start + DIVERSITY_BLOCK, count)
+        # distances from the block's rows to every later recipe
+        sq_dists = (norms[start:stop, None] 
+                    - 2 * amounts[start:stop] @ amounts[start:].T
+                    + norms[None, start:])
+        later = (np.arange(count - start)[None, :] 
+                 > np.arange(stop - start)[:, None])
+        total += np.sqrt(np.maximum(sq_dists[later], 0)).sum()
+    return float(total / (count * (count - 1) / 2))
+
+
+def population_record(recipes):
+    """ Returns the fitness statistics and diversity of a population.
+        Args:
+            recipes (list) : the scored recipes of the population
+    """
+    return {"size": len(recipes), "fitness": fitness_stats(recipes),
+            "diversity": population_diversity(recipes)}
+
+
+def generation_record(generation, seconds, timer, populations, cache_stats):
+    """ Returns the telemetry record of one generation as a JSON-serializable
+        dictionary.
+        Args:
+            generation (int) : number of the generation, starting at 1
+            seconds (float) : wall time of the generation
+            timer (PhaseTimer) : times of the phases of the generation
+            populations (dict) : recipes of every population by emotion
+            cache_stats (tuple) : fitness cache (hits, misses)
+    """
+    return {"generation": generation, "seconds": seconds,
+            "phases": dict(timer.totals),
+            "cache": {"hits": cache_stats[0], "misses": cache_stats[1]},
+            "populations": {emotion: population_record(recipes)
+                            for emotion, recipes in populations.items()}}
+
+
+class JsonlTrace():
+    """ Generation observer writing every record as one JSON line.
+
+    ...
+
+    Attributes
+    ----------
+    path : string
+        Path of the trace file.
+    file : file
+        The open trace file.
+
+    Methods
+    -------
+    close():
+        Closes the trace file.
+    """
+
+    def __init__(self, path, append=False):
+        """ Opens the trace file.
+            Args:
+                path (str) : path of the trace file
+                append (bool) : add to an existing trace instead of
+                                replacing it
+        """
+        self.path = path
+        self.file = open(path, "a" if append else "w")
+
+    def __call__(self, record):
+        """ Writes a generation record and flushes it, so the trace can be
+            followed while the run is going.
+            Args:
+                record (dict) : the generation record
+        """
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        """ Closes the trace file.
+        """
+        self.file.close()
@@ -0,0 +1,42 @@
+import os
+import shutil
+import warnings
+import pytest
+from ingest import ingest
+from resources import Resources
+from paths import INSPIRING_SET_DIR
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    """ Copies three inspiring recipes into a folder other than the
+        inspiring set and returns its path.
+    """
+    directory = tmp_path / "recipes"
+    directory.mkdir()
+    for file in sorted(os.listdir(INSPIRING_SET_DIR))[:3]:
+        shutil.copy(os.path.join(INSPIRING_SET_DIR, file), directory)
+    return str(directory)
+
+
+def test_corpus_from_other_folder_is_used(source_dir, tmp_path):
+    corpus_path = str(tmp_path / "corpus.npz")
+    ingest(source_dir, corpus_path)
+    resources = Resources(corpus_path=corpus_path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        corpus = resources.get_corpus()
+    assert corpus.source_dir == os.path.abspath(source_dir)
+    assert corpus.files == sorted(os.listdir(source_dir))
+
+
+def test_stale_corpus_is_refreshed_from_its_folder(source_dir, tmp_path):
+    corpus_path = str(tmp_path / "corpus.npz")
+    ingest(source_dir, corpus_path)
+    removed = sorted(os.listdir(source_dir))[0]
+    os.remove(os.path.join(source_dir, removed))
+    resources = Resources(corpus_path=corpus_path)
+    with pytest.warns(UserWarning, match="out of date"):
+        corpus = resources.get_corpus()
+    assert corpus.files == sorted(os.listdir(source_dir))
+    assert len(corpus) == 2
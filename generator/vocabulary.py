@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class Vocabulary():
+    """ Interns ingredient names as consecutive integer IDs so that scoring
+        data can be stored in dense arrays indexed by ingredient.
+
+    ...
+
+    Attributes
+    ----------
+    names : list
+        Ingredient names, where a name's position is its ID.
+    index : dict
+        Maps every ingredient name to its ID.
+
+    Methods
+    -------
+    intern(name):
+        Returns the ID of a name, assigning a new ID if it is unknown.
+    get_id(name):
+        Returns the ID of a known name.
+    get_ids(names):
+        Returns the IDs of several known names as an integer array.
+    get_name(ingr_id):
+        Returns the name associated with an ID.
+    """
+
+    def __init__(self, names=()):
+        """ Creates a vocabulary with the given names in ID order.
+            Args:
+                names (iterable) : initial ingredient names
+        """
+        self.names = []
+        self.index = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        """ Returns the ID of the given name, appending it to the vocabulary
+            if it has not been seen before.
+            Args:
+                name (str) : ingredient name
+        """
+        ingr_id = self.index.get(name)
+        if ingr_id is None:
+            ingr_id = len(self.names)
+            self.index[name] = ingr_id
+            self.names.append(name)
+        return ingr_id
+
+    def get_id(self, name):
+        """ Returns the ID of a known name, raising KeyError otherwise.
+            Args:
+                name (str) : ingredient name
+        """
+        return self.index[name]
+
+    def get_ids(self, names):
+        """ Returns the IDs of the given known names as an integer array.
+            Args:
+                names (list) : ingredient names
+        """
+        return np.fromiter((self.index[name] for name in names), dtype=np.intp,
+                           count=len(names))
+
+    def get_name(self, ingr_id):
+        """ Returns the ingredient name associated with an ID.
+            Args:
+                ingr_id (int) : ingredient ID
+        """
+        return self.names[ingr_id]
+
+    def __len__(self):
+        """ Returns the number of interned names.
+        """
+        return len(self.names)
+
+    def __contains__(self, name):
+        """ Returns whether the name has an ID.
+        """
+        return name in self.index